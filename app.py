@@ -1,60 +1,239 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, Response
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g
+import base64
+import hmac
 import json
+import math
 import os
-import secrets
-import hashlib
 import time
 import requests
 import re
-from functools import wraps
+from functools import lru_cache, wraps
+from user_store import create_user_store, UserExistsError
+from user_cache import UserCache
+from message_log import MessageLog
+from video_stream import offload_video, send_video
+from media_catalog import MediaCatalog
+from video_tokens import VideoTokenSigner
+from registry import JsonFilePersistence
+from shared_state import SqliteKV, create_registry, load_secret_key
+from nowpayments import NowPaymentsClient, NowPaymentsError
+from event_hub import EventHub
+from page_cache import CoursePage
+from assets import Assets
+from webhook_queue import SqliteJournal, WebhookQueue
+from rate_limit import RateLimiter, create_buckets, parse_overrides
+from passwords import hash_password, is_hashed, needs_rehash, verify_dummy, verify_password
+from log_queue import setup_logging
+import metrics
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)  # Generates a secure random key for sessions
+SECRET_KEY_FILE = 'secret_key'  # Generated once, then shared by all workers and restarts
+app.secret_key = os.environ.get('SECRET_KEY') or load_secret_key(SECRET_KEY_FILE)
+# 'memory' = per-process registries; 'sqlite' = shared by all workers (serve.py sets this)
+SHARED_STATE_BACKEND = os.environ.get('SHARED_STATE_BACKEND', 'memory')
+SHARED_STATE_FILE = 'shared_state.db'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token for Prometheus scrapers (admins can always read /metrics)
 DATA_FILE = 'users.json'
-MESSAGES_FILE = 'messages.json'  # File for global chat messages
-COURSE_VIDEO_DIR = 'course'  # Directory containing course videos
+USER_DB_FILE = 'users.db'  # Indexed user store (seeded from users.json on first run)
+USER_STORE_BACKEND = os.environ.get('USER_STORE_BACKEND', 'sqlite')  # 'sqlite' or 'json'
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))  # Max cached users (LRU)
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Seconds before a cached user is re-read
+IMPORT_BATCH_SIZE = 1000  # Users committed per transaction by the NDJSON import
+USERS_PAGE_SIZE = 50  # Default page size of GET /api/users?... (admin panel)
+USERS_PAGE_MAX = 500  # Largest page a client may ask for
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))  # PBKDF2 cost per login
+# PBKDF2 cost for plaintext passwords in an import (a full-cost hash is ~0.5s
+# each, hours for a large import); check_credentials upgrades them to
+# PASSWORD_HASH_ITERATIONS at the user's next login
+IMPORT_HASH_ITERATIONS = int(os.environ.get('IMPORT_HASH_ITERATIONS', 1000))
+MESSAGES_FILE = 'messages.json'  # Legacy chat history (imported into the log on first run)
+MESSAGES_LOG_FILE = 'messages.jsonl'  # Append-only chat log
+MESSAGES_HISTORY = 100  # Messages kept in memory and returned to clients
+COURSE_VIDEO_DIR = 'course'  # Directory containing course videos (<number>.mp4, .mkv, ...)
+MEDIA_RESCAN_INTERVAL = float(os.environ.get('MEDIA_RESCAN_INTERVAL', 5))  # Seconds between scans for added/changed videos
+VIDEO_CHUNK_SIZE = int(os.environ.get('VIDEO_CHUNK_SIZE', 1024 * 1024))  # Bytes per streamed chunk
+VIDEO_USE_SENDFILE = os.environ.get('VIDEO_USE_SENDFILE', '1') == '1'  # Zero-copy when the server supports it
+# 'app' = Flask streams the bytes; 'x-accel' (nginx) / 'x-sendfile' (Apache) = proxy does (see deploy/nginx.conf)
+VIDEO_DELIVERY = os.environ.get('VIDEO_DELIVERY', 'app')
+VIDEO_ACCEL_PREFIX = os.environ.get('VIDEO_ACCEL_PREFIX', '/protected-videos/')  # nginx internal location
+VIDEO_TOKEN_TTL = int(os.environ.get('VIDEO_TOKEN_TTL', 6 * 3600))  # Seconds a video token stays valid
 
 
 # NOWPayments API Configuration
-NOWPAYMENTS_API_KEY = "YEW353V-HP0MM01-G4QA7WX-MPDTF62"
-NOWPAYMENTS_API_URL = "https://api.nowpayments.io/v1"
+NOWPAYMENTS_API_KEY = os.environ.get('NOWPAYMENTS_API_KEY', "YEW353V-HP0MM01-G4QA7WX-MPDTF62")
+NOWPAYMENTS_API_URL = os.environ.get('NOWPAYMENTS_API_URL', "https://api.nowpayments.io/v1")
+NOWPAYMENTS_STATUS_TTL = int(os.environ.get('NOWPAYMENTS_STATUS_TTL', 15))  # Seconds a fetched status is reused
+PAYMENT_STATUS_FRESH = int(os.environ.get('PAYMENT_STATUS_FRESH', 120))  # Webhook status newer than this skips the API
+PAYMENT_EVENTS_MAX_SECONDS = 600  # SSE stream lifetime on asgi.py; EventSource reconnects by itself
+FINAL_PAYMENT_STATUSES = ('confirmed', 'finished', 'failed', 'expired', 'refunded')
+CHAT_STREAM_MAX_SECONDS = 600  # SSE stream lifetime on asgi.py; EventSource reconnects with Last-Event-ID
+# The Flask SSE views hold a WSGI thread (gthread / werkzeug) while open, so
+# there a stream only lasts this long and the browser reconnects after
+# SYNC_STREAM_RETRY_MS: 0 = short poll. serve.py sends long streams to asgi.py.
+SYNC_STREAM_SECONDS = float(os.environ.get('SYNC_STREAM_SECONDS', 0))
+SYNC_STREAM_RETRY_MS = int(os.environ.get('SYNC_STREAM_RETRY_MS', 5000))
+# Max seconds an SSE stream waits before re-checking state. Events are only
+# published to this process, so with shared state (several workers) re-check often.
+EVENT_WAIT_SECONDS = 15 if SHARED_STATE_BACKEND == 'memory' else 2
 COURSE_PRICE_USD = 50  # Price in USD
+PENDING_PAYMENTS_FILE = 'pending_payments.json'  # Live pending payments, reloaded on restart
+PENDING_PAYMENT_TTL = int(os.environ.get('PENDING_PAYMENT_TTL', 24 * 3600))  # Forget payments after a day
+PENDING_PAYMENTS_MAX = int(os.environ.get('PENDING_PAYMENTS_MAX', 100000))
+PAID_PAYMENT_STATUSES = ('confirmed', 'finished')  # Webhook statuses that grant access
+PROCESSED_WEBHOOKS_FILE = 'processed_webhooks.json'  # Handled (payment_id, status) pairs, reloaded on restart
+PROCESSED_WEBHOOK_TTL = int(os.environ.get('PROCESSED_WEBHOOK_TTL', 7 * 24 * 3600))  # Replays within this are no-ops
+WEBHOOK_BATCH_DELAY = float(os.environ.get('WEBHOOK_BATCH_DELAY', 0.05))  # Seconds to collect a burst before applying it
+# Token buckets per route and key ('count/period'; 'user' = session user, or client IP + username tried for
+# login, so nobody can lock an account out from their own address).
+# Override as RATE_LIMITS="login.ip=30/minute,webhook.*=off" (RATE_LIMITS=off: no limits)
+RATE_LIMITS = {
+    'login': {'ip': '20/minute', 'user': '10/minute'},
+    'register': {'ip': '5/minute'},
+    'create_payment': {'ip': '20/minute', 'user': '5/minute'},
+    'check_payment': {'ip': '120/minute', 'user': '60/minute'},
+    'webhook': {'ip': '600/minute'},
+}
+RATE_LIMIT_KEYS = int(os.environ.get('RATE_LIMIT_KEYS', 100000))  # Max buckets kept (least recently used go first)
+# Proxies appending X-Forwarded-For (deploy/nginx.conf: 1; serve.py --host 127.0.0.1 sets 1 by default)
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
 
-# Track active video sessions (in-memory, for demo purposes)
-# In production, use Redis or database
-active_sessions = {}
+# Track pending crypto payments (bounded, expiring; persisted by the reaper
+# in memory mode, shared by all workers in sqlite mode)
+pending_payments = create_registry(
+    SHARED_STATE_BACKEND,
+    'pending_payments',
+    ttl=PENDING_PAYMENT_TTL,
+    max_size=PENDING_PAYMENTS_MAX,
+    db_path=SHARED_STATE_FILE,
+    persistence=JsonFilePersistence(PENDING_PAYMENTS_FILE)
+)
 
-# Track pending crypto payments (in production, use database)
-pending_payments = {}
+# IPN events already applied, keyed "payment_id:status" (NOWPayments retries)
+processed_webhooks = create_registry(
+    SHARED_STATE_BACKEND,
+    'processed_webhooks',
+    ttl=PROCESSED_WEBHOOK_TTL,
+    max_size=PENDING_PAYMENTS_MAX,
+    db_path=SHARED_STATE_FILE,
+    persistence=JsonFilePersistence(PROCESSED_WEBHOOKS_FILE)
+)
+
+# Reads by id are served from memory; writes and file changes invalidate
+user_store = UserCache(
+    create_user_store(USER_STORE_BACKEND, DATA_FILE, USER_DB_FILE),
+    maxsize=USER_CACHE_SIZE,
+    ttl=USER_CACHE_TTL
+)
+
+# Pooled, retrying API client shared by all requests
+nowpayments = NowPaymentsClient(NOWPAYMENTS_API_KEY, NOWPAYMENTS_API_URL, status_ttl=NOWPAYMENTS_STATUS_TTL)
+
+# Global chat: JSON Lines log + ring buffer of the last MESSAGES_HISTORY messages
+message_log = MessageLog(MESSAGES_LOG_FILE, capacity=MESSAGES_HISTORY, legacy_json=MESSAGES_FILE)
+
+# Webhook status changes pushed to /payment-events subscribers,
+# new chat messages to /api/messages/stream subscribers (key 'chat')
+payment_events = EventHub()
+chat_events = EventHub(max_keys=1)
+
+# Signed, expiring video tokens (verified without server-side session state).
+# The revocation list only holds logged-out tokens until they expire.
+revoked_video_tokens = create_registry(SHARED_STATE_BACKEND, 'revoked_video_tokens', ttl=VIDEO_TOKEN_TTL,
+                                       max_size=100000, db_path=SHARED_STATE_FILE)
+# Forced logouts: user_id -> time of the last one. Sessions logged in before it
+# are dropped. Kept as long as a session cookie's signature stays valid: a
+# dropped session can't be re-signed, so it is too old once the entry expires.
+session_epochs = create_registry(SHARED_STATE_BACKEND, 'session_epochs',
+                                 ttl=int(app.permanent_session_lifetime.total_seconds()),
+                                 max_size=100000, db_path=SHARED_STATE_FILE)
+video_tokens = VideoTokenSigner(
+    os.environ.get('VIDEO_TOKEN_SECRET') or app.secret_key,
+    ttl=VIDEO_TOKEN_TTL,
+    revocations=revoked_video_tokens
+)
+
+# Course videos by number (size, ETag, MIME type cached; rescanned in the background)
+media_catalog = MediaCatalog(COURSE_VIDEO_DIR, rescan_interval=MEDIA_RESCAN_INTERVAL)
+
+# Per-route request budgets (per process in memory mode, shared in sqlite mode)
+rate_limiter = RateLimiter(
+    create_buckets(SHARED_STATE_BACKEND, RATE_LIMIT_KEYS, SHARED_STATE_FILE),
+    RATE_LIMITS,
+    overrides=parse_overrides(os.environ.get('RATE_LIMITS'))
+)
+
+# asset_url('chat.js') in templates -> fingerprinted build (python build_assets.py) or plain /static/ file
+assets = Assets(app.static_folder, app.static_url_path)
+app.jinja_env.globals['asset_url'] = assets.url
+
+# Course pages compiled once (recompiled when the file changes); per request
+# only the watermark and video token are filled in
+course_page = CoursePage(app.jinja_env, os.path.join(app.root_path, app.template_folder, 'course.html'))
+course_library_page = CoursePage(app.jinja_env, os.path.join(COURSE_VIDEO_DIR, 'index.html'))
+
+# Logging goes through a queue drained by a background thread (no blocking prints)
+setup_logging(LOG_LEVEL)
+
+# --- Metrics (served on /metrics) ---
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    'http_request_seconds', 'Time to produce the response (streamed bodies not included)',
+    ('route', 'method', 'status'))
+VIDEO_BYTES = metrics.REGISTRY.counter(
+    'video_bytes_total', 'Video bytes sent by the app (Content-Length of 200/206 responses)', ('video',))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                route=route, method=request.method, status=response.status_code)
+    return response
 
 # --- Helpers ---
 def load_users():
-    if not os.path.exists(DATA_FILE):
-        return []
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
-
-def save_users(users):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(users, f, indent=4)
-
-def load_messages():
-    if not os.path.exists(MESSAGES_FILE):
-        return []
-    try:
-        with open(MESSAGES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return []
+    return user_store.all()
+
+def get_user(user_id):
+    return user_store.get(user_id)
+
+def messages_since(since, wait=True):
+    # Served from memory; picks up lines other workers appended
+    return message_log.since(since, wait)
+
+def make_password(password):
+    return hash_password(password, PASSWORD_HASH_ITERATIONS)
 
-def save_messages(messages):
-    with open(MESSAGES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(messages, f, indent=4, ensure_ascii=False)
+def check_credentials(username, password):
+    """User dict if the password matches, else None (same cost either way)"""
+    user = user_store.get_by_username(username) if isinstance(username, str) else None
+    if user is None:
+        verify_dummy(password, PASSWORD_HASH_ITERATIONS)
+        return None
+    if not verify_password(password, user['password']):
+        return None
+    if needs_rehash(user['password'], PASSWORD_HASH_ITERATIONS):
+        # Plaintext or old cost: upgrade now that we know the password
+        user_store.update(user['id'], password=make_password(password))
+    return user
 
 
+def session_revoked(sess):
+    """True if ``sess`` was logged in before its user's last forced logout"""
+    logged_out_at = session_epochs.get(sess['user_id'])
+    return logged_out_at is not None and sess.get('login_at', 0) <= logged_out_at
+
+@app.before_request
+def drop_revoked_session():
+    # Runs before login_required / payment_required / admin_required see the session
+    if 'user_id' in session and session_revoked(session):
+        session.clear()
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -73,6 +252,44 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+@lru_cache(maxsize=None)
+def warn_untrusted_proxy():
+    # Once per process: behind a proxy every client would share its IP's buckets
+    app.logger.warning("X-Forwarded-For received but TRUSTED_PROXIES=0: rate limits use the proxy's address. "
+                       "Set TRUSTED_PROXIES to the number of proxies in front of the app.")
+
+def client_ip(req):
+    """Client address, skipping the TRUSTED_PROXIES hops that appended X-Forwarded-For"""
+    if 'X-Forwarded-For' in req.headers:
+        if TRUSTED_PROXIES:
+            route = req.access_route
+            return route[-min(TRUSTED_PROXIES, len(route))]
+        warn_untrusted_proxy()
+    return req.remote_addr
+
+def rate_limit_body(retry_after):
+    """429 payload and Retry-After (seconds until the next token, rounded up)"""
+    return {'success': False, 'message': 'Too many requests, please try again later'}, str(math.ceil(retry_after))
+
+def rate_limited(limit, user=lambda: session.get('user_id')):
+    """Refuse with 429 once the client's (IP, and ``user()`` if not None) bucket is empty"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            retry_after = rate_limiter.check(limit, ip=client_ip(request), user=user())
+            if retry_after:
+                body, seconds = rate_limit_body(retry_after)
+                return jsonify(body), 429, {'Retry-After': seconds}
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def login_attempt():
+    """'user' key of the login limit: client IP + the username tried"""
+    data = request.get_json(silent=True)
+    username = data.get('username') if isinstance(data, dict) else None
+    return f'{client_ip(request)}/{username.lower()}' if isinstance(username, str) else None
+
 def payment_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -80,8 +297,7 @@ def payment_required(f):
             return redirect(url_for('index'))
         
         # Verify fresh state from DB
-        users = load_users()
-        user = next((u for u in users if u['id'] == session['user_id']), None)
+        user = get_user(session['user_id'])
         
         if not user or not user.get('has_paid', False):
             return redirect(url_for('buy_course'))
@@ -100,8 +316,7 @@ def index():
 @login_required
 def home():
     # Pass user data to template to conditionally show "Buy" button
-    users = load_users()
-    user = next((u for u in users if u['id'] == session['user_id']), None)
+    user = get_user(session['user_id'])
     return render_template('home.html', user=user)
 
 @app.route('/admin')
@@ -123,88 +338,99 @@ def buy_crypto():
 @payment_required
 def course():
     # Get user info for watermarking
-    users = load_users()
-    user = next((u for u in users if u['id'] == session['user_id']), None)
+    user = get_user(session['user_id'])
     
-    # Generate unique session token for this viewing session
-    session_token = hashlib.sha256(f"{user['id']}{time.time()}{secrets.token_hex(8)}".encode()).hexdigest()
+    # Generate signed video token for this viewing session
+    session_token = video_tokens.issue(user['id'])
     session['video_token'] = session_token
     
-    # Store active session
-    active_sessions[session_token] = {
-        'user_id': user['id'],
-        'username': user['username'],
-        'started_at': time.time()
-    }
-    
-    return render_template('course.html', user=user, video_token=session_token)
+    return course_page.render(user, session_token)
 
 # Route for standalone course library (index.html in course folder)
 @app.route('/course-library')
 @payment_required
 def course_library():
     # Get user info for watermarking
-    users = load_users()
-    user = next((u for u in users if u['id'] == session['user_id']), None)
+    user = get_user(session['user_id'])
     
-    # Generate unique session token
-    session_token = hashlib.sha256(f"{user['id']}{time.time()}{secrets.token_hex(8)}".encode()).hexdigest()
+    # Generate signed video token
+    session_token = video_tokens.issue(user['id'])
     session['video_token'] = session_token
     
-    # Store active session
-    active_sessions[session_token] = {
-        'user_id': user['id'],
-        'username': user['username'],
-        'started_at': time.time()
-    }
-    
     # Serve the index.html from course folder with template processing
-    from flask import render_template_string
-    course_index_path = os.path.join(COURSE_VIDEO_DIR, 'index.html')
-    
-    if os.path.exists(course_index_path):
-        with open(course_index_path, 'r', encoding='utf-8') as f:
-            template_content = f.read()
-        return render_template_string(template_content, user=user, video_token=session_token)
-    else:
+    try:
+        return course_library_page.render(user, session_token)
+    except FileNotFoundError:
         return "Course library not found", 404
 
+# Fingerprinted build output (the plain files stay on Flask's /static/ route)
+@app.route(f'{app.static_url_path}/dist/<path:filename>')
+def built_asset(filename):
+    return assets.send(filename, request.accept_encodings)
+
 # Secure video streaming endpoint
-@app.route('/stream-video/<int:video_num>')
+@app.route('/stream-video/<int:video_num>', methods=['GET', 'HEAD'])
 @payment_required
 def stream_video(video_num):
-    # Verify video token
-    if 'video_token' not in session or session['video_token'] not in active_sessions:
+    # Verify video token (signature, expiry, owner, scope, revocation)
+    claims = video_tokens.verify(session.get('video_token'), video_num, user_id=session['user_id'])
+    if not claims:
         return "Unauthorized", 403
     
-    # Determine file extension
-    file_extension = 'mkv' if video_num <= 2 else 'mp4'
-    video_path = os.path.join(COURSE_VIDEO_DIR, f"{video_num}.{file_extension}")
-    
-    if not os.path.exists(video_path):
+    # File, size and ETag from the catalog (no filesystem check per request)
+    video = media_catalog.get(video_num)
+    if video is None:
         return "Video not found", 404
     
-    # Log access (for monitoring suspicious activity)
-    session_info = active_sessions[session['video_token']]
-    print(f"[VIDEO ACCESS] User: {session_info['username']} | Video: {video_num}")
+    # Log access (for monitoring suspicious activity) once per playback,
+    # not for every range request the player makes while seeking
+    byte_range = request.range
+    if byte_range is None or byte_range.ranges[0][0] == 0:
+        user = get_user(claims['uid'])
+        app.logger.info("[VIDEO ACCESS] User: %s | Video: %s", user['username'] if user else claims['uid'], video_num)
+    
+    if VIDEO_DELIVERY != 'app':
+        # Authorized: let the front proxy send the bytes
+        return offload_video(video.path, video.mimetype, VIDEO_DELIVERY, VIDEO_ACCEL_PREFIX)
     
-    # Serve the video file
-    return send_file(video_path, mimetype=f'video/{file_extension}')
+    # Serve the video file (Range/206, ETag/304)
+    try:
+        response = send_video(video.path, video.mimetype, chunk_size=VIDEO_CHUNK_SIZE,
+                              use_sendfile=VIDEO_USE_SENDFILE, st=video.stat)
+    except FileNotFoundError:
+        # Removed since the last scan
+        media_catalog.rescan()
+        return "Video not found", 404
+    if request.method == 'GET' and response.status_code in (200, 206):
+        VIDEO_BYTES.inc(response.content_length or 0, video=video_num)
+    return response
+
+@app.route('/api/videos', methods=['GET'])
+@payment_required
+def video_manifest():
+    """Course videos found in COURSE_VIDEO_DIR (the course pages build their cards from this)"""
+    response = jsonify({
+        'version': media_catalog.version,
+        'videos': media_catalog.manifest(lambda number: url_for('stream_video', video_num=number))
+    })
+    response.set_etag(media_catalog.version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/logout')
 def logout():
-    # Clean up active session
-    if 'video_token' in session and session['video_token'] in active_sessions:
-        del active_sessions[session['video_token']]
+    # Revoke the video token so a copied cookie stops working
+    if 'video_token' in session:
+        video_tokens.revoke(session['video_token'])
     session.clear()
     return redirect(url_for('index'))
 
 # --- API ---
 
 @app.route('/api/register', methods=['POST'])
+@rate_limited('register')
 def register():
     data = request.json
-    users = load_users()
     
     username = data.get('username')
     password = data.get('password')
@@ -212,47 +438,99 @@ def register():
     if not username or not password:
         return jsonify({'success': False, 'message': 'Missing fields'}), 400
         
-    for user in users:
-        if user['username'] == username:
-            return jsonify({'success': False, 'message': 'User already exists'}), 400
-            
-    new_user = {
-        'id': len(users) + 1,
-        'username': username,
-        'password': password,
-        'role': 'user',
-        'has_paid': False # Default for new users
-    }
-    users.append(new_user)
-    save_users(users)
+    try:
+        # New users start without access (has_paid=False)
+        user_store.create(username, make_password(password))
+    except UserExistsError:
+        return jsonify({'success': False, 'message': 'User already exists'}), 400
     
     return jsonify({'success': True, 'message': 'Account created successfully!'})
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited('login', user=login_attempt)
 def login():
     data = request.json
-    users = load_users()
     username = data.get('username')
     password = data.get('password')
     
-    for user in users:
-        if user['username'] == username and user['password'] == password:
-            # Set Session
-            session['user_id'] = user['id']
-            session['role'] = user.get('role', 'user')
-            return jsonify({
-                'success': True, 
-                'message': f'Welcome back, {username}!', 
-                'role': user.get('role', 'user')
-            })
+    user = check_credentials(username, password)
+    if user:
+        # Set Session
+        session['user_id'] = user['id']
+        session['role'] = user.get('role', 'user')
+        session['login_at'] = time.time()
+        return jsonify({
+            'success': True, 
+            'message': f'Welcome back, {username}!', 
+            'role': user.get('role', 'user')
+        })
             
     return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
+# Query parameters that switch GET /api/users from the full list to one page
+USER_LIST_PARAMS = ('limit', 'offset', 'cursor', 'prefix', 'role', 'has_paid', 'sort')
+
+def encode_cursor(sort, value):
+    return base64.urlsafe_b64encode(json.dumps([sort, value]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        sort, value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    # The value is bound into SQL: only the sort column's own type is accepted
+    expected = {'id': int, 'username': str}.get(sort.lstrip('-') if isinstance(sort, str) else None)
+    if expected is None or type(value) is not expected:
+        raise ValueError('Invalid cursor')
+    return sort, value
+
+def list_users_page(args):
+    """One page of users (no password hashes), filtered and sorted in the store"""
+    try:
+        limit = int(args.get('limit', USERS_PAGE_SIZE))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    if not 1 <= limit <= USERS_PAGE_MAX or offset < 0:
+        raise ValueError(f'limit must be 1-{USERS_PAGE_MAX} and offset >= 0')
+    sort = args.get('sort', 'id')
+    has_paid = args.get('has_paid')
+    if has_paid is not None:
+        if has_paid.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError('has_paid must be true or false')
+        has_paid = has_paid.lower() in ('true', '1')
+    after = None
+    if args.get('cursor'):
+        cursor_sort, after = decode_cursor(args['cursor'])
+        if cursor_sort != sort:
+            raise ValueError('Cursor belongs to a different sort order')
+    # One extra row tells whether another page follows
+    users, total = user_store.query(
+        prefix=args.get('prefix') or None,
+        role=args.get('role') or None,
+        has_paid=has_paid,
+        sort=sort.lstrip('-'),
+        descending=sort.startswith('-'),
+        limit=limit + 1,
+        offset=offset,
+        after=after
+    )
+    has_more = len(users) > limit
+    users = users[:limit]
+    return {
+        'users': [{k: v for k, v in user.items() if k != 'password'} for user in users],
+        'total': total,
+        'limit': limit,
+        'offset': None if after is not None else offset,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(sort, users[-1][sort.lstrip('-')]) if has_more else None
+    }
+
 @app.route('/api/users', methods=['GET', 'POST'])
+@admin_required
 def manage_users():
     if request.method == 'POST':
         data = request.json
-        users = load_users()
         
         username = data.get('username')
         password = data.get('password')
@@ -262,101 +540,174 @@ def manage_users():
         if not username or not password:
             return jsonify({'success': False, 'message': 'Missing fields'}), 400
             
-        for user in users:
-            if user['username'] == username:
-                return jsonify({'success': False, 'message': 'User already exists'}), 400
-                
-        new_user = {
-            'id': len(users) + 1, # Simple ID generation (better to use max id + 1)
-            'username': username,
-            'password': password,
-            'role': role,
-            'has_paid': has_paid
-        }
-        
-        # Ensure unique ID
-        if users:
-            new_user['id'] = max(u['id'] for u in users) + 1
-        else:
-            new_user['id'] = 1
-
-        users.append(new_user)
-        save_users(users)
+        try:
+            # Store assigns max id + 1
+            user_store.create(username, make_password(password), role=role, has_paid=has_paid)
+        except UserExistsError:
+            return jsonify({'success': False, 'message': 'User already exists'}), 400
         
         return jsonify({'success': True, 'message': 'User created successfully'})
 
+    # Paged when any list parameter is given; the full list stays for old clients
+    if any(name in request.args for name in USER_LIST_PARAMS):
+        try:
+            return jsonify(list_users_page(request.args))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
     return jsonify(load_users())
 
+@app.route('/api/cache-stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    """User cache hit/miss counters"""
+    return jsonify(user_store.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for admins (or scrapers sending METRICS_TOKEN)"""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization.encode(), f'Bearer {METRICS_TOKEN}'.encode())
+    if not token_ok and session.get('role') != 'admin':
+        return "Unauthorized: Admin access required", 403
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/registry-stats', methods=['GET'])
+@admin_required
+def registry_stats():
+    """Size and eviction counters of the in-memory registries"""
+    return jsonify({
+        'pending_payments': pending_payments.stats(),
+        'processed_webhooks': dict(processed_webhooks.stats(), queued=webhook_queue.pending()),
+        'revoked_video_tokens': revoked_video_tokens.stats(),
+        'rate_limits': rate_limiter.stats(),
+        'media_catalog': media_catalog.stats()
+    })
+
 @app.route('/api/users/export', methods=['GET'])
 @admin_required
 def export_users():
-    """Export all users to JSON file"""
+    """Export all users as a streamed download (?format=ndjson for one user per line)"""
     try:
-        users = load_users()
-        # Create a JSON response with proper formatting
-        json_data = json.dumps(users, indent=4, ensure_ascii=False)
+        users = user_store.iter_users()
+        
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for user in users:
+                    yield json.dumps(user, ensure_ascii=False) + '\n'
+            mimetype, filename = 'application/x-ndjson', 'users.ndjson'
+        else:
+            # JSON array, one user per line, built as it is sent
+            def generate():
+                yield '['
+                separator = '\n'
+                for user in users:
+                    yield separator + json.dumps(user, ensure_ascii=False)
+                    separator = ',\n'
+                yield '\n]\n'
+            mimetype, filename = 'application/json', 'users.json'
         
         # Return as downloadable file
-        response = Response(
-            json_data,
-            mimetype='application/json',
-            headers={'Content-Disposition': 'attachment; filename=users.json'}
+        return Response(
+            generate(),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
-        return response
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def import_user_record(user_data):
+    """Validated import record, or None if required fields are missing"""
+    if not isinstance(user_data, dict) or 'username' not in user_data or not isinstance(user_data.get('password'), str):
+        return None
+    password = user_data['password']
+    return {
+        'username': user_data['username'],
+        # Exports carry hashes; plaintext entries get a cheap hash, upgraded at login
+        'password': password if is_hashed(password) else hash_password(password, IMPORT_HASH_ITERATIONS),
+        'role': user_data.get('role', 'user'),
+        'has_paid': user_data.get('has_paid', False)
+    }
+
+def iter_lines(stream, block_size=64 * 1024):
+    """Lines of a request body, read in large blocks (readline() on the WSGI
+    input stream is very slow)"""
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+def import_users_ndjson(stream):
+    """Parse NDJSON incrementally and commit every IMPORT_BATCH_SIZE users"""
+    added_count = invalid_count = 0
+    skipped = []
+    batches = []
+    batch = []
+    
+    def commit():
+        added, batch_skipped = user_store.add_many(batch)
+        batches.append({'batch': len(batches) + 1, 'added': added, 'skipped': len(batch_skipped)})
+        skipped.extend(batch_skipped)
+        batch.clear()
+        return added
+    
+    for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            record = import_user_record(json.loads(line))
+        except ValueError:
+            record = None
+        if record is None:
+            invalid_count += 1
+            continue
+        batch.append(record)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            added_count += commit()
+    if batch:
+        added_count += commit()
+    
+    return jsonify({
+        'success': True,
+        'added': added_count,
+        'skipped': len(skipped),
+        'invalid': invalid_count,
+        'batches': batches,
+        'skipped_usernames': skipped[:100],
+        'message': f'Import completed: {added_count} added, {len(skipped)} skipped, {invalid_count} invalid'
+    })
+
 @app.route('/api/users/import', methods=['POST'])
 @admin_required
 def import_users():
-    """Import users from JSON file"""
+    """Import users from JSON ({"users": [...]}) or streamed NDJSON (one user per line)"""
     try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            return import_users_ndjson(request.stream)
+        
         data = request.json
         new_users = data.get('users', [])
         
         if not isinstance(new_users, list):
             return jsonify({'success': False, 'message': 'Invalid data format'}), 400
         
-        existing_users = load_users()
-        existing_usernames = {u['username'] for u in existing_users}
+        # Validate required fields (IDs are assigned by the store)
+        valid_users = [u for u in map(import_user_record, new_users) if u]
         
-        added_count = 0
-        skipped_count = 0
-        
-        # Get max ID
-        max_id = max([u['id'] for u in existing_users], default=0)
-        
-        for user_data in new_users:
-            # Validate required fields
-            if 'username' not in user_data or 'password' not in user_data:
-                continue
-            
-            # Skip if user already exists
-            if user_data['username'] in existing_usernames:
-                skipped_count += 1
-                continue
-            
-            # Create new user with proper ID
-            max_id += 1
-            new_user = {
-                'id': max_id,
-                'username': user_data['username'],
-                'password': user_data['password'],
-                'role': user_data.get('role', 'user'),
-                'has_paid': user_data.get('has_paid', False)
-            }
-            
-            existing_users.append(new_user)
-            existing_usernames.add(new_user['username'])
-            added_count += 1
-        
-        # Save updated users
-        save_users(existing_users)
+        # Existing usernames are skipped
+        added_count, skipped = user_store.add_many(valid_users)
+        skipped_count = len(skipped)
         
         return jsonify({
             'success': True,
             'added': added_count,
             'skipped': skipped_count,
+            'skipped_usernames': skipped[:100],
             'message': f'Import completed: {added_count} added, {skipped_count} skipped'
         })
     except Exception as e:
@@ -364,48 +715,84 @@ def import_users():
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
-    users = load_users()
-    users = [u for u in users if u.get('id') != user_id]
-    save_users(users)
+    user_store.delete(user_id)
+    video_tokens.revoke_user(user_id)
     return jsonify({'success': True})
 
 @app.route('/api/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     data = request.json
-    users = load_users()
-    for user in users:
-        if user.get('id') == user_id:
-            user['username'] = data.get('username', user['username'])
-            if 'password' in data: # Only update if password provided
-                user['password'] = data['password']
-            user['role'] = data.get('role', user['role'])
-            if 'has_paid' in data: # Allow updating payment status
-                user['has_paid'] = data['has_paid']
-            # Note: We don't usually let admins edit 'has_paid' via this simple endpoint, 
-            # but we preserve it if not sent
-            save_users(users)
-            return jsonify({'success': True, 'message': 'User updated'})
+    fields = {k: data[k] for k in ('username', 'role') if k in data}
+    if 'password' in data: # Only update if password provided
+        fields['password'] = make_password(data['password'])
+    if 'has_paid' in data: # Allow updating payment status
+        fields['has_paid'] = data['has_paid']
+    # Note: We don't usually let admins edit 'has_paid' via this simple endpoint, 
+    # but we preserve it if not sent
+    try:
+        user = user_store.update(user_id, **fields)
+    except UserExistsError:
+        return jsonify({'success': False, 'message': 'User already exists'}), 400
+    if user:
+        return jsonify({'success': True, 'message': 'User updated'})
     return jsonify({'success': False, 'message': 'User not found'}), 404
 
+@app.route('/api/users/<int:user_id>/logout', methods=['POST'])
+@admin_required
+def force_logout(user_id):
+    """End every session of a user and invalidate their video tokens"""
+    session_epochs.set(user_id, time.time())
+    video_tokens.revoke_user(user_id)
+    return jsonify({'success': True, 'message': 'User sessions revoked'})
+
 @app.route('/api/confirm-payment', methods=['POST'])
 @login_required
 def confirm_payment():
     # In a real app, verify the 'details' object from PayPal with PayPal API
     # to ensure the payment is legitimate.
     
-    users = load_users()
-    for user in users:
-        if user['id'] == session['user_id']:
-            user['has_paid'] = True
-            save_users(users)
-            return jsonify({'success': True})
+    if user_store.update(session['user_id'], has_paid=True):
+        return jsonify({'success': True})
             
     return jsonify({'success': False, 'message': 'User not found'}), 404
 
 # ========== CRYPTO PAYMENT ENDPOINTS (NOWPayments) ==========
+# The request/response helpers are shared with the async server (asgi.py)
+
+VALID_CRYPTOS = ('btc', 'eth', 'usdttrc20', 'ltc', 'bnbbsc', 'usdcbsc')
+
+def crypto_payment_request(user_id, crypto_currency):
+    """Body of the NOWPayments create-payment call for one course purchase"""
+    return {
+        "price_amount": COURSE_PRICE_USD,
+        "price_currency": "usd",
+        "pay_currency": crypto_currency,
+        "ipn_callback_url": "https://alpha-project.onrender.com/nowpayments-webhook",
+        "order_id": f"user_{user_id}_{int(time.time())}",
+        "order_description": f"ALPHA Course - User {user_id}"
+    }
+
+def register_crypto_payment(user_id, payment_info):
+    """Remember a created payment; returns the response for the checkout page"""
+    payment_id = payment_info.get('payment_id')
+    pending_payments.set(payment_id, {
+        'user_id': user_id,
+        'status': 'waiting',
+        'created_at': time.time()
+    })
+    return {
+        'success': True,
+        'payment_id': payment_id,
+        'pay_address': payment_info.get('pay_address'),
+        'pay_amount': payment_info.get('pay_amount'),
+        'pay_currency': payment_info.get('pay_currency').upper(),
+        'order_id': payment_info.get('order_id'),
+        'payment_status': payment_info.get('payment_status')
+    }
 
 @app.route('/create-crypto-payment', methods=['POST'])
 @login_required
+@rate_limited('create_payment')
 def create_crypto_payment():
     """Create a cryptocurrency payment via NOWPayments"""
     try:
@@ -413,147 +800,259 @@ def create_crypto_payment():
         crypto_currency = data.get('crypto', 'btc').lower()
         
         # Validate crypto currency
-        valid_cryptos = ['btc', 'eth', 'usdttrc20', 'ltc', 'bnbbsc', 'usdcbsc']
-        if crypto_currency not in valid_cryptos:
+        if crypto_currency not in VALID_CRYPTOS:
             return jsonify({'success': False, 'message': 'Invalid cryptocurrency'}), 400
         
         user_id = session.get('user_id')
         if not user_id:
             return jsonify({'success': False, 'message': 'User not authenticated'}), 401
         
-        # Prepare payment request
-        payment_data = {
-            "price_amount": COURSE_PRICE_USD,
-            "price_currency": "usd",
-            "pay_currency": crypto_currency,
-            "ipn_callback_url": "https://alpha-project.onrender.com/nowpayments-webhook",
-            "order_id": f"user_{user_id}_{int(time.time())}",
-            "order_description": f"ALPHA Course - User {user_id}"
-        }
-        
         # Call NOWPayments API
-        headers = {
-            "x-api-key": NOWPAYMENTS_API_KEY,
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(
-            f"{NOWPAYMENTS_API_URL}/payment",
-            json=payment_data,
-            headers=headers,
-            timeout=10
-        )
+        try:
+            payment_info = nowpayments.create_payment(crypto_payment_request(user_id, crypto_currency))
+        except NowPaymentsError as e:
+            return jsonify({'success': False, 'message': e.message or 'Payment creation failed'}), 400
         
-        if response.status_code == 201:
-            payment_info = response.json()
-            
-            # Store payment info temporarily
-            payment_id = payment_info.get('payment_id')
-            pending_payments[payment_id] = {
-                'user_id': user_id,
-                'status': 'waiting',
-                'created_at': time.time()
-            }
-            
-            return jsonify({
-                'success': True,
-                'payment_id': payment_id,
-                'pay_address': payment_info.get('pay_address'),
-                'pay_amount': payment_info.get('pay_amount'),
-                'pay_currency': payment_info.get('pay_currency').upper(),
-                'order_id': payment_info.get('order_id'),
-                'payment_status': payment_info.get('payment_status')
-            })
-        else:
-            error_msg = response.json().get('message', 'Payment creation failed')
-            return jsonify({'success': False, 'message': error_msg}), 400
+        # Store payment info temporarily
+        return jsonify(register_crypto_payment(user_id, payment_info))
             
     except requests.exceptions.RequestException as e:
         return jsonify({'success': False, 'message': f'API Error: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'success': False, 'message': f'Server Error: {str(e)}'}), 500
 
+def apply_webhook_events(events):
+    """Apply a batch of queued IPN events (run by the webhook queue's worker)"""
+    # Every grant in the batch in one user store write
+    grants = sorted({event['user_id'] for event in events if event['status'] in PAID_PAYMENT_STATUSES})
+    if grants and user_store.update_many(grants, has_paid=True):
+        app.logger.info("[WEBHOOK] ✅ Access granted to users %s", grants)
+
+    # One state update per payment: its latest status, but never a final
+    # status replaced by an earlier one that arrived late
+    latest = {}
+    for event in events:
+        previous = latest.get(event['payment_id']) or pending_payments.get(event['payment_id'])
+        if (previous and previous['status'] in FINAL_PAYMENT_STATUSES
+                and event['status'] not in FINAL_PAYMENT_STATUSES):
+            continue
+        latest[event['payment_id']] = event
+
+    for payment_id, event in latest.items():
+        # Keep the latest status locally so /check-payment doesn't ask the API
+        webhook_state = {
+            'status': event['status'],
+            'pay_amount': event['pay_amount'],
+            'actually_paid': event['actually_paid'],
+            'updated_at': event['updated_at'],
+            'webhook_at': event['received_at']
+        }
+        if not pending_payments.update(payment_id, **webhook_state):
+            # Created by another worker or before a restart
+            pending_payments.set(payment_id, dict(webhook_state, user_id=event['user_id'], created_at=time.time()))
+        nowpayments.invalidate(payment_id)
+        payment_events.publish(payment_id, payment_status_payload(payment_id))
+
+# Webhooks are acknowledged at once and applied in batches in the background; the
+# journal (always in shared_state.db) keeps them until applied, across restarts
+webhook_queue = WebhookQueue(
+    apply_webhook_events,
+    processed_webhooks,
+    journal=SqliteJournal(SqliteKV(SHARED_STATE_FILE), ttl=PROCESSED_WEBHOOK_TTL),
+    batch_delay=WEBHOOK_BATCH_DELAY
+)
+
+@app.before_request
+def start_webhook_queue():
+    # Applies events journaled before a crash or restart without waiting for the next webhook
+    webhook_queue.start()
+
 @app.route('/nowpayments-webhook', methods=['POST'])
+@rate_limited('webhook')
 def nowpayments_webhook():
-    """Handle NOWPayments IPN webhook"""
+    """Handle NOWPayments IPN webhook (validated here, applied by webhook_queue)"""
+    # Malformed IPNs get a 400: a 500 would only make NOWPayments resend them
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Invalid JSON body'}), 400
+    
+    payment_status = data.get('payment_status')
+    order_description = data.get('order_description', '')
+    payment_id = data.get('payment_id')
+    
+    # Extract user_id from order_description "ALPHA Course - User {user_id}"
+    match = re.search(r'User (\d+)', order_description) if isinstance(order_description, str) else None
+    if not match:
+        return jsonify({'success': False, 'message': 'Invalid order description'}), 400
+    if not isinstance(payment_status, str) or not payment_status:
+        return jsonify({'success': False, 'message': 'Missing payment_status'}), 400
+    # NOWPayments sends the id as a number; accept digit strings too
+    if isinstance(payment_id, str) and payment_id.isdigit():
+        payment_id = int(payment_id)
+    if type(payment_id) is not int:
+        return jsonify({'success': False, 'message': 'Missing or invalid payment_id'}), 400
+    
+    user_id = int(match.group(1))
+    
     try:
-        data = request.json
-        
-        payment_status = data.get('payment_status')
-        order_description = data.get('order_description', '')
-        payment_id = data.get('payment_id')
-        
-        print(f"[WEBHOOK] Payment ID: {payment_id} | Status: {payment_status}")
-        
-        # Extract user_id from order_description "ALPHA Course - User {user_id}"
-        match = re.search(r'User (\d+)', order_description)
-        if not match:
-            return jsonify({'success': False, 'message': 'Invalid order description'}), 400
-        
-        user_id = int(match.group(1))
-        
-        # Update payment status in memory
-        if payment_id in pending_payments:
-            pending_payments[payment_id]['status'] = payment_status
-        
-        # If payment confirmed, grant access
-        if payment_status in ['confirmed', 'finished']:
-            users = load_users()
-            for user in users:
-                if user['id'] == user_id:
-                    user['has_paid'] = True
-                    save_users(users)
-                    print(f"[WEBHOOK] ✅ Access granted to user {user_id}")
-                    break
-        
-        return jsonify({'success': True}), 200
-        
+        result = webhook_queue.submit(payment_id, payment_status, {
+            'payment_id': payment_id,
+            'user_id': user_id,
+            'status': payment_status,
+            'pay_amount': data.get('pay_amount'),
+            'actually_paid': data.get('actually_paid'),
+            'updated_at': data.get('updated_at'),
+            'received_at': time.time()
+        })
+    
     except Exception as e:
-        print(f"[WEBHOOK ERROR] {str(e)}")
+        # Not journaled: NOWPayments retries on 5xx
+        app.logger.exception("[WEBHOOK ERROR] %s", e)
         return jsonify({'success': False, 'message': str(e)}), 500
+    app.logger.info("[WEBHOOK] Payment ID: %s | Status: %s | %s", payment_id, payment_status, result)
+    
+    return jsonify({'success': True}), 200
+
+def payment_event_id(payload):
+    """SSE id of a payment-events message: a reconnect sends it back as Last-Event-ID"""
+    return f"{payload['payment_status']}:{int(bool(payload['has_access']))}"
+
+def payment_status_payload(payment_id):
+    """check-payment response built from webhook state, or None if we have none"""
+    payment = pending_payments.get(payment_id)
+    if not payment or 'webhook_at' not in payment:
+        return None
+    user = get_user(payment['user_id'])
+    return {
+        'success': True,
+        'payment_status': payment['status'],
+        'has_access': user.get('has_paid', False) if user else False,
+        'pay_amount': payment.get('pay_amount'),
+        'actually_paid': payment.get('actually_paid'),
+        'updated_at': payment.get('updated_at')
+    }
+
+def owns_payment(payment_id, user_id=None):
+    payment = pending_payments.get(payment_id)
+    return payment is None or payment['user_id'] == (user_id or session.get('user_id'))
+
+def local_payment_status(payment_id):
+    """Webhook state if it is final or fresh enough to skip the API, else None"""
+    payment = pending_payments.get(payment_id)
+    if payment and 'webhook_at' in payment and (
+            payment['status'] in FINAL_PAYMENT_STATUSES
+            or time.time() - payment['webhook_at'] < PAYMENT_STATUS_FRESH):
+        return payment_status_payload(payment_id)
+    return None
+
+def upstream_payment_payload(payment_data, user_id):
+    """check-payment response from a NOWPayments status lookup"""
+    # Check if user has been granted access
+    user = get_user(user_id)
+    has_access = user.get('has_paid', False) if user else False
+    return {
+        'success': True,
+        'payment_status': payment_data.get('payment_status'),
+        'has_access': has_access,
+        'pay_amount': payment_data.get('pay_amount'),
+        'actually_paid': payment_data.get('actually_paid'),
+        'updated_at': payment_data.get('updated_at')
+    }
 
 @app.route('/check-payment/<int:payment_id>', methods=['GET'])
 @login_required
+@rate_limited('check_payment')
 def check_payment(payment_id):
-    """Check payment status from NOWPayments API"""
+    """Check payment status: webhook state if fresh, else NOWPayments API (cached)"""
     try:
-        headers = {
-            "x-api-key": NOWPAYMENTS_API_KEY
-        }
+        if not owns_payment(payment_id):
+            return jsonify({'success': False, 'message': 'Payment not found'}), 404
         
-        response = requests.get(
-            f"{NOWPAYMENTS_API_URL}/payment/{payment_id}",
-            headers=headers,
-            timeout=10
-        )
+        local = local_payment_status(payment_id)
+        if local:
+            return jsonify(local)
         
-        if response.status_code == 200:
-            payment_data = response.json()
-            payment_status = payment_data.get('payment_status')
-            
-            # Check if user has been granted access
-            user_id = session.get('user_id')
-            users = load_users()
-            user = next((u for u in users if u['id'] == user_id), None)
-            has_access = user.get('has_paid', False) if user else False
-            
-            return jsonify({
-                'success': True,
-                'payment_status': payment_status,
-                'has_access': has_access,
-                'pay_amount': payment_data.get('pay_amount'),
-                'actually_paid': payment_data.get('actually_paid'),
-                'updated_at': payment_data.get('updated_at')
-            })
-        else:
+        try:
+            payment_data = nowpayments.get_payment_status(payment_id)
+        except NowPaymentsError:
             return jsonify({'success': False, 'message': 'Payment not found'}), 404
+        
+        return jsonify(upstream_payment_payload(payment_data, session.get('user_id')))
             
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/payment-events/<int:payment_id>', methods=['GET'])
+@login_required
+def payment_events_stream(payment_id):
+    """Server-Sent Events: pushes payment status as webhooks arrive"""
+    if not owns_payment(payment_id):
+        return jsonify({'success': False, 'message': 'Payment not found'}), 404
+    
+    # Reconnects (short polls) skip a state the browser already has
+    seen = request.headers.get('Last-Event-ID')
+    
+    def stream():
+        deadline = time.time() + SYNC_STREAM_SECONDS
+        version, _ = payment_events.latest(payment_id)
+        last_sent = None
+        yield f'retry: {SYNC_STREAM_RETRY_MS}\n\n'
+        while True:
+            # Current local state (also picks up changes made outside this hub)
+            payload = payment_status_payload(payment_id)
+            if payload and payload != last_sent and payment_event_id(payload) != seen:
+                last_sent = payload
+                yield f"id: {payment_event_id(payload)}\ndata: {json.dumps(payload)}\n\n"
+            else:
+                yield ': keep-alive\n\n'
+            if payload and (payload['payment_status'] in FINAL_PAYMENT_STATUSES or payload['has_access']):
+                return  # nothing further will come (sent now or by an earlier connection)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            version, _ = payment_events.wait(payment_id, version, timeout=min(EVENT_WAIT_SECONDS, remaining))
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/messages', methods=['GET'])
 def get_messages():
-    return jsonify(load_messages())
+    """Chat history; ?since=<id> returns only newer messages (ETag/304 aware)"""
+    since = request.args.get('since', 0, type=int)
+    messages = messages_since(since)
+    last_id = messages[-1]['id'] if messages else since
+    
+    response = jsonify(messages)
+    response.set_etag(f"{since}-{last_id}-{len(messages)}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/messages/stream', methods=['GET'])
+def stream_messages():
+    """Server-Sent Events: one event per new chat message"""
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    
+    def stream():
+        last_id = since
+        deadline = time.time() + SYNC_STREAM_SECONDS
+        version, _ = chat_events.latest('chat')
+        yield f'retry: {SYNC_STREAM_RETRY_MS}\n\n'
+        while True:
+            # Also catches messages written by other workers (file version changed)
+            new_messages = messages_since(last_id)
+            for msg in new_messages:
+                yield f"id: {msg['id']}\ndata: {json.dumps(msg, ensure_ascii=False)}\n\n"
+            if new_messages:
+                last_id = new_messages[-1]['id']
+            else:
+                yield ': keep-alive\n\n'
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            version, _ = chat_events.wait('chat', version, timeout=min(EVENT_WAIT_SECONDS, remaining))
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/messages', methods=['POST'])
 @admin_required
@@ -563,21 +1062,9 @@ def send_message():
     if not content:
         return jsonify({'success': False, 'message': 'Empty message'}), 400
         
-    messages = load_messages()
-    
-    # Optional: limit history size
-    if len(messages) > 100:
-        messages = messages[-100:]
-        
-    new_msg = {
-        'id': int(time.time() * 1000),
-        'sender': 'Admin',
-        'content': content,
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-    }
-    
-    messages.append(new_msg)
-    save_messages(messages)
+    # O(1) append; the log compacts itself once it grows past its history size
+    new_msg = message_log.append('Admin', content)
+    chat_events.publish('chat', new_msg['id'])
     
     return jsonify({'success': True, 'message': 'Message sent'})
 
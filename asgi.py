@@ -0,0 +1,534 @@
+"""ASGI entry point: the same app on an async server.
+
+    pip install uvicorn httpx        # httpx is optional, see nowpayments.py
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The long-lived and slow endpoints run as coroutines on the event loop, so an
+idle video viewer, chat subscriber or payment poller holds no thread:
+
+* ``/stream-video/<n>``      - each chunk is read in a worker thread, then the
+  coroutine waits on the socket (Range/ETag logic from video_stream.py)
+* ``/api/messages/stream``   - chat SSE, woken by ``EventHub.wait_async``
+* ``/payment-events/<n>``    - payment SSE, same
+* ``/create-crypto-payment``, ``/check-payment/<n>`` - NOWPayments calls
+  through ``AsyncNowPaymentsClient``
+
+Everything else goes to the Flask app unchanged, run in a thread pool by a
+small WSGI bridge. So do the cases the handlers above leave to Flask: no
+session, unpaid user, unexpected input. The session is Flask's own signed
+cookie, decoded here with the app's serializer, so both sides share logins.
+"""
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from itsdangerous import BadSignature
+from werkzeug.wrappers import Request
+
+import app as alpha
+from nowpayments import TRANSPORT_ERRORS, AsyncNowPaymentsClient, NowPaymentsError
+from video_stream import offload_video, plan_video
+
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))  # Threads running Flask views
+BODY_SPOOL_SIZE = 1024 * 1024  # Request bodies larger than this are buffered on disk
+
+flask_app = alpha.app
+async_nowpayments = AsyncNowPaymentsClient(alpha.nowpayments)
+session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+io_executor = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix='asgi-io')
+
+
+# --- Requests ---
+
+def wsgi_environ(scope, body, content_length=None):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        if key in environ:
+            environ[key] += ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        else:
+            environ[key] = value
+    if content_length is not None:
+        environ['CONTENT_LENGTH'] = str(content_length)
+    return environ
+
+
+class Incoming:
+    """One ASGI request: parsed headers, Flask session, body, disconnect flag"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.disconnected = False
+        # Header/query parsing only (Range, If-None-Match, args, cookies)
+        self.request = Request(wsgi_environ(scope, io.BytesIO()))
+        self.session = self._load_session()  # signature only; see check_session()
+        self._body = None
+        self._body_size = 0
+        self._watcher = None
+
+    def _load_session(self):
+        cookie = self.request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            return {}
+        try:
+            return session_serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    async def check_session(self):
+        """Drop a session ended by a forced logout (Flask clears the cookie when it answers)"""
+        if 'user_id' in self.session and await asyncio.to_thread(alpha.session_revoked, self.session):
+            self.session = {}
+
+    async def body(self):
+        """Request body as a file positioned at 0 (read once)"""
+        if self._body is None:
+            self._body = tempfile.SpooledTemporaryFile(BODY_SPOOL_SIZE)
+            more_body = True
+            while more_body:
+                message = await self.receive()
+                if message['type'] == 'http.disconnect':
+                    self.disconnected = True
+                    break
+                chunk = message.get('body', b'')
+                self._body.write(chunk)
+                self._body_size += len(chunk)
+                more_body = message.get('more_body', False)
+        self._body.seek(0)
+        return self._body
+
+    async def json(self):
+        """Parsed JSON body, or None if it isn't a JSON request"""
+        if not self.request.is_json:
+            return None
+        try:
+            return json.loads((await self.body()).read())
+        except ValueError:
+            return None
+
+    async def environ(self):
+        body = await self.body()
+        return wsgi_environ(self.scope, body, self._body_size)
+
+    def watch_disconnect(self):
+        """Flag the request once the client goes away (after the body is read)"""
+        async def watch():
+            while True:
+                message = await self.receive()
+                if message['type'] == 'http.disconnect':
+                    self.disconnected = True
+                    return
+        if self._watcher is None:
+            self._watcher = asyncio.ensure_future(watch())
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._body is not None:
+            self._body.close()
+
+
+# --- Responses ---
+
+async def respond(send, status, body=b'', content_type='text/html; charset=utf-8', headers=()):
+    headers = list(headers)
+    if status != 304:
+        headers += [(b'content-type', content_type.encode('latin-1')),
+                    (b'content-length', str(len(body)).encode('latin-1'))]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond_json(send, data, status=200, headers=()):
+    response = flask_app.json.response(data)  # same bytes as jsonify()
+    await respond(send, status, response.get_data(), response.content_type, headers)
+
+
+async def refuse_over_limit(incoming, send, limit, user_id):
+    """Flask's @rate_limited for the handlers here; True if refused with 429"""
+    # SQLite buckets wait on a write lock: off the event loop
+    retry_after = await asyncio.to_thread(
+        alpha.rate_limiter.check, limit, ip=alpha.client_ip(incoming.request), user=user_id)
+    if not retry_after:
+        return False
+    body, seconds = alpha.rate_limit_body(retry_after)
+    await respond_json(send, body, 429, encode_headers([('Retry-After', seconds)]))
+    return True
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]
+
+
+async def start_event_stream(send):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': encode_headers([('Content-Type', 'text/event-stream; charset=utf-8'),
+                                   ('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')]),
+    })
+
+
+async def send_event(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+def _read_at(f, position, size):
+    f.seek(position)
+    return f.read(size)
+
+
+async def send_file_range(send, incoming, path, start, stop, chunk_size):
+    loop = asyncio.get_running_loop()
+    with open(path, 'rb') as f:
+        position = start
+        while position < stop and not incoming.disconnected:
+            chunk = await loop.run_in_executor(io_executor, _read_at, f, position, min(chunk_size, stop - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': position < stop})
+    if position < stop:
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+# --- Flask for everything else ---
+
+class WsgiBridge:
+    """Runs a WSGI app in a thread pool and streams its response back.
+
+    The worker thread hands chunks over a small queue, so a slow client
+    slows the view down instead of buffering its whole response.
+    """
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, incoming, send):
+        environ = await incoming.environ()
+        incoming.watch_disconnect()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=4)
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def run():
+            state = {}
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and state.get('sent'):
+                    raise exc_info[1].with_traceback(exc_info[2])
+                state['start'] = {'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                                  'headers': encode_headers(headers)}
+                return write
+
+            def write(data):
+                if data:
+                    if not state.get('sent'):
+                        state['sent'] = True
+                        emit(state['start'])
+                    emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        write(chunk)
+                        if incoming.disconnected:
+                            break
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+                if not state.get('sent'):
+                    state['sent'] = True
+                    emit(state['start'])
+                emit({'type': 'http.response.body', 'body': b''})
+            except BaseException as e:
+                emit(e)
+            finally:
+                emit(None)
+
+        worker = loop.run_in_executor(self.executor, run)
+        started = finished = False
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                if isinstance(message, BaseException):
+                    flask_app.logger.error("[ASGI] %s %s failed", incoming.method, incoming.scope['path'],
+                                           exc_info=message)
+                    if not started:
+                        await respond(send, 500, b'Internal Server Error', 'text/plain; charset=utf-8')
+                        started = finished = True
+                    continue
+                if message['type'] == 'http.response.start':
+                    started = True
+                else:
+                    finished = not message.get('more_body', False)
+                await send(message)
+            if started and not finished:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Client gone or send failed: let the worker finish instead of
+            # blocking on a full queue
+            incoming.disconnected = True
+            while not worker.done():
+                try:
+                    if await asyncio.wait_for(queue.get(), 1) is None:
+                        break
+                except asyncio.TimeoutError:
+                    pass
+            await worker
+
+
+wsgi = WsgiBridge(flask_app, WSGI_THREADS)
+
+
+# --- Async endpoints (return False to let Flask answer) ---
+
+async def stream_video(incoming, send, video_num):
+    session = incoming.session
+    if 'user_id' not in session:
+        return False
+    user = await asyncio.to_thread(alpha.get_user, session['user_id'])
+    if not user or not user.get('has_paid', False):
+        return False
+
+    claims = await asyncio.to_thread(
+        alpha.video_tokens.verify, session.get('video_token'), video_num, user_id=session['user_id'])
+    if not claims:
+        await respond(send, 403, b'Unauthorized')
+        return True
+
+    video = alpha.media_catalog.get(video_num)
+    if video is None:
+        await respond(send, 404, b'Video not found')
+        return True
+
+    byte_range = incoming.request.range
+    if byte_range is None or byte_range.ranges[0][0] == 0:
+        flask_app.logger.info("[VIDEO ACCESS] User: %s | Video: %s", user['username'], video_num)
+
+    mimetype = video.mimetype
+    if alpha.VIDEO_DELIVERY != 'app':
+        response = offload_video(video.path, mimetype, alpha.VIDEO_DELIVERY, alpha.VIDEO_ACCEL_PREFIX)
+        await respond(send, response.status_code, b'', mimetype,
+                      encode_headers((k, v) for k, v in response.headers.items()
+                                     if k.lower() not in ('content-type', 'content-length')))
+        return True
+
+    status, headers, start, stop = plan_video(video.path, incoming.request, video.stat)
+    if status in (304, 416):
+        await respond(send, status, b'', 'text/html; charset=utf-8', encode_headers(headers.items()))
+        return True
+
+    headers.update({'Content-Type': mimetype, 'Content-Length': stop - start})
+    await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers.items())})
+    if incoming.method == 'HEAD' or stop == start:
+        await send({'type': 'http.response.body', 'body': b''})
+        return True
+    alpha.VIDEO_BYTES.inc(stop - start, video=video_num)
+    incoming.watch_disconnect()
+    await send_file_range(send, incoming, video.path, start, stop, alpha.VIDEO_CHUNK_SIZE)
+    return True
+
+
+async def stream_messages(incoming, send):
+    request = incoming.request
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    incoming.watch_disconnect()
+    await start_event_stream(send)
+
+    last_id = since
+    deadline = time.time() + alpha.CHAT_STREAM_MAX_SECONDS
+    version, _ = alpha.chat_events.latest('chat')
+    await send_event(send, 'retry: 3000\n\n')
+    while time.time() < deadline and not incoming.disconnected:
+        # Ring buffer read plus a stat() for lines other workers appended:
+        # cheaper inline than a thread hop per subscriber, and never waits
+        # for an append holding the log's lock
+        new_messages = alpha.messages_since(last_id, wait=False)
+        for msg in new_messages:
+            await send_event(send, f"id: {msg['id']}\ndata: {json.dumps(msg, ensure_ascii=False)}\n\n")
+        if new_messages:
+            last_id = new_messages[-1]['id']
+        else:
+            await send_event(send, ': keep-alive\n\n')
+        version, _ = await alpha.chat_events.wait_async('chat', version, timeout=alpha.EVENT_WAIT_SECONDS)
+    await send({'type': 'http.response.body', 'body': b''})
+    return True
+
+
+async def payment_events_stream(incoming, send, payment_id):
+    user_id = incoming.session.get('user_id')
+    if not user_id:
+        return False
+    if not await asyncio.to_thread(alpha.owns_payment, payment_id, user_id):
+        await respond_json(send, {'success': False, 'message': 'Payment not found'}, 404)
+        return True
+    incoming.watch_disconnect()
+    await start_event_stream(send)
+
+    # The current state goes out first, unless a reconnecting client already has it
+    seen = incoming.request.headers.get('Last-Event-ID')
+    deadline = time.time() + alpha.PAYMENT_EVENTS_MAX_SECONDS
+    version, _ = alpha.payment_events.latest(payment_id)
+    last_sent = None
+    await send_event(send, 'retry: 5000\n\n')
+    while time.time() < deadline and not incoming.disconnected:
+        payload = await asyncio.to_thread(alpha.payment_status_payload, payment_id)
+        if payload and payload != last_sent and alpha.payment_event_id(payload) != seen:
+            last_sent = payload
+            await send_event(send, f"id: {alpha.payment_event_id(payload)}\ndata: {json.dumps(payload)}\n\n")
+        else:
+            await send_event(send, ': keep-alive\n\n')
+        if payload and (payload['payment_status'] in alpha.FINAL_PAYMENT_STATUSES or payload['has_access']):
+            break  # nothing further will come (sent now or by an earlier connection)
+        version, _ = await alpha.payment_events.wait_async(payment_id, version, timeout=alpha.EVENT_WAIT_SECONDS)
+    await send({'type': 'http.response.body', 'body': b''})
+    return True
+
+
+async def create_crypto_payment(incoming, send):
+    user_id = incoming.session.get('user_id')
+    data = await incoming.json()
+    if not user_id or not isinstance(data, dict) or not isinstance(data.get('crypto', 'btc'), str):
+        return False
+    if await refuse_over_limit(incoming, send, 'create_payment', user_id):
+        return True
+    crypto_currency = data.get('crypto', 'btc').lower()
+    if crypto_currency not in alpha.VALID_CRYPTOS:
+        await respond_json(send, {'success': False, 'message': 'Invalid cryptocurrency'}, 400)
+        return True
+
+    try:
+        payment_info = await async_nowpayments.create_payment(alpha.crypto_payment_request(user_id, crypto_currency))
+        payload = await asyncio.to_thread(alpha.register_crypto_payment, user_id, payment_info)
+    except NowPaymentsError as e:
+        await respond_json(send, {'success': False, 'message': e.message or 'Payment creation failed'}, 400)
+        return True
+    except TRANSPORT_ERRORS as e:
+        await respond_json(send, {'success': False, 'message': f'API Error: {str(e)}'}, 500)
+        return True
+    except Exception as e:
+        await respond_json(send, {'success': False, 'message': f'Server Error: {str(e)}'}, 500)
+        return True
+    await respond_json(send, payload)
+    return True
+
+
+async def check_payment(incoming, send, payment_id):
+    user_id = incoming.session.get('user_id')
+    if not user_id:
+        return False
+    if await refuse_over_limit(incoming, send, 'check_payment', user_id):
+        return True
+    try:
+        if not await asyncio.to_thread(alpha.owns_payment, payment_id, user_id):
+            await respond_json(send, {'success': False, 'message': 'Payment not found'}, 404)
+            return True
+        payload = await asyncio.to_thread(alpha.local_payment_status, payment_id)
+        if payload is None:
+            try:
+                payment_data = await async_nowpayments.get_payment_status(payment_id)
+            except NowPaymentsError:
+                await respond_json(send, {'success': False, 'message': 'Payment not found'}, 404)
+                return True
+            payload = await asyncio.to_thread(alpha.upstream_payment_payload, payment_data, user_id)
+    except Exception as e:
+        await respond_json(send, {'success': False, 'message': str(e)}, 500)
+        return True
+    await respond_json(send, payload)
+    return True
+
+
+# (methods, path pattern, Flask rule for metrics, handler)
+ROUTES = [
+    (('GET', 'HEAD'), re.compile(r'/stream-video/(\d+)'), '/stream-video/<int:video_num>', stream_video),
+    (('GET',), re.compile(r'/api/messages/stream'), '/api/messages/stream', stream_messages),
+    (('GET',), re.compile(r'/payment-events/(\d+)'), '/payment-events/<int:payment_id>', payment_events_stream),
+    (('POST',), re.compile(r'/create-crypto-payment'), '/create-crypto-payment', create_crypto_payment),
+    (('GET',), re.compile(r'/check-payment/(\d+)'), '/check-payment/<int:payment_id>', check_payment),
+]
+
+
+def timed(send, rule, method):
+    """Record the same request metric Flask's after_request does"""
+    started = time.perf_counter()
+
+    async def timed_send(message):
+        if message['type'] == 'http.response.start':
+            alpha.REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                          route=rule, method=method, status=message['status'])
+        await send(message)
+    return timed_send
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_nowpayments.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return  # no websockets
+
+    incoming = Incoming(scope, receive)
+    try:
+        for methods, pattern, rule, handler in ROUTES:
+            match = pattern.fullmatch(scope['path'])
+            if match and incoming.method in methods:
+                await incoming.check_session()
+                args = [int(group) for group in match.groups()]
+                if await handler(incoming, timed(send, rule, incoming.method), *args):
+                    return
+                break
+        await wsgi(incoming, send)
+    finally:
+        incoming.close()
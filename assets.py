@@ -0,0 +1,58 @@
+"""Fingerprinted, precompressed static assets (built by build_assets.py).
+
+``Assets.url('chat.js')`` - the ``asset_url()`` template global - returns
+``/static/dist/chat.<hash>.js`` when the build manifest lists the file, and
+``/static/chat.js`` otherwise (no build, e.g. in development).
+
+``Assets.send()`` serves a built file: the ``.br`` or ``.gz`` variant the
+client accepts, with ``Cache-Control: immutable`` - a built file's name
+changes whenever its content does, so browsers never need to revalidate.
+"""
+import json
+import mimetypes
+import os
+
+from flask import send_from_directory
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # Preferred first
+
+
+class Assets:
+    def __init__(self, static_folder, static_url_path, dist='dist'):
+        self.static_url_path = static_url_path.rstrip('/')
+        self.dist_dir = os.path.join(static_folder, dist)
+        self.manifest = {}
+        path = os.path.join(self.dist_dir, 'manifest.json')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        self._variants = {}  # built file -> encodings present on disk (built files never change)
+
+    def url(self, filename):
+        return f'{self.static_url_path}/{self.manifest.get(filename, filename)}'
+
+    def _encodings(self, filename):
+        found = self._variants.get(filename)
+        if found is None:
+            path = os.path.join(self.dist_dir, filename)
+            found = tuple((encoding, suffix) for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix))
+            if os.path.isfile(path):  # don't remember names that 404
+                self._variants[filename] = found
+        return found
+
+    def send(self, filename, accept_encodings):
+        """Response for ``/static/dist/<filename>`` (``accept_encodings``: ``request.accept_encodings``)"""
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encodings = self._encodings(filename)
+        for encoding, suffix in encodings:
+            if accept_encodings[encoding]:
+                response = send_from_directory(self.dist_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist_dir, filename, mimetype=mimetype)
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
@@ -0,0 +1,80 @@
+"""How many concurrent viewers one worker can authorize.
+
+Runs the real app (login, payment check, video token) on a single threaded
+server and has ``--viewers`` clients hammer /stream-video/<n> with 1 MB range
+requests, once with VIDEO_DELIVERY=app (Flask sends the bytes) and once with
+VIDEO_DELIVERY=x-accel (Flask only returns X-Accel-Redirect, as it would
+behind deploy/nginx.conf).
+
+    python benchmarks/bench_accel_authorize.py --viewers 64 --duration 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import connection, load_app, login, ms, percentile, request, run_threads, serve, update_cookie
+
+VIDEO_NUM = 3
+
+
+def run(mode, args, workdir):
+    users = [{'id': i, 'username': f'viewer{i}', 'password': 'pw', 'role': 'user', 'has_paid': True}
+             for i in range(1, args.viewers + 1)]
+    # Cheap KDF: logins are setup here, not what is measured
+    app_module = load_app(workdir, users, {'VIDEO_DELIVERY': mode, 'PASSWORD_HASH_ITERATIONS': '1000'})
+    with open(os.path.join(workdir, 'course', f'{VIDEO_NUM}.mp4'), 'wb') as f:
+        f.write(os.urandom(args.file_mb * 1024 * 1024))
+    app_module.media_catalog.rescan()  # added after start-up
+
+    latencies = []
+    errors = [0]
+    with serve(app_module.app) as port:
+        cookies = []
+        for user in users:
+            conn = connection(port)
+            cookie = login(conn, user['username'], user['password'])
+            resp, _ = request(conn, 'GET', '/course', cookie=cookie)
+            cookies.append(update_cookie(cookie, resp))
+            conn.close()
+
+        def viewer(index, deadline):
+            conn = connection(port)
+            offset = 0
+            while time.perf_counter() < deadline:
+                headers = {'Range': f'bytes={offset}-{offset + 1024 * 1024 - 1}'}
+                t0 = time.perf_counter()
+                resp, _ = request(conn, 'GET', f'/stream-video/{VIDEO_NUM}', cookie=cookies[index], headers=headers)
+                latencies.append(time.perf_counter() - t0)
+                if resp.status not in (200, 206):
+                    errors[0] += 1
+                offset = (offset + 1024 * 1024) % (args.file_mb * 1024 * 1024)
+            conn.close()
+
+        elapsed = run_threads(args.viewers, viewer, args.duration)
+    return len(latencies) / elapsed, percentile(latencies, 50), percentile(latencies, 99), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--viewers', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--file-mb', type=int, default=64)
+    parser.add_argument('--mode', choices=['app', 'x-accel'])
+    args = parser.parse_args()
+
+    if args.mode:
+        with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+            rps, p50, p99, errors = run(args.mode, args, workdir)
+        print(f"{args.mode:8} {args.viewers:5} viewers  {rps:9.1f} auth/s  p50 {ms(p50)}  p99 {ms(p99)}  errors {errors}")
+        return
+    # Each mode in a fresh process: app.py reads its config at import time
+    for mode in ('app', 'x-accel'):
+        subprocess.run([sys.executable, __file__, '--mode', mode, '--viewers', str(args.viewers),
+                        '--duration', str(args.duration), '--file-mb', str(args.file_mb)], check=True)
+
+
+if __name__ == '__main__':
+    main()
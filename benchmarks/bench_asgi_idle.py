@@ -0,0 +1,165 @@
+"""Idle subscribers: threaded WSGI server vs the ASGI entry point.
+
+Opens ``--subscribers`` chat event streams (/api/messages/stream) against
+one server process, then measures with all of them connected:
+
+* server threads and RSS (from /proc)
+* p50/p99 of an ordinary request (GET /api/messages) from another client
+* fan-out: time from an admin posting a message until every subscriber has
+  received it
+
+``wsgi`` is the app on werkzeug's threaded server (one thread per open
+stream, like ``app.run()``); ``asgi`` is ``uvicorn asgi:app`` (needs
+``pip install uvicorn``).
+
+    python benchmarks/bench_asgi_idle.py --subscribers 1000 --modes wsgi,asgi
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, connection, login, ms, percentile, request
+
+from passwords import hash_password
+
+ADMIN = {'id': 1, 'username': 'bench-admin', 'role': 'admin', 'has_paid': True}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, workdir, port):
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL='WARNING', PASSWORD_HASH_ITERATIONS='1000', RATE_LIMITS='off')
+    if mode == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+               '--log-level', 'warning', '--no-access-log']
+    else:
+        env['SYNC_STREAM_SECONDS'] = '600'  # long streams on the threads, not the default short polls
+        cmd = [sys.executable, os.path.abspath(__file__), '--serve-wsgi', str(port)]
+    server = subprocess.Popen(cmd, cwd=workdir, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def serve_wsgi(port):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    sys.path.insert(0, os.getcwd())
+    import app
+    make_server('127.0.0.1', port, app.app, threaded=True, request_handler=QuietHandler).serve_forever()
+
+
+def process_stats(pid):
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            values[key] = rest.strip()
+    return int(values['Threads']), int(values['VmRSS'].split()[0]) / 1024
+
+
+def open_subscribers(port, count, since):
+    selector = selectors.DefaultSelector()
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(f'GET /api/messages/stream?since={since} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, bytearray())
+    return selector
+
+
+def wait_for(selector, marker, timeout):
+    """Read every stream until each has received ``marker``; returns how many did"""
+    pending = {key.fileobj for key in selector.get_map().values()}
+    deadline = time.perf_counter() + timeout
+    while pending and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            data = key.fileobj.recv(65536)
+            key.data.extend(data)
+            if marker in key.data:
+                pending.discard(key.fileobj)
+                key.data.clear()
+    return len(selector.get_map()) - len(pending)
+
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        os.makedirs(os.path.join(workdir, 'course'))
+        with open(os.path.join(workdir, 'users.json'), 'w') as f:
+            json.dump([dict(ADMIN, password=hash_password('pw', 1000))], f)
+        port = free_port()
+        server = start_server(mode, workdir, port)
+        try:
+            conn = connection(port)
+            cookie = login(conn, ADMIN['username'], 'pw')
+            request(conn, 'POST', '/api/messages', {'content': 'warm-up'}, cookie=cookie)
+            _, data = request(conn, 'GET', '/api/messages')
+            since = json.loads(data)[-1]['id']
+
+            t0 = time.perf_counter()
+            selector = open_subscribers(port, args.subscribers, since)
+            connected = wait_for(selector, b'retry:', 60)
+            connect_seconds = time.perf_counter() - t0
+            time.sleep(1)
+            threads, rss = process_stats(server.pid)
+
+            latencies = []
+            for _ in range(args.samples):
+                t0 = time.perf_counter()
+                request(conn, 'GET', '/api/messages')
+                latencies.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            request(conn, 'POST', '/api/messages', {'content': 'fan-out'}, cookie=cookie)
+            received = wait_for(selector, b'fan-out', 60)
+            fanout = time.perf_counter() - t0
+
+            print(f"{mode:5} {connected:5}/{args.subscribers} streams in {connect_seconds:5.2f}s  "
+                  f"threads {threads:5}  RSS {rss:7.1f} MB  GET /api/messages p50 {ms(percentile(latencies, 50))} "
+                  f"p99 {ms(percentile(latencies, 99))}  fan-out to {received} in {ms(fanout)}")
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--serve-wsgi', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_wsgi:
+        serve_wsgi(args.serve_wsgi)
+        return
+    for mode in args.modes.split(','):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Static assets per page view: plain /static/ files vs the fingerprinted build.
+
+Renders each page as the paid user, then fetches every stylesheet and script
+it links the way a browser with ``Accept-Encoding: gzip`` would:
+
+* ``first``  - empty cache: one request per asset, bytes on the wire
+* ``repeat`` - warm cache: plain files are ``no-cache`` and get revalidated
+  (a conditional request each, 304), built files are ``immutable`` and are
+  not requested at all
+
+``plain`` serves a copy of ``static/`` without a build, ``built`` runs
+build_assets.py on the copy first (the repo's own ``static/dist`` is left
+alone).
+
+    python benchmarks/bench_assets.py --repeat 200
+"""
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from common import ROOT, load_app
+
+from assets import Assets
+from build_assets import build
+
+USER = {'id': 2, 'username': 'bench-user', 'password': 'pw', 'role': 'user', 'has_paid': True}
+PAGES = ('/home', '/course', '/course-library')
+ASSET_URL = re.compile(r'(?:src|href|data-css)="(/static/[^"]+)"')
+
+
+def use_static(app_module, static_dir):
+    app = app_module.app
+    app.static_folder = static_dir
+    app_module.assets = Assets(static_dir, app.static_url_path)
+    app.jinja_env.globals['asset_url'] = app_module.assets.url
+    for page in (app_module.course_page, app_module.course_library_page):
+        page._mtime = None  # recompile with the new URLs
+
+
+def page_view(client, page, etags):
+    """One view of ``page``; returns (requests, bytes) for its assets"""
+    urls = ASSET_URL.findall(client.get(page).get_data(as_text=True))
+    requests = size = 0
+    for url in urls:
+        cache_control = etags.get(url, (None, ''))[1]
+        if 'immutable' in cache_control:
+            continue  # fresh in the browser cache
+        headers = {'Accept-Encoding': 'gzip'}
+        if url in etags:
+            headers['If-None-Match'] = etags[url][0]
+        response = client.get(url, headers=headers)
+        assert response.status_code in (200, 304), (url, response.status_code)
+        requests += 1
+        size += len(response.data)
+        if response.status_code == 200:
+            etags[url] = (response.headers.get('ETag'), response.headers.get('Cache-Control', ''))
+    return requests, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='page views timed per mode')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        app_module = load_app(workdir, [USER], {'PASSWORD_HASH_ITERATIONS': '1000', 'LOG_LEVEL': 'WARNING'})
+        shutil.copy(os.path.join(ROOT, 'course', 'index.html'), os.path.join(workdir, 'course', 'index.html'))
+        client = app_module.app.test_client()
+        client.post('/api/login', json={'username': USER['username'], 'password': USER['password']})
+
+        for mode in ('plain', 'built'):
+            static_dir = os.path.join(workdir, mode, 'static')  # Flask derives /static from the folder name
+            shutil.copytree(os.path.join(ROOT, 'static'), static_dir, ignore=shutil.ignore_patterns('dist'))
+            if mode == 'built':
+                build(static_dir)
+            use_static(app_module, static_dir)
+            for page in PAGES:
+                etags = {}
+                first = page_view(client, page, etags)
+                repeat = page_view(client, page, etags)
+                t0 = time.perf_counter()
+                for _ in range(args.repeat):
+                    page_view(client, page, etags)
+                per_view = (time.perf_counter() - t0) / args.repeat
+                print(f"{mode:5} {page:16} first {first[0]:2} requests {first[1] / 1024:6.1f} KB  "
+                      f"repeat {repeat[0]:2} requests {repeat[1]:6} B  {per_view * 1000:6.2f}ms/view")
+
+
+if __name__ == '__main__':
+    main()
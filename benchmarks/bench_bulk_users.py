@@ -0,0 +1,91 @@
+"""Bulk user import/export: whole-payload JSON vs streamed NDJSON.
+
+For each size, a fresh app (SQLite store) imports a synthetic user set and
+exports it again, each case in its own process so peak RSS is comparable:
+
+* ``json``   - POST {"users": [...]} to /api/users/import (parsed at once)
+* ``ndjson`` - POST one user per line, parsed and committed in batches;
+  export with /api/users/export?format=ndjson, read chunk by chunk
+
+    python benchmarks/bench_bulk_users.py --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import load_app
+from passwords import hash_password
+
+ADMIN = {'id': 1, 'username': 'bench-admin', 'password': 'pw', 'role': 'admin', 'has_paid': True}
+
+
+def synthetic_users(count):
+    # Pre-hashed, as in an export; plaintext would be dominated by the KDF
+    password = hash_password('pw', iterations=1000)
+    for i in range(count):
+        yield {'username': f'user{i:07d}', 'password': password, 'role': 'user', 'has_paid': i % 3 == 0}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(mode, size, workdir):
+    app_module = load_app(workdir, [ADMIN])
+    client = app_module.app.test_client()
+    client.post('/api/login', json={'username': ADMIN['username'], 'password': ADMIN['password']})
+    rss_before = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    if mode == 'json':
+        payload = json.dumps({'users': list(synthetic_users(size))})
+        result = client.post('/api/users/import', data=payload, content_type='application/json').json
+    else:
+        path = os.path.join(workdir, 'users.ndjson')
+        with open(path, 'w') as f:
+            for user in synthetic_users(size):
+                f.write(json.dumps(user) + '\n')
+        with open(path, 'rb') as f:
+            result = client.post('/api/users/import', input_stream=f,
+                                 content_type='application/x-ndjson',
+                                 headers={'Content-Length': str(os.path.getsize(path))}).json
+    import_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if mode == 'json':
+        # What the old export did: build the whole document in memory
+        exported = len(json.dumps(app_module.load_users(), indent=4, ensure_ascii=False))
+    else:
+        response = client.get('/api/users/export?format=ndjson', buffered=False)
+        exported = sum(len(chunk) for chunk in response.response)
+        response.close()
+    export_seconds = time.perf_counter() - t0
+
+    print(f"{mode:7} {size:9}  import {import_seconds:8.2f}s ({size / import_seconds:9.0f} users/s, "
+          f"added {result['added']})  export {export_seconds:7.2f}s ({exported / 1e6:7.1f} MB)  "
+          f"peak RSS +{peak_rss_mb() - rss_before:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--modes', default='json,ndjson')
+    parser.add_argument('--case', nargs=2, metavar=('MODE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+            run_case(args.case[0], int(args.case[1]), workdir)
+        return
+    for size in (int(s) for s in args.sizes.split(',')):
+        for mode in args.modes.split(','):
+            subprocess.run([sys.executable, __file__, '--case', mode, str(size)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Course page rendering: per-request template compilation vs cached pages.
+
+* ``before`` - what /course-library and /course used to do: read
+  course/index.html and ``render_template_string`` it (compiled every time),
+  or ``render_template('course.html')`` (full render every time)
+* ``after``  - the real routes, served from ``page_cache.CoursePage``
+
+Both go through the full Flask stack (session, payment check, token issue)
+via the test client, so the numbers are requests/sec of the whole view.
+
+    python benchmarks/bench_course_render.py --seconds 5
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from common import ROOT, load_app
+
+USER = {'id': 1, 'username': 'bench-user', 'password': 'pw', 'role': 'user', 'has_paid': True}
+
+
+def add_legacy_routes(app_module):
+    from flask import render_template, render_template_string, session
+
+    app = app_module.app
+
+    @app.route('/legacy/course-library')
+    @app_module.payment_required
+    def legacy_course_library():
+        user = app_module.get_user(session['user_id'])
+        session['video_token'] = token = app_module.video_tokens.issue(user['id'])
+        with open(os.path.join(app_module.COURSE_VIDEO_DIR, 'index.html'), 'r', encoding='utf-8') as f:
+            return render_template_string(f.read(), user=user, video_token=token)
+
+    @app.route('/legacy/course')
+    @app_module.payment_required
+    def legacy_course():
+        user = app_module.get_user(session['user_id'])
+        session['video_token'] = token = app_module.video_tokens.issue(user['id'])
+        return render_template('course.html', user=user, video_token=token)
+
+
+def measure(client, path, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of each case')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        os.makedirs(os.path.join(workdir, 'course'))
+        shutil.copy(os.path.join(ROOT, 'course', 'index.html'), os.path.join(workdir, 'course', 'index.html'))
+        app_module = load_app(workdir, [USER])
+        add_legacy_routes(app_module)
+        client = app_module.app.test_client()
+        client.post('/api/login', json={'username': USER['username'], 'password': USER['password']})
+
+        for page in ('course-library', 'course'):
+            before = measure(client, f'/legacy/{page}', args.seconds)
+            after = measure(client, f'/{page}', args.seconds)
+            print(f"/{page:15} before {before:8.0f} req/s   after {after:8.0f} req/s   ({after / before:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Login latency by KDF cost and user count.
+
+For each PBKDF2 iteration count, a fresh app (SQLite store, username index)
+is loaded with ``users`` accounts already hashed at that cost, and
+/api/login is timed over HTTP: sequential p50/p99 for a valid login, a wrong
+password and an unknown username (these three should be close - no timing
+oracle), then throughput with ``--threads`` concurrent clients.
+``plain`` is the legacy plaintext format, as a baseline.
+
+    python benchmarks/bench_login.py --costs plain,100000,600000 --users 1000,100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import connection, load_app, ms, percentile, request, run_threads, serve
+from passwords import hash_password
+
+
+def timed_logins(port, username, password, count):
+    conn = connection(port)
+    latencies = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        request(conn, 'POST', '/api/login', {'username': username, 'password': password})
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+    return latencies
+
+
+def run(cost, user_count, args, workdir):
+    iterations = 1000 if cost == 'plain' else int(cost)
+    # One hash shared by every account: building 100k distinct hashes would
+    # take longer than the benchmark, and the lookup cost doesn't depend on it
+    stored = 'pw' if cost == 'plain' else hash_password('pw', iterations)
+    users = [{'id': i, 'username': f'user{i:07d}', 'password': stored, 'role': 'user', 'has_paid': False}
+             for i in range(1, user_count + 1)]
+    app_module = load_app(workdir, users, {'PASSWORD_HASH_ITERATIONS': str(iterations)})
+    if cost == 'plain':
+        # Keep the stored password plaintext (no upgrade on login)
+        app_module.needs_rehash = lambda stored, iterations: False
+    target = f'user{user_count // 2:07d}'
+
+    with serve(app_module.app) as port:
+        ok = timed_logins(port, target, 'pw', args.samples)
+        wrong = timed_logins(port, target, 'nope', args.samples)
+        unknown = timed_logins(port, 'nobody', 'pw', args.samples)
+
+        done = [0] * args.threads
+
+        def client(index, deadline):
+            conn = connection(port)
+            while time.perf_counter() < deadline:
+                request(conn, 'POST', '/api/login', {'username': target, 'password': 'pw'})
+                done[index] += 1
+            conn.close()
+
+        elapsed = run_threads(args.threads, client, args.seconds)
+
+    print(f"{cost:>7} {user_count:8}  ok p50 {ms(percentile(ok, 50))} p99 {ms(percentile(ok, 99))}  "
+          f"wrong p50 {ms(percentile(wrong, 50))}  unknown p50 {ms(percentile(unknown, 50))}  "
+          f"{args.threads} threads: {sum(done) / elapsed:8.1f} logins/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--costs', default='plain,100000,310000,600000')
+    parser.add_argument('--users', default='1000,100000')
+    parser.add_argument('--samples', type=int, default=20, help='sequential logins per case')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    for user_count in [int(n) for n in args.users.split(',')]:
+        for cost in args.costs.split(','):
+            with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+                run(cost, user_count, args, workdir)
+
+
+if __name__ == '__main__':
+    main()
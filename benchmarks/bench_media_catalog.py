@@ -0,0 +1,67 @@
+"""Video lookup per /stream-video request: filesystem checks vs the media catalog.
+
+Creates ``--videos`` small files in a temporary course folder, then times
+``--lookups`` random lookups:
+
+* ``stat``    - what stream_video did: ``os.path.exists`` then ``os.stat``
+  (the ETag) for ``<n>.mkv`` / ``<n>.mp4``
+* ``catalog`` - ``MediaCatalog.get(n)``, size and ETag included
+
+and one full ``rescan()`` (the background thread's cost every
+MEDIA_RESCAN_INTERVAL seconds) plus ``manifest()``.
+
+    python benchmarks/bench_media_catalog.py --videos 500 --lookups 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import common  # noqa: F401 (puts the repo on sys.path)
+
+from media_catalog import MediaCatalog
+
+
+def old_lookup(directory, video_num):
+    file_extension = 'mkv' if video_num <= 2 else 'mp4'
+    video_path = os.path.join(directory, f"{video_num}.{file_extension}")
+    if not os.path.exists(video_path):
+        return None
+    return os.stat(video_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--videos', type=int, default=500)
+    parser.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as directory:
+        for number in range(1, args.videos + 1):
+            with open(os.path.join(directory, f"{number}.{'mkv' if number <= 2 else 'mp4'}"), 'wb') as f:
+                f.write(b'\x00\x00\x00\x20ftypisom' + b'\x00' * 1024)
+        t0 = time.perf_counter()
+        catalog = MediaCatalog(directory, rescan_interval=0)  # no watcher thread: scans timed below
+        first_scan = time.perf_counter() - t0
+
+        rng = random.Random(1)
+        numbers = [rng.randint(1, args.videos + 10) for _ in range(args.lookups)]  # some misses
+        for name, lookup in (('stat', lambda n: old_lookup(directory, n)), ('catalog', catalog.get)):
+            t0 = time.perf_counter()
+            found = sum(lookup(n) is not None for n in numbers)
+            seconds = time.perf_counter() - t0
+            print(f"{name:8} {seconds / args.lookups * 1e6:7.2f}us/lookup  found {found}/{args.lookups}")
+
+        t0 = time.perf_counter()
+        catalog.rescan()
+        rescan = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        manifest = catalog.manifest(lambda number: f'/stream-video/{number}')
+        build = time.perf_counter() - t0
+        print(f"first scan {first_scan * 1000:.1f}ms  rescan {rescan * 1000:.1f}ms  "
+              f"manifest {build * 1000:.1f}ms ({len(manifest)} videos)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Payment status polling: one request per poll vs the pooled, caching client.
+
+Starts the local NOWPayments stub with ``--latency`` seconds of upstream
+delay and has ``--pollers`` threads (open checkout tabs) poll the same
+payment ``--polls`` times each, first with plain ``requests.get`` as the old
+check_payment() did, then through nowpayments.NowPaymentsClient.
+
+Then asserts the client's behaviour against the stub (exits non-zero if one
+fails):
+
+* ``--pollers`` concurrent polls of an uncached payment -> 1 upstream call
+* two 503s, then success -> the GET is retried, 3 upstream calls
+* a 503 on create-payment -> raised at once, the POST is never retried
+
+    python benchmarks/bench_nowpayments_client.py --pollers 50 --latency 0.2
+"""
+import argparse
+import threading
+import time
+
+from common import ms, percentile
+from stub_nowpayments import StubNowPayments
+
+import requests
+
+from nowpayments import NowPaymentsClient, NowPaymentsError
+
+
+def poll(pollers, polls, fetch):
+    latencies = []
+    errors = [0]
+
+    def worker():
+        for _ in range(polls):
+            t0 = time.perf_counter()
+            try:
+                fetch()
+            except Exception:
+                errors[0] += 1
+            latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker) for _ in range(pollers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started, latencies, errors[0]
+
+
+def upstream_calls(stub, action):
+    """Upstream requests ``action()`` made (the stub's count; the client's own
+    ``upstream_calls`` counts calls, not retries)"""
+    before = stub.requests
+    result = action()
+    return stub.requests - before, result
+
+
+def check_client(stub, pollers):
+    client = NowPaymentsClient('stub-key', stub.url, status_ttl=60, backoff=0.01)
+    payment_id = client.create_payment({'price_amount': 50, 'pay_currency': 'btc'})['payment_id']
+
+    # Concurrent polls of one uncached payment share a single upstream call
+    stub.latency, latency = max(stub.latency, 0.2), stub.latency  # long enough for every poller to join
+    barrier = threading.Barrier(pollers)
+    results = []
+
+    def poller():
+        barrier.wait()
+        results.append(client.get_payment_status(payment_id)['payment_id'])
+    calls, _ = upstream_calls(stub, lambda: poll(pollers, 1, poller))
+    stub.latency = latency
+    assert results == [payment_id] * pollers, f"{len(results)}/{pollers} polls answered"
+    assert calls == 1, f"{pollers} concurrent polls made {calls} upstream calls, expected 1"
+    print(f"ok  {pollers} concurrent polls -> 1 upstream call ({client.stats()['coalesced']} coalesced)")
+
+    # A GET is retried through transient 503s
+    client.invalidate(payment_id)
+    stub.fail_next = 2
+    calls, status = upstream_calls(stub, lambda: client.get_payment_status(payment_id))
+    assert status['payment_id'] == payment_id, status
+    assert calls == 3, f"2x 503 then success took {calls} upstream calls, expected 3"
+    print(f"ok  2x 503 then success -> status {status['payment_status']!r} after {calls} upstream calls")
+
+    # A POST is never retried: a retry after a lost response could create a second payment
+    stub.fail_next = 1
+
+    def create():
+        try:
+            client.create_payment({'price_amount': 50, 'pay_currency': 'btc'})
+        except NowPaymentsError as e:
+            return e.status_code
+    calls, status_code = upstream_calls(stub, create)
+    stub.fail_next = 0
+    assert status_code == 503, f"create-payment after a 503 returned {status_code}, expected the 503 error"
+    assert calls == 1, f"create-payment made {calls} upstream calls, expected 1 (no retry)"
+    print(f"ok  503 on create-payment -> error {status_code} after 1 upstream call, not retried")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--polls', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--status-ttl', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with StubNowPayments(latency=args.latency) as stub:
+        client = NowPaymentsClient('stub-key', stub.url, status_ttl=args.status_ttl, backoff=0.05)
+        payment_id = client.create_payment({'price_amount': 50, 'pay_currency': 'btc'})['payment_id']
+
+        def naive():
+            r = requests.get(f"{stub.url}/payment/{payment_id}", headers={'x-api-key': 'stub-key'}, timeout=10)
+            r.raise_for_status()
+
+        for name, fetch in (('requests.get (old)', naive),
+                            ('NowPaymentsClient', lambda: client.get_payment_status(payment_id))):
+            before = stub.requests
+            elapsed, latencies, errors = poll(args.pollers, args.polls, fetch)
+            print(f"{name:20} {len(latencies):6} polls  {stub.requests - before:6} upstream  "
+                  f"{elapsed:6.2f}s  p50 {ms(percentile(latencies, 50))}  p99 {ms(percentile(latencies, 99))}  "
+                  f"errors {errors}")
+        print(f"client stats: {client.stats()}")
+
+        check_client(stub, args.pollers)
+
+
+if __name__ == '__main__':
+    main()
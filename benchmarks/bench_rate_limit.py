@@ -0,0 +1,88 @@
+"""Rate limiting: cost of a check, and what a login flood costs with and without it.
+
+* ``check`` - ``RateLimiter.check('login', ip=..., user=...)`` (two buckets)
+  for ``--checks`` calls spread over ``--keys`` clients, per backend
+  (``memory``, ``sqlite``): time per check and buckets kept afterwards
+  (bounded by ``--max-keys``)
+* ``flood`` - one IP sends ``--flood`` wrong-password logins for one account
+  through the test client (PBKDF2 at ``--iterations``), with the default
+  limits and with ``RATE_LIMITS=off``; then the account's owner logs in
+  from another address (not locked out: the user bucket is per IP + username)
+
+    python benchmarks/bench_rate_limit.py --checks 200000 --keys 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import load_app
+
+from passwords import hash_password
+from rate_limit import RateLimiter, create_buckets
+
+USERS = [
+    {'id': 1, 'username': 'victim', 'password': 'pw', 'role': 'user', 'has_paid': False},
+]
+
+
+def bench_checks(backend, args, workdir):
+    buckets = create_buckets(backend, args.max_keys, os.path.join(workdir, f'{backend}.db'))
+    limiter = RateLimiter(buckets, {'login': {'ip': '20/minute', 'user': '10/minute'}})
+    rng = random.Random(1)
+    clients = [(f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', f'user{i}') for i in range(args.keys)]
+    calls = [clients[rng.randrange(args.keys)] for _ in range(args.checks)]
+    refused = 0
+    t0 = time.perf_counter()
+    for ip, user in calls:
+        refused += bool(limiter.check('login', ip=ip, user=user))
+    seconds = time.perf_counter() - t0
+    stats = buckets.stats()
+    print(f"check  {backend:7} {seconds / args.checks * 1e6:8.2f}us/check  {args.checks / seconds:10.0f}/s  "
+          f"refused {refused:7}  buckets {stats['size']}/{stats['max_size']} (evicted {stats['evicted']})")
+
+
+def bench_flood(limits, args, workdir):
+    os.makedirs(workdir)
+    users = [dict(user, password=hash_password(user['password'], args.iterations)) for user in USERS]
+    app_module = load_app(workdir, users, {'PASSWORD_HASH_ITERATIONS': str(args.iterations),
+                                           'LOG_LEVEL': 'WARNING', 'RATE_LIMITS': limits})
+    attacker = app_module.app.test_client()
+    statuses = {}
+    t0 = time.perf_counter()
+    for _ in range(args.flood):
+        response = attacker.post('/api/login', json={'username': 'victim', 'password': 'guess'},
+                                 environ_base={'REMOTE_ADDR': '203.0.113.7'})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    flood = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    response = app_module.app.test_client().post('/api/login', json={'username': 'victim', 'password': 'pw'},
+                                                 environ_base={'REMOTE_ADDR': '198.51.100.2'})
+    legit = time.perf_counter() - t0
+    label = limits or 'default'
+    print(f"flood  {label:7} {args.flood} logins in {flood:7.2f}s ({flood / args.flood * 1000:7.2f}ms each)  "
+          f"status {dict(sorted(statuses.items()))}  owner's login {response.status_code} "
+          f"in {legit * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=50000, help='distinct clients (IP + username)')
+    parser.add_argument('--max-keys', type=int, default=100000, help='bucket store bound (RATE_LIMIT_KEYS)')
+    parser.add_argument('--backends', default='memory,sqlite')
+    parser.add_argument('--flood', type=int, default=200, help='attacker login attempts')
+    parser.add_argument('--iterations', type=int, default=100000, help='PBKDF2 cost per login')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        for backend in args.backends.split(','):
+            bench_checks(backend, args, workdir)
+        for limits in ('', 'off'):
+            bench_flood(limits, args, os.path.join(workdir, f'flood-{limits or "default"}'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Admin user listing: the whole list vs one indexed page.
+
+Fills a fresh SQLite store with ``--users`` accounts, then times through the
+test client (``--repeat`` runs each, median):
+
+* ``full``     - GET /api/users (every user, what the admin page used to load)
+* ``page``     - GET /api/users?limit=50 (first page)
+* ``deep``     - the page after ``--deep`` rows, by cursor (keyset, no OFFSET scan)
+* ``offset``   - the same page by offset
+* ``filtered`` - GET /api/users?prefix=user00&role=user&has_paid=true&limit=50
+
+    python benchmarks/bench_user_listing.py --users 100000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from common import load_app
+
+from passwords import hash_password
+
+ADMIN = {'id': 1, 'username': 'bench-admin', 'password': 'pw', 'role': 'admin', 'has_paid': True}
+
+
+def timed(client, url, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - t0)
+        assert response.status_code == 200, (url, response.status_code)
+    return statistics.median(samples), len(response.data), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--deep', type=int, default=50000, help='rows skipped for the deep page')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        app_module = load_app(workdir, [ADMIN], {'PASSWORD_HASH_ITERATIONS': '1000', 'LOG_LEVEL': 'WARNING'})
+        password = hash_password('pw', 1000)
+        app_module.user_store.add_many([{'username': f'user{i:07d}', 'password': password,
+                                         'role': 'user', 'has_paid': i % 3 == 0} for i in range(args.users)])
+        client = app_module.app.test_client()
+        client.post('/api/login', json={'username': ADMIN['username'], 'password': ADMIN['password']})
+
+        deep = min(args.deep, args.users - 50)
+        cursor = app_module.encode_cursor('id', deep)  # ids are 1..N: row ``deep`` has id ``deep``
+        cases = {
+            'full': '/api/users',
+            'page': '/api/users?limit=50',
+            'deep': f'/api/users?limit=50&cursor={cursor}',
+            'offset': f'/api/users?limit=50&offset={deep}',
+            'filtered': '/api/users?prefix=user00&role=user&has_paid=true&limit=50',
+        }
+        print(f"{args.users} users")
+        for name, url in cases.items():
+            seconds, size, response = timed(client, url, args.repeat)
+            total = response.json['total'] if isinstance(response.json, dict) else len(response.json)
+            print(f"{name:9} {seconds * 1000:9.2f}ms  {size / 1024:9.1f} KB  total {total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Concurrent range readers: legacy send_file path vs video_stream.send_video.
+
+Each reader thread keeps one keep-alive connection and requests random
+``--range-size`` byte ranges of a ``--file-mb`` test file, the way a video
+player does while seeking. Reports aggregate throughput and time-to-first-byte.
+
+    python benchmarks/bench_video_stream.py --readers 16 --duration 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import connection, ms, percentile, run_threads, serve
+
+from flask import Flask, send_file
+
+from video_stream import send_video
+
+
+def build_app(video_path, chunk_size):
+    app = Flask(__name__)
+
+    @app.route('/legacy')
+    def legacy():
+        return send_file(video_path, mimetype='video/mp4')
+
+    @app.route('/range')
+    def ranged():
+        return send_video(video_path, 'video/mp4', chunk_size=chunk_size)
+
+    return app
+
+
+def bench(port, path, file_size, readers, duration, range_size):
+    ttfb = []
+    total_bytes = [0] * readers
+
+    def reader(index, deadline):
+        rng = random.Random(index)
+        conn = connection(port)
+        while time.perf_counter() < deadline:
+            start = rng.randrange(0, max(1, file_size - range_size))
+            headers = {'Range': f'bytes={start}-{start + range_size - 1}'}
+            t0 = time.perf_counter()
+            conn.request('GET', path, headers=headers)
+            resp = conn.getresponse()
+            first = resp.read(1)
+            ttfb.append(time.perf_counter() - t0)
+            rest = resp.read()
+            total_bytes[index] += len(first) + len(rest)
+        conn.close()
+
+    elapsed = run_threads(readers, reader, duration)
+    mb = sum(total_bytes) / (1024 * 1024)
+    return {
+        'requests': len(ttfb),
+        'throughput': mb / elapsed,
+        'ttfb_p50': percentile(ttfb, 50),
+        'ttfb_p99': percentile(ttfb, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file-mb', type=int, default=256)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--range-size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'bench.mp4')
+        with open(video_path, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.file_mb):
+                f.write(block)
+        file_size = os.path.getsize(video_path)
+
+        app = build_app(video_path, args.chunk_size)
+        with serve(app) as port:
+            print(f"{args.readers} readers, {args.range_size} byte ranges, {args.file_mb} MB file")
+            for name, path in (('send_file (legacy)', '/legacy'), ('send_video', '/range')):
+                r = bench(port, path, file_size, args.readers, args.duration, args.range_size)
+                print(f"{name:20} {r['requests']:7} req  {r['throughput']:9.1f} MB/s  "
+                      f"ttfb p50 {ms(r['ttfb_p50'])}  p99 {ms(r['ttfb_p99'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""NOWPayments IPN bursts: applied inside the request vs queued and batched.
+
+``--payments`` payments (one per user) each receive the usual status
+sequence (waiting, confirming, confirmed, finished), every callback sent
+``--retries`` times, from ``--threads`` concurrent senders on keep-alive
+connections to a threaded server:
+
+* ``inline`` - each callback applied in the request, like the old handler
+* ``queued`` - acknowledged at once; duplicates dropped, the rest applied
+  in batches by the webhook queue
+
+Reports ack latency (p50/p99), the time until every grant is visible, and
+how many user store writes it took.
+
+    python benchmarks/bench_webhooks.py --payments 500 --retries 3 --store json
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from common import connection, load_app, ms, percentile, request, run_threads, serve
+
+STATUSES = ('waiting', 'confirming', 'confirmed', 'finished')
+
+
+def callbacks(payments, retries, seed):
+    events = [(user_id, 5000000000 + user_id, status)
+              for user_id in range(2, payments + 2) for status in STATUSES for _ in range(retries)]
+    # Bursts interleave, retries of one status arrive close together
+    random.Random(seed).shuffle(events)
+    return events
+
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        users = [{'id': i, 'username': f'user{i}', 'password': 'x', 'role': 'user', 'has_paid': False}
+                 for i in range(1, args.users + 1)]
+        app_module = load_app(workdir, users, {'USER_STORE_BACKEND': args.store, 'LOG_LEVEL': 'WARNING'})
+        writes = [0]
+        store = app_module.user_store.store
+        for name in ('update', 'update_many'):
+            method = getattr(store, name)
+
+            def counted(*a, _method=method, **kw):
+                writes[0] += 1
+                return _method(*a, **kw)
+            setattr(store, name, counted)
+        if mode == 'inline':
+            # The old handler: every callback applied before the response
+            app_module.webhook_queue.submit = lambda payment_id, status, event: app_module.apply_webhook_events([event])
+
+        events = callbacks(args.payments, args.retries, args.seed)
+        latencies = []
+        with serve(app_module.app) as port:
+            t0 = time.perf_counter()
+
+            def sender(index, deadline):
+                conn = connection(port)
+                for user_id, payment_id, status in events[index::args.threads]:
+                    started = time.perf_counter()
+                    resp, _ = request(conn, 'POST', '/nowpayments-webhook', {
+                        'payment_id': payment_id, 'payment_status': status, 'pay_amount': 0.001,
+                        'actually_paid': 0.001, 'order_description': f'ALPHA Course - User {user_id}'})
+                    latencies.append(time.perf_counter() - started)
+                    assert resp.status == 200, resp.status
+
+            acked = run_threads(args.threads, sender, 0)
+            while app_module.webhook_queue.pending():
+                time.sleep(0.005)
+            applied = time.perf_counter() - t0
+        granted = sum(1 for user_id in range(2, args.payments + 2) if app_module.get_user(user_id)['has_paid'])
+        for registry in (app_module.pending_payments, app_module.processed_webhooks):
+            registry.flush()  # now, while workdir still exists
+        print(f"{mode:7} {len(events):6} callbacks  acked in {acked:6.2f}s  ack p50 {ms(percentile(latencies, 50))} "
+              f"p99 {ms(percentile(latencies, 99))}  all applied in {applied:6.2f}s  "
+              f"store writes {writes[0]:6}  granted {granted}/{args.payments}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payments', type=int, default=500)
+    parser.add_argument('--retries', type=int, default=3, help='copies of every callback')
+    parser.add_argument('--users', type=int, default=10000, help='accounts in the user store')
+    parser.add_argument('--store', default='sqlite', choices=('sqlite', 'json'))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--modes', default='inline,queued')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if args.payments + 1 > args.users:
+        parser.error('--payments must be smaller than --users')
+    for mode in args.modes.split(','):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Throughput across worker counts with serve.py's built-in prefork server.
+
+For each ``--workers`` count, starts ``serve.py --builtin`` on a temporary
+data set and runs ``--clients`` client processes x ``--threads`` threads on
+keep-alive connections for ``--seconds``, each looping over the same mix of
+GET /course, GET /api/messages and a 64 KB video Range request. Reports
+requests/sec and p50/p99 latency.
+
+Before the load it checks that state is really shared: a session from one
+login is accepted on every connection (i.e. by every worker), and after
+logout the old video token is refused (403) on all of them.
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --clients 4 --threads 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, connection, login, ms, percentile, request, run_threads, update_cookie
+
+from passwords import hash_password
+
+USERS = 16
+VIDEO_RANGE = 64 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def make_dataset(workdir):
+    os.makedirs(os.path.join(workdir, 'course'))
+    stored = hash_password('pw', 1000)
+    with open(os.path.join(workdir, 'users.json'), 'w') as f:
+        json.dump([{'id': i, 'username': f'user{i}', 'password': stored,
+                    'role': 'admin' if i == 1 else 'user', 'has_paid': True} for i in range(1, USERS + 1)], f)
+    with open(os.path.join(workdir, 'course', '3.mp4'), 'wb') as f:
+        f.write(os.urandom(8 * 1024 * 1024))
+
+
+def start_server(workdir, port, workers):
+    env = dict(os.environ, LOG_LEVEL='WARNING', PASSWORD_HASH_ITERATIONS='1000', RATE_LIMITS='off')
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py'), '--builtin', '--host', '127.0.0.1',
+                               '--port', str(port), '--workers', str(workers), '--stream-port', '0'],
+                              cwd=workdir, env=env)  # no SSE traffic here, so no stream server to collide with
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def probe(port, cookie, probes):
+    """Status codes of ``probes`` video requests, each on a new connection
+    (the kernel hands each one to whichever worker accepts first)"""
+    statuses = set()
+    for _ in range(probes):
+        conn = connection(port)
+        statuses.add(request(conn, 'GET', '/stream-video/3', cookie=cookie, headers={'Range': 'bytes=0-1'})[0].status)
+        conn.close()
+    return statuses
+
+
+def check_shared_state(port, workers):
+    """Session and token revocation must hold on every worker"""
+    conn = connection(port)
+    cookie = login(conn, 'user2', 'pw')
+    resp, _ = request(conn, 'GET', '/course', cookie=cookie)
+    cookie = update_cookie(cookie, resp)  # the session now carries the video token
+    sessions_ok = probe(port, cookie, workers * 10) == {206}
+    request(conn, 'GET', '/logout', cookie=cookie)
+    conn.close()
+    # Replaying the old cookie: its token was revoked by the worker that handled /logout
+    revoked_ok = probe(port, cookie, workers * 10) == {403}
+    return sessions_ok, revoked_ok
+
+
+def client_process(port, index, threads, seconds, queue):
+    sessions = []
+    for t in range(threads):
+        conn = connection(port)
+        cookie = login(conn, f'user{(index * threads + t) % (USERS - 1) + 2}', 'pw')
+        resp, _ = request(conn, 'GET', '/course', cookie=cookie)
+        cookie = update_cookie(cookie, resp)  # video token
+        sessions.append((conn, cookie))
+    latencies = []
+
+    def worker(n, deadline):
+        conn, cookie = sessions[n]
+        while time.perf_counter() < deadline:
+            for method, path, headers in (
+                    ('GET', '/course', None),
+                    ('GET', '/api/messages', None),
+                    ('GET', '/stream-video/3', {'Range': f'bytes=0-{VIDEO_RANGE - 1}'})):
+                t0 = time.perf_counter()
+                request(conn, method, path, cookie=cookie, headers=headers)
+                latencies.append(time.perf_counter() - t0)
+
+    elapsed = run_threads(threads, worker, seconds)
+    queue.put((latencies, elapsed))
+
+
+def run(workers, args):
+    with tempfile.TemporaryDirectory(prefix='alpha-bench-') as workdir:
+        make_dataset(workdir)
+        port = free_port()
+        server = start_server(workdir, port, workers)
+        try:
+            sessions_ok, revoked_ok = check_shared_state(port, workers)
+            queue = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=client_process, args=(port, i, args.threads, args.seconds, queue))
+                     for i in range(args.clients)]
+            for p in procs:
+                p.start()
+            results = [queue.get() for _ in procs]
+            for p in procs:
+                p.join()
+        finally:
+            server.terminate()
+            server.wait()
+    latencies = [value for values, _ in results for value in values]
+    elapsed = max(elapsed for _, elapsed in results)
+    print(f"workers {workers:2}  {len(latencies) / elapsed:8.1f} req/s  p50 {ms(percentile(latencies, 50))}  "
+          f"p99 {ms(percentile(latencies, 99))}  shared session {'ok' if sessions_ok else 'FAIL'}  "
+          f"revocation {'ok' if revoked_ok else 'FAIL'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--threads', type=int, default=4, help='connections per client process')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs, {args.clients} x {args.threads} connections, {args.seconds:.0f}s per run")
+    for workers in args.workers.split(','):
+        run(int(workers), args)
+
+
+if __name__ == '__main__':
+    main()
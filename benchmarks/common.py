@@ -0,0 +1,109 @@
+"""Shared helpers for the benchmark scripts (run them from the repo root:
+``python benchmarks/<script>.py --help``)."""
+import http.client
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@contextmanager
+def serve(wsgi_app, threaded=True):
+    """Run ``wsgi_app`` on an ephemeral localhost port; yields the port"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=threaded, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.port
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def connection(port):
+    return http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+
+def load_app(workdir, users, env=None):
+    """Import ``app.py`` with ``workdir`` as its data directory.
+
+    ``users`` is written to ``workdir/users.json`` (``None`` keeps the file
+    already there); ``env`` overrides config read from the environment at
+    import time (e.g. VIDEO_DELIVERY). Rate limits are off unless ``env``
+    sets RATE_LIMITS: every benchmark client comes from 127.0.0.1.
+    """
+    os.makedirs(os.path.join(workdir, 'course'), exist_ok=True)
+    if users is not None:
+        with open(os.path.join(workdir, 'users.json'), 'w') as f:
+            json.dump(users, f)
+    os.environ.update(dict({'RATE_LIMITS': 'off'}, **(env or {})))
+    os.chdir(workdir)
+    sys.modules.pop('app', None)
+    return importlib.import_module('app')
+
+
+def request(conn, method, path, body=None, cookie=None, headers=None):
+    """Send one request on a keep-alive connection; returns (response, data)"""
+    headers = dict(headers or {})
+    if cookie:
+        headers['Cookie'] = cookie
+    if body is not None:
+        body = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    return resp, resp.read()
+
+
+def login(conn, username, password):
+    """Log in through /api/login; returns the session cookie"""
+    resp, _ = request(conn, 'POST', '/api/login', {'username': username, 'password': password})
+    cookie = resp.getheader('Set-Cookie')
+    if resp.status != 200 or not cookie:
+        raise RuntimeError(f"login failed for {username}: {resp.status}")
+    return cookie.split(';', 1)[0]
+
+
+def update_cookie(cookie, resp):
+    """Session cookies are re-issued when the session changes"""
+    new_cookie = resp.getheader('Set-Cookie')
+    return new_cookie.split(';', 1)[0] if new_cookie else cookie
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_threads(count, target, duration):
+    """Call ``target(worker_index, deadline)`` in ``count`` threads"""
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=target, args=(i, deadline)) for i in range(count)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def ms(seconds):
+    return f"{seconds * 1000:8.2f}ms"
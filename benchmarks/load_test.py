@@ -0,0 +1,255 @@
+"""Mixed-workload load test for the whole app (offline, Linux).
+
+Builds a synthetic data set in a temporary directory (``--users`` accounts in
+users.json, ``--messages`` chat messages in messages.json, a ``--video-mb``
+test video), starts the local NOWPayments stub, and runs the app in a child
+process on a threaded HTTP/1.1 server. ``--clients`` threads, each logged in
+as its own paid user on a keep-alive connection, then pick operations at
+random (seeded) by weight for ``--seconds``:
+
+* ``login``    - POST /api/login
+* ``course``   - GET /course (payment_required + page render + token issue)
+* ``video``    - GET /stream-video/3 with a random 256 KB Range
+* ``chat``     - GET /api/messages?since=... with If-None-Match (polling)
+* ``check``    - GET /check-payment/<id> for the client's payment
+* ``webhook``  - a burst of ``--webhook-burst`` IPN posts for that payment
+
+Reports requests/sec and p50/p99 latency per operation, and the server
+process's RSS (current and peak). ``--json`` also writes the numbers to a
+file so two runs can be compared.
+
+    python benchmarks/load_test.py --users 100000 --messages 1000 --clients 16 --seconds 30
+    python benchmarks/load_test.py --mix chat=1 --clients 64        # chat polling only
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from common import connection, load_app, login, ms, percentile, request, run_threads, serve, update_cookie
+from stub_nowpayments import StubNowPayments
+
+from passwords import hash_password
+
+VIDEO_NUM = 3
+VIDEO_RANGE = 256 * 1024
+PASSWORD = 'pw'
+DEFAULT_MIX = 'login=1,course=2,video=5,chat=10,check=2,webhook=1'
+
+
+# --- Data set ---
+
+def generate_dataset(workdir, users, messages, video_mb, paid, kdf_iterations):
+    """Write users.json, messages.json and the test video into ``workdir``"""
+    os.makedirs(os.path.join(workdir, 'course'), exist_ok=True)
+    # One hash shared by every account: hashing each one separately would
+    # take longer than the test itself, and lookups don't depend on it
+    stored = hash_password(PASSWORD, kdf_iterations)
+    with open(os.path.join(workdir, 'users.json'), 'w') as f:
+        f.write('[\n')
+        for i in range(1, users + 1):
+            user = {'id': i, 'username': f'user{i:07d}', 'password': stored,
+                    'role': 'admin' if i == 1 else 'user', 'has_paid': i <= paid or i % 3 == 0}
+            f.write(json.dumps(user) + (',\n' if i < users else '\n'))
+        f.write(']\n')
+    with open(os.path.join(workdir, 'messages.json'), 'w') as f:
+        json.dump([{'id': i, 'sender': 'Admin', 'content': f'Synthetic message {i} ' + 'x' * 80,
+                    'timestamp': '2024-01-01 00:00:00'} for i in range(1, messages + 1)], f, ensure_ascii=False)
+    with open(os.path.join(workdir, 'course', f'{VIDEO_NUM}.mp4'), 'wb') as f:
+        chunk = os.urandom(1024 * 1024)
+        for _ in range(video_mb):
+            f.write(chunk)
+
+
+# --- Server process ---
+
+def _server(workdir, env, pipe):
+    app_module = load_app(workdir, None, env)
+    with serve(app_module.app) as port:
+        pipe.send(port)
+        pipe.recv()  # stop
+
+
+def process_memory(pid):
+    """(current RSS, peak RSS) in MB from /proc"""
+    values = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(rest.split()[0]) / 1024
+    return values.get('VmRSS', 0.0), values.get('VmHWM', 0.0)
+
+
+# --- Client ---
+
+class Client:
+    WEBHOOK_STATUSES = ('waiting', 'confirming', 'partially_paid')
+
+    def __init__(self, port, index, seed, webhook_burst, video_size):
+        self.port = port
+        self.user_id = index + 1  # users 1..clients are paid
+        self.username = f'user{self.user_id:07d}'
+        self.rng = random.Random(seed * 1000 + index)
+        self.webhook_burst = webhook_burst
+        self.video_size = video_size
+        self.conn = connection(port)
+        self.cookie = login(self.conn, self.username, PASSWORD)
+        self.last_message = 0
+        self.etag = None
+        resp, data = request(self.conn, 'POST', '/create-crypto-payment', {'crypto': 'btc'}, cookie=self.cookie)
+        self.payment_id = json.loads(data).get('payment_id')
+        self.course()  # video token for the range requests
+
+    def call(self, method, path, body=None, headers=None):
+        resp, data = request(self.conn, method, path, body, cookie=self.cookie, headers=headers)
+        self.cookie = update_cookie(self.cookie, resp)
+        return resp, data
+
+    def login(self):
+        resp, _ = self.call('POST', '/api/login', {'username': self.username, 'password': PASSWORD})
+        return resp.status == 200
+
+    def course(self):
+        resp, _ = self.call('GET', '/course')
+        return resp.status == 200
+
+    def video(self):
+        start = self.rng.randrange(0, max(1, self.video_size - VIDEO_RANGE))
+        resp, _ = self.call('GET', f'/stream-video/{VIDEO_NUM}',
+                            headers={'Range': f'bytes={start}-{start + VIDEO_RANGE - 1}'})
+        return resp.status == 206
+
+    def chat(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        resp, data = self.call('GET', f'/api/messages?since={self.last_message}', headers=headers)
+        if resp.status == 200:
+            self.etag = resp.getheader('ETag')
+            messages = json.loads(data)
+            if messages:
+                self.last_message = messages[-1]['id']
+        return resp.status in (200, 304)
+
+    def check(self):
+        resp, _ = self.call('GET', f'/check-payment/{self.payment_id}')
+        return resp.status == 200
+
+    def webhook(self):
+        ok = True
+        for _ in range(self.webhook_burst):
+            resp, _ = self.call('POST', '/nowpayments-webhook', {
+                'payment_id': self.payment_id,
+                'payment_status': self.rng.choice(self.WEBHOOK_STATUSES),
+                'pay_amount': 0.001,
+                'actually_paid': 0,
+                'order_description': f'ALPHA Course - User {self.user_id}'
+            })
+            ok = ok and resp.status == 200
+        return ok
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if not hasattr(Client, name.strip()):
+            raise SystemExit(f"unknown operation: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run(args, workdir):
+    mix = parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    generate_dataset(workdir, args.users, args.messages, args.video_mb, args.clients, args.kdf_iterations)
+
+    with StubNowPayments(latency=args.upstream_latency) as stub:
+        env = {'NOWPAYMENTS_API_URL': stub.url, 'PASSWORD_HASH_ITERATIONS': str(args.kdf_iterations),
+               'LOG_LEVEL': 'WARNING'}
+        parent, child = multiprocessing.Pipe()
+        server = multiprocessing.get_context('fork').Process(target=_server, args=(workdir, env, child), daemon=True)
+        server.start()
+        port = parent.recv()
+        try:
+            clients = [Client(port, i, args.seed, args.webhook_burst, args.video_mb * 1024 * 1024)
+                       for i in range(args.clients)]
+            rss_idle = process_memory(server.pid)[0]
+            latencies = {op: [] for op in ops}
+            errors = {op: 0 for op in ops}
+
+            def worker(index, deadline):
+                client = clients[index]
+                while time.perf_counter() < deadline:
+                    op = client.rng.choices(ops, weights)[0]
+                    t0 = time.perf_counter()
+                    try:
+                        ok = getattr(client, op)()
+                    except Exception:
+                        ok = False
+                        client.conn.close()
+                        client.conn = connection(port)
+                    latencies[op].append(time.perf_counter() - t0)
+                    if not ok:
+                        errors[op] += 1
+
+            elapsed = run_threads(args.clients, worker, args.seconds)
+            rss, peak = process_memory(server.pid)
+        finally:
+            parent.send('stop')
+            server.join(10)
+
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'elapsed': elapsed,
+        'rss_idle_mb': rss_idle,
+        'rss_mb': rss,
+        'peak_rss_mb': peak,
+        'upstream_requests': stub.requests,
+        'operations': {},
+    }
+    print(f"{args.clients} clients, {args.users} users, {args.messages} messages, {elapsed:.1f}s")
+    print(f"{'operation':10} {'count':>8} {'errors':>7} {'ops/s':>9} {'p50':>10} {'p99':>10}")
+    total = 0
+    for op in ops:
+        values = latencies[op]
+        total += len(values)
+        stats = {'count': len(values), 'errors': errors[op], 'per_second': len(values) / elapsed,
+                 'p50_ms': percentile(values, 50) * 1000, 'p99_ms': percentile(values, 99) * 1000}
+        results['operations'][op] = stats
+        print(f"{op:10} {len(values):8} {errors[op]:7} {stats['per_second']:9.1f} "
+              f"{ms(percentile(values, 50))} {ms(percentile(values, 99))}")
+    print(f"{'total':10} {total:8} {sum(errors.values()):7} {total / elapsed:9.1f}")
+    print(f"server RSS {rss:.1f} MB (idle {rss_idle:.1f} MB, peak {peak:.1f} MB), "
+          f"NOWPayments stub requests: {stub.requests}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000, help='accounts in users.json')
+    parser.add_argument('--messages', type=int, default=100, help='messages in messages.json')
+    parser.add_argument('--video-mb', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent logged-in clients')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation=weight,...')
+    parser.add_argument('--webhook-burst', type=int, default=5, help='IPN posts per webhook operation')
+    parser.add_argument('--upstream-latency', type=float, default=0.05, help='stub NOWPayments delay (s)')
+    parser.add_argument('--kdf-iterations', type=int, default=10000,
+                        help='PBKDF2 cost for logins (production default: 600000)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+    if args.clients > args.users:
+        parser.error('--clients must not exceed --users')
+
+    with tempfile.TemporaryDirectory(prefix='alpha-load-') as workdir:
+        run(args, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Local stand-in for the NOWPayments API (offline benchmarks and checks).
+
+Implements the two endpoints the app uses:
+
+    POST /v1/payment           -> 201, creates a payment in memory
+    GET  /v1/payment/<id>      -> 200 with its status, 404 if unknown
+
+``latency`` adds a delay to every response and ``fail_next`` makes the next
+N requests answer 503, to exercise the client's retries.
+
+    python benchmarks/stub_nowpayments.py --port 8089 --latency 0.2
+    NOWPAYMENTS_API_URL=http://127.0.0.1:8089/v1 python app.py
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubNowPayments:
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.fail_next = 0
+        self.payments = {}
+        self.requests = 0
+        self._ids = itertools.count(5000000000)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def set_status(self, payment_id, status):
+        with self._lock:
+            self.payments[payment_id]['payment_status'] = status
+            self.payments[payment_id]['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _begin(self):
+                with stub._lock:
+                    stub.requests += 1
+                    failing = stub.fail_next > 0
+                    if failing:
+                        stub.fail_next -= 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failing:
+                    self._reply(503, {'message': 'Service unavailable'})
+                return not failing
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self._begin():
+                    return
+                if self.path != '/v1/payment':
+                    return self._reply(404, {'message': 'Not found'})
+                if not self.headers.get('x-api-key'):
+                    return self._reply(403, {'message': 'Invalid api key'})
+                with stub._lock:
+                    payment_id = next(stub._ids)
+                    payment = {
+                        'payment_id': payment_id,
+                        'payment_status': 'waiting',
+                        'pay_address': f'stub-address-{payment_id}',
+                        'pay_amount': 0.001,
+                        'actually_paid': 0,
+                        'pay_currency': body.get('pay_currency', 'btc'),
+                        'price_amount': body.get('price_amount'),
+                        'order_id': body.get('order_id'),
+                        'order_description': body.get('order_description'),
+                        'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    }
+                    stub.payments[payment_id] = payment
+                self._reply(201, payment)
+
+            def do_GET(self):
+                if not self._begin():
+                    return
+                prefix = '/v1/payment/'
+                payment_id = self.path[len(prefix):] if self.path.startswith(prefix) else ''
+                payment = stub.payments.get(int(payment_id)) if payment_id.isdigit() else None
+                if payment is None:
+                    return self._reply(404, {'message': 'Payment not found'})
+                self._reply(200, payment)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local NOWPayments stub')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubNowPayments(args.port, args.latency)
+    print(f"Stub NOWPayments on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
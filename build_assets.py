@@ -0,0 +1,249 @@
+"""Build the static assets for production.
+
+    python build_assets.py            # static/*.css, static/*.js -> static/dist/
+    python build_assets.py --clean    # also delete files left by earlier builds
+
+For every stylesheet and script in ``static/``:
+
+1. minify it (``rcssmin`` / ``rjsmin`` when installed, otherwise the
+   conservative built-in minifiers below: comments and redundant
+   whitespace go, JS line breaks stay so semicolon insertion is unchanged);
+2. write it as ``static/dist/<name>.<content hash>.<ext>``;
+3. add a ``.gz`` and, with the ``brotli`` package, a ``.br`` variant
+   (only when smaller).
+
+``static/dist/manifest.json`` maps each source name to its built file.
+``assets.py`` reads it at startup, so ``asset_url('chat.js')`` in the
+templates points to the fingerprinted file - restart the app after a
+build. Without a build the templates keep using the plain ``/static/`` files.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = 'dist'  # Inside the static folder, so it is served under /static/dist/
+MANIFEST = 'manifest.json'
+EXTENSIONS = ('.css', '.js')
+HASH_LENGTH = 10
+VARIANTS = ('.gz', '.br')
+
+# After these a '/' starts a regex literal, not a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'throw', 'delete', 'new'}
+
+
+# --- Minifiers ---
+
+def _string_end(text, i):
+    """Index just past the quoted string starting at ``text[i]``"""
+    quote = text[i]
+    i += 1
+    while i < len(text) and text[i] != quote:
+        i += 2 if text[i] == '\\' else 1
+    return i + 1
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    parts = []  # (is_string, text)
+    code = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c in '"\'':
+            parts.append((False, ''.join(code)))
+            code = []
+            end = _string_end(text, i)
+            parts.append((True, text[i:end]))
+            i = end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+        else:
+            code.append(c)
+            i += 1
+    parts.append((False, ''.join(code)))
+
+    out = []
+    for is_string, part in parts:
+        if not is_string:
+            part = re.sub(r'\s+', ' ', part)
+            part = re.sub(r' ?([{};,>]) ?', r'\1', part)
+            part = part.replace(': ', ':').replace(';}', '}')  # never ' :' (a :hover is not a:hover)
+        out.append(part)
+    return ''.join(out).strip() + '\n'
+
+
+def _regex_allowed(out):
+    for chunk in reversed(out):
+        chunk = chunk.rstrip()
+        if chunk:
+            if chunk[-1] in REGEX_PRECEDERS:
+                return True
+            word = re.search(r'[A-Za-z_$][\w$]*$', chunk)
+            return bool(word) and word.group(0) in REGEX_KEYWORDS
+    return True
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    out = []
+    templates = []  # brace depth at each open `${`
+    depth = 0
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in '"\'':
+            end = _string_end(text, i)
+            out.append(text[i:end])
+            i = end
+        elif c == '`' or (c == '}' and templates and templates[-1] == depth):
+            # Template literal text, copied as is up to its end or the next `${`
+            if c == '}':
+                templates.pop()
+            j = i + 1
+            while j < n and text[j] != '`' and not text.startswith('${', j):
+                j += 2 if text[j] == '\\' else 1
+            if text.startswith('${', j):
+                templates.append(depth)
+                j += 2
+            else:
+                j += 1
+            out.append(text[i:j])
+            i = j
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end < 0 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            out.append('\n' if '\n' in text[i:end] else ' ')  # still separates tokens
+            i = end
+        elif c == '/' and _regex_allowed(out):
+            j = i + 1
+            in_class = False
+            while j < n and text[j] != '\n' and (text[j] != '/' or in_class):
+                if text[j] == '\\':
+                    j += 1
+                elif text[j] == '[':
+                    in_class = True
+                elif text[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and (text[j].isalnum() or text[j] == '_'):  # flags
+                j += 1
+            out.append(text[i:j])
+            i = j
+        elif c.isspace():
+            j = i
+            while j < n and text[j].isspace():
+                j += 1
+            out.append('\n' if '\n' in text[i:j] else ' ')
+            i = j
+        else:
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            out.append(c)
+            i += 1
+
+    # Merge the whitespace left between tokens (literals are never just ' ' / '\n')
+    merged = []
+    for chunk in out:
+        if chunk in (' ', '\n') and merged and merged[-1] in (' ', '\n'):
+            merged[-1] = '\n' if '\n' in (chunk, merged[-1]) else ' '
+        else:
+            merged.append(chunk)
+    return ''.join(merged).strip() + '\n'
+
+
+# --- Build ---
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir=STATIC_DIR, clean=False):
+    """Build every asset; returns (manifest, per-file sizes)"""
+    dist = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    sizes = {}
+    for name in sorted(os.listdir(static_dir)):
+        stem, ext = os.path.splitext(name)
+        path = os.path.join(static_dir, name)
+        if ext not in EXTENSIONS or not os.path.isfile(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        data = (minify_css if ext == '.css' else minify_js)(source).encode('utf-8')
+        built = f'{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}'
+        _write(os.path.join(dist, built), data)
+        sizes[name] = {'source': len(source.encode('utf-8')), 'minified': len(data)}
+
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                _write(os.path.join(dist, built + suffix), compressed)
+                sizes[name][suffix] = len(compressed)
+        manifest[name] = f'{DIST_DIR}/{built}'
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+    if clean:
+        keep = {MANIFEST}
+        for built in manifest.values():
+            base = os.path.basename(built)
+            keep.update([base] + [base + suffix for suffix in VARIANTS])
+        for name in os.listdir(dist):
+            if name not in keep:
+                os.remove(os.path.join(dist, name))
+    return manifest, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--static', default=STATIC_DIR, help='static folder (default: ./static next to this file)')
+    parser.add_argument('--clean', action='store_true',
+                        help='delete built files not in the new manifest (pages cached with old names will 404)')
+    args = parser.parse_args()
+
+    manifest, sizes = build(args.static, clean=args.clean)
+    print(f"{'asset':22} {'source':>8} {'minified':>9} {'gzip':>8} {'brotli':>8}  built")
+    for name, built in manifest.items():
+        s = sizes[name]
+        print(f"{name:22} {s['source']:8} {s['minified']:9} {s.get('.gz', '-'):>8} {s.get('.br', '-'):>8}  {built}")
+    if brotli is None:
+        print("brotli not installed: gzip variants only (pip install brotli)")
+
+
+if __name__ == '__main__':
+    main()
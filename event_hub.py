@@ -0,0 +1,79 @@
+"""Keyed, in-process publish/subscribe for SSE and long-poll endpoints.
+
+Each key (a payment id, the chat channel, ...) holds only its latest event
+and a version number that increases with every publish. A subscriber
+remembers the version it has seen and blocks in ``wait()`` until a newer one
+arrives or the timeout passes - no per-subscriber queues to leak.
+``wait_async()`` is the same for coroutines (asgi.py): publishers wake
+them through their event loop, so an idle subscriber holds no thread.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+
+
+class EventHub:
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._events = OrderedDict()  # key -> (version, data)
+        self._cond = threading.Condition()
+        self._async_waiters = {}  # key -> {(loop, future)}
+        self._version = 0
+        self.published = 0
+
+    def publish(self, key, data):
+        with self._cond:
+            self._version += 1
+            self._events.pop(key, None)
+            self._events[key] = (self._version, data)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+            self.published += 1
+            self._cond.notify_all()
+            for loop, future in self._async_waiters.pop(key, ()):
+                loop.call_soon_threadsafe(_wake, future)
+            return self._version
+
+    def latest(self, key):
+        """(version, data) of the last event for ``key``, or (0, None)"""
+        with self._cond:
+            return self._events.get(key, (0, None))
+
+    def wait(self, key, after_version, timeout):
+        """Block until ``key`` has an event newer than ``after_version``.
+        Returns (version, data), or (after_version, None) on timeout."""
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self._events.get(key, (0, None))[0] > after_version, timeout)
+            if not ready:
+                return after_version, None
+            return self._events[key]
+
+    async def wait_async(self, key, after_version, timeout):
+        """``wait()`` without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._cond:
+            event = self._events.get(key, (0, None))
+            if event[0] > after_version:
+                return event
+            self._async_waiters.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                waiters = self._async_waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._async_waiters[key]
+        with self._cond:
+            event = self._events.get(key, (0, None))
+            return event if event[0] > after_version else (after_version, None)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
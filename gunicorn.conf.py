@@ -0,0 +1,33 @@
+"""gunicorn settings for ALPHA (used by serve.py, or directly):
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) and the workers are
+forked from it, sharing its memory copy-on-write. Every worker has its own
+memory, so state that has to be seen by all of them (revoked video tokens,
+pending payments) goes to SQLite; see shared_state.py.
+
+Run directly, the SSE endpoints are short polls on these workers; serve.py
+also starts the asgi.py stream server that keeps them open.
+"""
+import gc
+import multiprocessing
+import os
+
+os.environ.setdefault('SHARED_STATE_BACKEND', 'sqlite')  # read by app.py at import
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'  # video reads block a thread, not the whole worker (SSE: asgi.py, see serve.py)
+threads = int(os.environ.get('WORKER_THREADS', 8))
+preload_app = True
+timeout = 120  # seconds a worker may go without heartbeat (long Range reads included)
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-' if os.environ.get('ACCESS_LOG') else None
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated out of the GC's reach: a
+    # collection in a worker would otherwise write to (and so copy) those pages
+    gc.freeze()
@@ -0,0 +1,142 @@
+"""Crash- and concurrency-safe JSON files.
+
+Used for ``users.json`` (JSON user store) and ``messages.json``:
+
+* writes go to a temp file in the same directory, are fsync'd and then
+  swapped in with ``os.replace`` - readers see the old or the new file,
+  never a truncated one;
+* writers serialize on an exclusive lock on ``<path>.lock`` (works across
+  threads and gunicorn worker processes);
+* read-modify-write is optimistic: ``update_json`` re-checks the file version
+  under the lock and retries the mutation if another writer got there first.
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class VersionConflict(Exception):
+    """The file changed between read and write"""
+
+
+def file_version(*paths):
+    """Cheap change token for files: (mtime, size, inode) per path"""
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            version.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+# flock is per open file description, so threads of one process need their
+# own mutex on top of it
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock on ``<path>.lock``"""
+    lock_path = os.path.abspath(path) + '.lock'
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.Lock())
+    with thread_lock:
+        with open(lock_path, 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_json(path, default):
+    """Return (data, version). Missing file -> (default, version)"""
+    version = file_version(path)
+    if version[0] is None:
+        return copy.deepcopy(default), version
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f), version
+
+
+def _atomic_write(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _replace(path, data, dump_kwargs):
+    _atomic_write(path, lambda f: json.dump(data, f, **dump_kwargs))
+
+
+def replace_lines(path, lines):
+    """Atomically replace ``path`` with one line per item (caller holds
+    ``file_lock(path)``)"""
+    _atomic_write(path, lambda f: f.writelines(line + '\n' for line in lines))
+
+
+def write_json(path, data, expected_version=None, **dump_kwargs):
+    """Atomically replace ``path``. Raises VersionConflict if
+    ``expected_version`` is given and the file no longer matches it."""
+    with file_lock(path):
+        if expected_version is not None and file_version(path) != expected_version:
+            raise VersionConflict(path)
+        _replace(path, data, dump_kwargs)
+
+
+def update_json(path, mutate, default, retries=10, **dump_kwargs):
+    """Optimistic read-modify-write.
+
+    ``mutate(data)`` changes ``data`` in place and may be called again with
+    fresh data if a concurrent writer wins the race. Returns whatever the last
+    call returned.
+    """
+    for _ in range(retries):
+        data, version = read_json(path, default)
+        result = mutate(data)
+        try:
+            write_json(path, data, expected_version=version, **dump_kwargs)
+            return result
+        except VersionConflict:
+            continue
+    # Heavy contention: do the whole cycle under the lock
+    with file_lock(path):
+        data, _ = read_json(path, default)
+        result = mutate(data)
+        _replace(path, data, dump_kwargs)
+        return result
@@ -0,0 +1,49 @@
+"""Non-blocking logging.
+
+``setup_logging()`` puts a ``QueueHandler`` on the root logger: a log call
+only appends the record to an in-memory queue, and a background
+``QueueListener`` thread formats it and writes it to stderr. A request
+thread never waits on a slow or blocked stdout/stderr pipe.
+"""
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from per_process import PerProcess
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+
+class ForkSafeQueueHandler(QueueHandler):
+    """Starts its listener thread in each process on first use"""
+
+    def __init__(self, log_queue, *handlers):
+        super().__init__(log_queue)
+        self._handlers = handlers
+        self._listener = None
+        self._started = PerProcess(self._start_listener)
+
+    def _start_listener(self):
+        self._listener = QueueListener(self.queue, *self._handlers, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self._listener.stop)  # drains what is still queued
+
+    def enqueue(self, record):
+        self._started.ensure()
+        super().enqueue(record)
+
+
+def setup_logging(level='INFO', stream=None):
+    """Route all logging through a queue; returns the queue handler"""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, ForkSafeQueueHandler):
+            return handler
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler = ForkSafeQueueHandler(queue.SimpleQueue(), output)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
@@ -0,0 +1,152 @@
+"""Catalog of the course videos in ``COURSE_VIDEO_DIR``.
+
+Every ``<number>.<ext>`` video file in the folder is a lesson (``3.mp4`` is
+video 3): dropping a file in adds a video, no code change. The folder is
+scanned at start-up and then every ``rescan_interval`` seconds by a daemon
+thread, so ``/stream-video/<n>`` resolves its file with a dict lookup - no
+``os.path.exists`` / ``os.stat`` per request.
+
+Each ``MediaFile`` caches the ``os.stat`` result (size, mtime - the ETag
+video_stream.py would compute), the MIME type and the container, sniffed
+from the first bytes of the file (``mp4``, ``matroska``, ``webm``). A rescan
+only re-reads files whose size or mtime changed. ``manifest()`` is the JSON
+list the course pages render their video cards from.
+"""
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from per_process import per_process_thread
+from video_stream import stat_etag
+
+logger = logging.getLogger(__name__)
+
+# Extension -> MIME type; when a number has several files the first listed wins
+VIDEO_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+    '.mov': 'video/quicktime',
+}
+CONTAINER_TYPES = {'mp4': 'video/mp4', 'webm': 'video/webm', 'matroska': 'video/x-matroska'}
+SNIFF_BYTES = 64
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+MediaFile = namedtuple('MediaFile', 'number name path stat etag mimetype container')
+
+
+def sniff_container(path):
+    """Container format from the file header, or None if unrecognized"""
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    if head[4:8] == b'ftyp':  # ISO BMFF: mp4 / m4v / mov
+        return 'mp4'
+    if head.startswith(EBML_MAGIC):  # EBML header: DocType says webm or matroska
+        return 'webm' if b'webm' in head else 'matroska'
+    return None
+
+
+class MediaCatalog:
+    def __init__(self, directory, rescan_interval=5):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self._videos = {}  # number -> MediaFile; replaced as a whole by each scan
+        self._lock = threading.Lock()
+        self._watcher = per_process_thread(self._watch_forever, 'media-catalog', self._lock)
+        self.version = ''
+        self.scans = 0
+        self.rescan()
+
+    def get(self, number):
+        """``MediaFile`` of video ``number``, or None"""
+        self._ensure_watcher()
+        return self._videos.get(number)
+
+    def __len__(self):
+        return len(self._videos)
+
+    # --- Scanning ---
+
+    def _entry(self, number, name, previous):
+        path = os.path.join(self.directory, name)
+        st = os.stat(path)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        if (previous is not None and previous.path == path
+                and (previous.stat.st_size, previous.stat.st_mtime_ns) == (st.st_size, st.st_mtime_ns)):
+            return previous  # unchanged: keep the sniffed container
+        container = sniff_container(path)
+        mimetype = CONTAINER_TYPES.get(container) or VIDEO_TYPES[os.path.splitext(name)[1].lower()]
+        return MediaFile(number, name, path, st, stat_etag(st), mimetype, container)
+
+    def rescan(self):
+        """Re-read the folder; returns True if a video was added, removed or changed"""
+        with self._lock:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                names = []
+            candidates = {}
+            for name in names:
+                stem, ext = os.path.splitext(name)
+                if stem.isdigit() and ext.lower() in VIDEO_TYPES:
+                    candidates.setdefault(int(stem), []).append(name)
+
+            order = list(VIDEO_TYPES)
+            videos = {}
+            for number, files in candidates.items():
+                for name in sorted(files, key=lambda name: order.index(os.path.splitext(name)[1].lower())):
+                    try:
+                        entry = self._entry(number, name, self._videos.get(number))
+                    except OSError:  # removed while scanning
+                        continue
+                    if entry is not None:
+                        videos[number] = entry
+                        break
+
+            version = hashlib.sha256(repr(sorted(
+                (number, video.name, video.etag) for number, video in videos.items())).encode()).hexdigest()[:16]
+            changed = version != self.version
+            self._videos = videos
+            self.version = version
+            self.scans += 1
+        if changed:
+            logger.info("Media catalog: %d videos in %s", len(videos), self.directory)
+        return changed
+
+    def _ensure_watcher(self):
+        if self.rescan_interval:
+            self._watcher.ensure()
+
+    def _watch_forever(self):
+        while True:
+            time.sleep(self.rescan_interval)
+            try:
+                self.rescan()
+            except Exception:
+                logger.exception("Media catalog rescan failed for %s", self.directory)
+
+    # --- Manifest ---
+
+    def manifest(self, url):
+        """JSON-ready list of the videos (``url(number)`` -> stream URL)"""
+        self._ensure_watcher()
+        return [{
+            'number': video.number,
+            'url': url(video.number),
+            'size': video.stat.st_size,
+            'modified': datetime.fromtimestamp(int(video.stat.st_mtime), tz=timezone.utc).isoformat(),
+            'mimetype': video.mimetype,
+            'container': video.container,
+            'etag': video.etag,
+        } for _, video in sorted(self._videos.items())]
+
+    def stats(self):
+        return {'videos': len(self._videos), 'version': self.version, 'scans': self.scans,
+                'rescan_interval': self.rescan_interval}
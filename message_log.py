@@ -0,0 +1,138 @@
+"""Append-only chat log with an in-memory ring buffer.
+
+Messages are appended to a JSON Lines file (one message per line, O(1)
+writes) and the last ``capacity`` of them are kept in a deque, so reads never
+parse the file. Ids increase monotonically (last id + 1).
+
+Several worker processes can share one log: appends happen under the file
+lock from ``json_file.py``, and before answering a read each process picks
+up lines other processes appended (it remembers its byte offset). Once the
+file holds ``compact_factor`` times more lines than the buffer, it is
+compacted - rewritten atomically with only the buffered messages. Every
+rewrite starts with a ``{"generation": ...}`` line so readers notice the
+swap even if the new file happens to reuse the old inode.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from json_file import file_lock, read_json, replace_lines
+
+
+class MessageLog:
+    def __init__(self, path, capacity=100, compact_factor=10, legacy_json=None):
+        self.path = path
+        self.capacity = capacity
+        self.compact_factor = compact_factor
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._offset = 0
+        self._lines = 0  # lines in the file, compaction trigger
+        self.last_id = 0
+
+        if legacy_json and not os.path.exists(path) and os.path.exists(legacy_json):
+            # First run: carry over the old messages.json history
+            with file_lock(path):
+                if not os.path.exists(path):
+                    self._rewrite(read_json(legacy_json, [])[0][-capacity:])
+        with self._lock:
+            self._refresh()
+
+    def _rewrite(self, messages):
+        # Caller holds file_lock(self.path)
+        header = json.dumps({'generation': secrets.token_hex(8)})
+        replace_lines(self.path, [header] + [json.dumps(m, ensure_ascii=False) for m in messages])
+
+    def _refresh(self):
+        """Load lines appended since our last look (caller holds self._lock)"""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            generation = json.loads(f.readline()).get('generation')
+            if generation != self._generation or size < self._offset:
+                # New file (first load or compacted by another process)
+                self._buffer.clear()
+                self._generation = generation
+                self._offset = f.tell()
+                self._lines = 0
+            f.seek(self._offset)
+            data = f.read()
+        # Only whole lines; a half-written one is picked up next time
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                msg = json.loads(line)
+                self._buffer.append(msg)
+                self.last_id = max(self.last_id, msg['id'])
+                self._lines += 1
+        self._offset += end
+
+    def append(self, sender, content):
+        with self._lock, file_lock(self.path):
+            if not os.path.exists(self.path):
+                self._rewrite([])
+            self._refresh()
+            msg = {
+                'id': self.last_id + 1,
+                'sender': sender,
+                'content': content,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            with open(self.path, 'ab') as f:
+                f.write(json.dumps(msg, ensure_ascii=False).encode('utf-8') + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh()
+            if self._lines > self.capacity * self.compact_factor:
+                self._compact()
+            return msg
+
+    def _compact(self):
+        # Caller holds both locks
+        self._rewrite(list(self._buffer))
+        self._refresh()
+
+    def compact(self):
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            self._compact()
+
+    def replace(self, messages):
+        """Overwrite the whole history (admin tools / migrations)"""
+        with self._lock, file_lock(self.path):
+            self._rewrite(messages[-self.capacity:])
+            self._refresh()
+
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return list(self._buffer)
+
+    def since(self, since_id, wait=True):
+        """Messages newer than ``since_id``. With ``wait=False`` (event loop)
+        this never blocks: while another thread holds the lock (an append,
+        fsync included) it answers from the buffer as it is - that append's
+        chat event wakes the caller for another look."""
+        if self._lock.acquire(blocking=wait):
+            try:
+                self._refresh()
+            finally:
+                self._lock.release()
+        if since_id >= self.last_id:
+            return []
+        # Newest messages are at the right end; walk back only as far as needed
+        newer = []
+        for msg in reversed(list(self._buffer)):  # list(): one atomic copy, appends may run
+            if msg['id'] <= since_id:
+                break
+            newer.append(msg)
+        newer.reverse()
+        return newer
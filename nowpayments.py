@@ -0,0 +1,255 @@
+"""NOWPayments API client.
+
+One shared ``requests.Session`` (keep-alive connection pool) instead of a
+fresh HTTPS connection per call, bounded retries with exponential backoff,
+and a short-TTL cache for payment status lookups. Concurrent lookups for the
+same ``payment_id`` are coalesced: the first caller hits the API, the others
+wait for its result.
+
+``AsyncNowPaymentsClient`` offers the same calls as coroutines for the ASGI
+server. It uses ``httpx`` when installed (optional: nothing is blocked while
+waiting on the API) and otherwise runs the sync client in a worker thread.
+Both share the status cache.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+    logging.getLogger('httpx').setLevel(logging.WARNING)  # else one INFO line per request
+except ImportError:  # optional, see AsyncNowPaymentsClient
+    httpx = None
+
+from metrics import REGISTRY
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'nowpayments_request_seconds', 'NOWPayments API call latency, retries included', ('operation',))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'nowpayments_errors_total', 'Failed NOWPayments API calls (reason: HTTP status or exception)',
+    ('operation', 'reason'))
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Network-level failures of either client (no usable HTTP response)
+TRANSPORT_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+
+
+class NowPaymentsError(Exception):
+    """Non-success response from the API"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class NowPaymentsClient:
+    def __init__(self, api_key, base_url, timeout=10, retries=3, backoff=0.5,
+                 status_ttl=15, status_cache_size=10000, pool_size=20):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.status_ttl = status_ttl
+        self.status_cache_size = status_cache_size
+
+        # Connection errors are retried for every method (nothing was sent);
+        # read errors and 429/5xx only for GET, so a payment is never created twice
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'x-api-key': api_key})
+
+        self._status_cache = OrderedDict()  # payment_id -> (data, expires_at)
+        self._inflight = {}  # payment_id -> _Call
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def _request(self, operation, method, path, **kwargs):
+        self.upstream_calls += 1
+        try:
+            with UPSTREAM_SECONDS.time(operation=operation):
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            UPSTREAM_ERRORS.inc(operation=operation, reason=type(e).__name__)
+            raise
+        return _result(operation, response)
+
+    def create_payment(self, payment_data):
+        """POST /payment; returns the created payment"""
+        return self._request('create_payment', 'POST', '/payment', json=payment_data)
+
+    def cached_status(self, payment_id):
+        """Status fetched less than ``status_ttl`` seconds ago, or None"""
+        with self._lock:
+            cached = self._status_cache.get(payment_id)
+            if cached and cached[1] > time.monotonic():
+                self.cache_hits += 1
+                return cached[0]
+            return None
+
+    def store_status(self, payment_id, data):
+        with self._lock:
+            self._status_cache[payment_id] = (data, time.monotonic() + self.status_ttl)
+            self._status_cache.move_to_end(payment_id)
+            while len(self._status_cache) > self.status_cache_size:
+                self._status_cache.popitem(last=False)
+
+    def get_payment_status(self, payment_id):
+        """GET /payment/<id>, cached for ``status_ttl`` seconds"""
+        cached = self.cached_status(payment_id)
+        if cached is not None:
+            return cached
+        with self._lock:
+            call = self._inflight.get(payment_id)
+            leader = call is None
+            if leader:
+                call = self._inflight[payment_id] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._request('get_payment_status', 'GET', f'/payment/{payment_id}')
+            self.store_status(payment_id, call.result)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(payment_id, None)
+            call.done.set()
+
+    def invalidate(self, payment_id):
+        """Forget a cached status (e.g. after a webhook reported a change)"""
+        with self._lock:
+            self._status_cache.pop(payment_id, None)
+
+    def stats(self):
+        return {
+            'upstream_calls': self.upstream_calls,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'cached_statuses': len(self._status_cache),
+        }
+
+
+def _result(operation, response):
+    """Decoded JSON body of a requests/httpx response; raises on HTTP errors"""
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code >= 400:
+        UPSTREAM_ERRORS.inc(operation=operation, reason=response.status_code)
+        message = data.get('message') if isinstance(data, dict) else None
+        raise NowPaymentsError(response.status_code, message or f"HTTP {response.status_code}")
+    return data
+
+
+class AsyncNowPaymentsClient:
+    """Coroutine front-end to a ``NowPaymentsClient`` (same config and cache)"""
+
+    def __init__(self, client):
+        self.client = client
+        self._inflight = {}  # payment_id -> asyncio.Future (one event loop)
+        self._http = None
+        if httpx is not None:
+            # Connection errors are retried by the transport; 429/5xx below, GET only
+            self._http = httpx.AsyncClient(
+                base_url=client.base_url,
+                headers={'x-api-key': client.api_key},
+                timeout=client.timeout,
+                limits=httpx.Limits(max_connections=client.pool_size * 5,
+                                    max_keepalive_connections=client.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=client.retries)
+            )
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+    async def _request(self, operation, method, path, **kwargs):
+        attempts = self.client.retries + 1 if method == 'GET' else 1
+        for attempt in range(attempts):
+            self.client.upstream_calls += 1
+            try:
+                with UPSTREAM_SECONDS.time(operation=operation):
+                    response = await self._http.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                UPSTREAM_ERRORS.inc(operation=operation, reason=type(e).__name__)
+                raise
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                await asyncio.sleep(self.client.backoff * 2 ** attempt)
+                continue
+            return _result(operation, response)
+
+    async def create_payment(self, payment_data):
+        if self._http is None:
+            return await asyncio.to_thread(self.client.create_payment, payment_data)
+        return await self._request('create_payment', 'POST', '/payment', json=payment_data)
+
+    async def get_payment_status(self, payment_id):
+        if self._http is None:
+            return await asyncio.to_thread(self.client.get_payment_status, payment_id)
+        cached = self.client.cached_status(payment_id)
+        if cached is not None:
+            return cached
+        future = self._inflight.get(payment_id)
+        if future is not None:
+            self.client.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._inflight[payment_id] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._request('get_payment_status', 'GET', f'/payment/{payment_id}')
+            self.client.store_status(payment_id, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here even if nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(payment_id, None)
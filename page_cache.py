@@ -0,0 +1,66 @@
+"""Pre-rendered course pages.
+
+The course pages are large templates whose only per-user parts are the
+watermark (``user.username`` / ``user.id``) and the ``video_token``.
+``CoursePage`` compiles the template once, renders it once with unique
+placeholder strings in those fields, and splits the result around them.
+A request then only escapes three values and joins the cached fragments -
+no template compilation or rendering.
+
+The template is reloaded when its file's mtime changes. It must use the
+per-user fields only as plain ``{{ user.username }}``, ``{{ user.id }}`` and
+``{{ video_token }}`` (``{% if user %}`` / ``{% if video_token %}`` are fine);
+filters on them would be applied to the placeholder instead.
+"""
+import os
+import re
+import secrets
+import threading
+from types import SimpleNamespace
+
+from markupsafe import escape
+
+
+class CoursePage:
+    def __init__(self, jinja_env, path):
+        self.jinja_env = jinja_env
+        self.path = path
+        self._mtime = None
+        self._fragments = None  # alternating [text, slot, text, slot, ..., text]
+        self._lock = threading.Lock()
+        self.compiles = 0
+
+    def _compile(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            template = self.jinja_env.from_string(f.read())
+
+        marker = secrets.token_hex(8)
+        slots = {f'@@{marker}:{name}@@': name for name in ('username', 'id', 'video_token')}
+        placeholders = {name: key for key, name in slots.items()}
+        html = template.render(
+            user=SimpleNamespace(username=placeholders['username'], id=placeholders['id']),
+            video_token=placeholders['video_token']
+        )
+        pattern = '(' + '|'.join(re.escape(key) for key in slots) + ')'
+        fragments = re.split(pattern, html)
+        # Odd positions are placeholders -> slot names
+        return [slots[part] if i % 2 else part for i, part in enumerate(fragments)]
+
+    def _current(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._fragments = self._compile()
+                    self._mtime = mtime
+                    self.compiles += 1
+        return self._fragments
+
+    def render(self, user, video_token):
+        values = {
+            'username': str(escape(user['username'])),
+            'id': str(escape(user['id'])),
+            'video_token': str(escape(video_token)),
+        }
+        fragments = self._current()
+        return ''.join(values[part] if i % 2 else part for i, part in enumerate(fragments))
@@ -0,0 +1,105 @@
+"""Salted password hashes.
+
+Passwords are stored as ``pbkdf2_sha256$<iterations>$<salt>$<hash>`` (salt
+and hash base64). The iteration count is the cost knob: every login costs
+one PBKDF2 run, so login CPU is ``iterations`` x SHA-256 and can be sized
+against load (see ``benchmarks/bench_login.py``). Hashes made with an older
+cost keep verifying and are upgraded on the next successful login.
+
+Entries that are still plaintext (the original ``users.json`` format) also
+verify, in constant time, until they are migrated:
+
+    python passwords.py --json users.json      # rewrite users.json in place
+    python passwords.py --db users.db          # SQLite store
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import secrets
+
+ALGORITHM = 'pbkdf2_sha256'
+DEFAULT_ITERATIONS = 600000  # OWASP recommendation for PBKDF2-HMAC-SHA256
+SALT_BYTES = 16
+
+_dummy_hashes = {}
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + '$')
+
+
+def hash_password(password, iterations=DEFAULT_ITERATIONS):
+    salt = secrets.token_bytes(SALT_BYTES)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(_pbkdf2(password, salt, iterations))}"
+
+
+def _iterations(stored):
+    return int(stored.split('$', 2)[1])
+
+
+def verify_password(password, stored):
+    """True if ``password`` matches ``stored`` (hash or legacy plaintext)"""
+    if not isinstance(password, str) or not isinstance(stored, str):
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        salt = base64.b64decode(salt)
+        expected = base64.b64decode(expected)
+        iterations = int(iterations)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_pbkdf2(password, salt, iterations), expected)
+
+
+def needs_rehash(stored, iterations=DEFAULT_ITERATIONS):
+    """Plaintext, or hashed with a different cost"""
+    return not is_hashed(stored) or _iterations(stored) != iterations
+
+
+def verify_dummy(password, iterations=DEFAULT_ITERATIONS):
+    """Burn the same CPU as a real check, so unknown usernames aren't
+    distinguishable from wrong passwords by response time"""
+    if iterations not in _dummy_hashes:
+        _dummy_hashes[iterations] = hash_password(secrets.token_hex(8), iterations)
+    verify_password(password if isinstance(password, str) else '', _dummy_hashes[iterations])
+    return False
+
+
+def migrate_store(store, iterations=DEFAULT_ITERATIONS):
+    """Hash every plaintext password in a user store; returns the count"""
+    plaintext = [u for u in store.iter_users() if not is_hashed(u['password'])]
+    for user in plaintext:
+        store.update(user['id'], password=hash_password(user['password'], iterations))
+    return len(plaintext)
+
+
+def main():
+    from user_store import JsonUserStore, SqliteUserStore
+
+    parser = argparse.ArgumentParser(description='Hash plaintext passwords in a user store')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--json', metavar='PATH', help='users.json file')
+    target.add_argument('--db', metavar='PATH', help='SQLite user database')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    args = parser.parse_args()
+
+    if args.json:
+        store = JsonUserStore(args.json)
+    else:
+        store = SqliteUserStore(args.db, legacy_json=None)
+    print(f"Hashed {migrate_store(store, args.iterations)} plaintext password(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Threads and SQLite connections for forked workers.
+
+Neither survives fork(): a preloaded app (serve.py, gunicorn) is imported
+once in the master and then runs in every worker. ``PerProcess`` starts
+something - usually a daemon thread, see ``per_process_thread()`` - once in
+each process on first use; ``SqliteConnections`` opens one connection per
+thread and process.
+"""
+import os
+import sqlite3
+import threading
+
+
+class PerProcess:
+    """Calls ``start()`` once in each process, from the first ``ensure()``.
+
+    ``start`` runs under ``lock`` and concurrent callers wait for it to
+    finish; pass the owner's lock when ``start`` touches its state.
+    """
+
+    def __init__(self, start, lock=None):
+        self._start = start
+        self._lock = lock or threading.Lock()
+        self._pid = None
+
+    def ensure(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._start()
+            self._pid = os.getpid()  # set last: the others wait until start() is done
+
+
+def per_process_thread(target, name, lock=None, setup=None):
+    """``PerProcess`` that runs ``setup()`` and then starts a daemon thread on ``target``"""
+    def start():
+        if setup is not None:
+            setup()
+        threading.Thread(target=target, name=name, daemon=True).start()
+    return PerProcess(start, lock)
+
+
+class SqliteConnections:
+    """Connections to the SQLite file ``path``, one per thread and process (WAL mode)"""
+
+    def __init__(self, path, row_factory=None):
+        self.path = path
+        self.row_factory = row_factory
+        self._local = threading.local()
+
+    def get(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
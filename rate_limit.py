@@ -0,0 +1,200 @@
+"""Token-bucket rate limits per route, keyed by client IP and by user.
+
+A limit is written ``'count/period'`` (``'10/minute'``): a bucket holds up
+to ``count`` tokens and refills at ``count / period`` per second, so a
+client may burst ``count`` requests and then keeps the average rate. Every
+request takes one token; an empty bucket answers with the seconds until the
+next token (``Retry-After``). A check is one dict lookup and a little
+arithmetic - no timestamps kept per request.
+
+Buckets live in a store:
+
+* ``MemoryBuckets`` - per-process ``OrderedDict`` capped at ``max_keys``;
+  the least recently used bucket is dropped first (an idle bucket is full
+  again anyway)
+* ``SqliteBuckets`` - rows in the ``SqliteKV`` table from shared_state.py,
+  so every worker draws from the same bucket. A row expires when its bucket
+  would be full, and expired rows are deleted - a missing row is a full
+  bucket, so nothing is lost.
+
+``create_buckets()`` picks one like ``create_registry()`` does.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from shared_state import SqliteKV
+
+RATE_LIMITED = metrics.REGISTRY.counter(
+    'rate_limited_total', 'Requests refused with 429 by rate limit and key type', ('limit', 'scope'))
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+OFF = ('', '0', 'off', 'none')
+
+
+def parse_rate(spec):
+    """``'10/minute'`` -> (tokens per second, burst); None for ``'off'``"""
+    spec = str(spec).strip().lower()
+    if spec in OFF:
+        return None
+    count, _, period = spec.partition('/')
+    try:
+        count = int(count)
+        seconds = PERIODS[period] if period in PERIODS else float(period or 1)
+    except (KeyError, ValueError):
+        raise ValueError(f"Bad rate limit {spec!r}: expected 'count/second|minute|hour|day'")
+    if count <= 0 or seconds <= 0:
+        return None
+    return count / seconds, count
+
+
+def parse_overrides(text):
+    """``'login.ip=30/minute,webhook.*=off'`` -> {('login', 'ip'): '30/minute', ('webhook', '*'): 'off'};
+    ``*`` matches every route / scope, ``'off'`` alone is ``'*.*=off'``"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        if item.lower() == 'off':
+            item = '*.*=off'
+        name, _, spec = item.partition('=')
+        limit, _, scope = name.strip().partition('.')
+        if not scope or not spec:
+            raise ValueError(f"Bad rate limit override {item!r}: expected 'route.scope=count/period'")
+        overrides[(limit, scope)] = spec.strip()
+    return overrides
+
+
+class MemoryBuckets:
+    """Buckets of this process; at most ``max_keys`` (LRU)"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated]
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def take(self, key, rate, burst):
+        """Take one token; returns 0 if allowed, else seconds until one is free"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def stats(self):
+        return {'size': len(self._buckets), 'max_size': self.max_keys, 'evicted': self.evicted, 'backend': 'memory'}
+
+
+class SqliteBuckets:
+    """Buckets shared by all workers, in a ``SqliteKV`` namespace"""
+
+    def __init__(self, kv, name='rate_limits', max_keys=100000, reap_interval=60, reap_writes=1000):
+        self.kv = kv
+        self.name = name
+        self.max_keys = max_keys
+        self.reap_interval = reap_interval
+        self.reap_writes = reap_writes  # also reap this often: many new clients add rows fast
+        self._last_reap = time.time()
+        self._writes = 0
+        self.evicted = 0
+
+    def take(self, key, rate, burst):
+        now = time.time()  # wall clock: compared across processes
+        conn = self.kv.conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # read-modify-write across processes
+            row = conn.execute('SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?',
+                               (self.name, key, now)).fetchone()
+            tokens = burst
+            if row is not None:
+                tokens, updated = json.loads(row[0])
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            # REPLACE gives the row a new rowid: rowid order = eviction order
+            conn.execute('INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                         (self.name, key, json.dumps([tokens, now]), now + (burst - tokens) / rate))
+        self._writes += 1
+        if self._writes >= self.reap_writes or now - self._last_reap >= self.reap_interval:
+            self.reap()
+        return wait
+
+    def reap(self):
+        """Drop full (expired) buckets, then the least recently used beyond ``max_keys``"""
+        self._last_reap = time.time()
+        self._writes = 0
+        with self.kv.conn() as conn:
+            conn.execute('DELETE FROM kv WHERE namespace = ? AND expires_at <= ?', (self.name, time.time()))
+            self.evicted += conn.execute(
+                'DELETE FROM kv WHERE namespace = ? AND rowid IN ('
+                '  SELECT rowid FROM kv WHERE namespace = ? ORDER BY rowid DESC LIMIT -1 OFFSET ?)',
+                (self.name, self.name, self.max_keys)
+            ).rowcount
+
+    def stats(self):
+        size = self.kv.conn().execute('SELECT COUNT(*) FROM kv WHERE namespace = ?', (self.name,)).fetchone()[0]
+        return {'size': size, 'max_size': self.max_keys, 'evicted': self.evicted, 'backend': 'sqlite'}
+
+
+def create_buckets(backend, max_keys, db_path):
+    """``memory``: per-process buckets; ``sqlite``: shared by every worker via ``db_path``"""
+    if backend == 'sqlite':
+        return SqliteBuckets(SqliteKV(db_path), max_keys=max_keys)
+    if backend == 'memory':
+        return MemoryBuckets(max_keys)
+    raise ValueError(f"Unknown shared state backend: {backend}")
+
+
+class RateLimiter:
+    """Named limits, each with a rate per key scope (``ip``, ``user``)::
+
+        limiter = RateLimiter(buckets, {'login': {'ip': '20/minute', 'user': '10/minute'}})
+        retry_after = limiter.check('login', ip=request.remote_addr, user=username)
+    """
+
+    def __init__(self, buckets, limits, overrides=None):
+        self.buckets = buckets
+        merged = {limit: dict(scopes) for limit, scopes in limits.items()}
+        for (limit, scope), spec in (overrides or {}).items():
+            if limit != '*' and limit not in merged:
+                raise ValueError(f"Unknown rate limit {limit!r}")
+            for name in (merged if limit == '*' else [limit]):
+                for key in (list(merged[name]) if scope == '*' else [scope]):
+                    merged[name][key] = spec
+        self.limits = {}
+        for limit, scopes in merged.items():
+            rates = {scope: parse_rate(spec) for scope, spec in scopes.items()}
+            self.limits[limit] = {scope: rate for scope, rate in rates.items() if rate is not None}
+
+    def check(self, limit, **keys):
+        """Take a token from each of the ``limit`` buckets for ``keys``
+        (scope=value; None values are skipped). Returns 0 if the request may
+        go ahead, else the seconds to wait; the first empty bucket refuses."""
+        for scope, (rate, burst) in self.limits[limit].items():
+            value = keys.get(scope)
+            if value is None:
+                continue
+            wait = self.buckets.take(f'{limit}:{scope}:{value}', rate, burst)
+            if wait:
+                RATE_LIMITED.inc(limit=limit, scope=scope)
+                return wait
+        return 0
+
+    def stats(self):
+        return dict(self.buckets.stats(), limits={
+            limit: {scope: f'{burst}/{burst / rate:g}s' for scope, (rate, burst) in scopes.items()}
+            for limit, scopes in self.limits.items()
+        })
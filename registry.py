@@ -0,0 +1,155 @@
+"""Bounded, expiring in-memory registries.
+
+``ExpiringRegistry`` replaces the grow-forever module dicts (pending crypto
+payments, revoked video tokens). Every entry has an expiry; the registry
+also has a size cap (oldest entries go first) and a daemon reaper thread
+that drops expired entries every ``reap_interval`` seconds.
+
+An optional ``persistence`` object (``load()`` / ``save(records)``) lets a
+registry survive restarts: it is loaded once at start-up and saved by the
+reaper whenever something changed - only live entries are written.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from json_file import read_json, write_json
+from per_process import per_process_thread
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    __slots__ = ('value', 'expires_at')
+
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class JsonFilePersistence:
+    """Snapshot a registry to a JSON file (atomic writes, see json_file.py)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        # Stored as [key, value, expires_at] so int keys stay ints
+        return [tuple(item) for item in read_json(self.path, [])[0]]
+
+    def save(self, records):
+        write_json(self.path, [list(item) for item in records])
+
+
+class ExpiringRegistry:
+    def __init__(self, name, ttl, max_size, reap_interval=60, persistence=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reap_interval = reap_interval
+        self.persistence = persistence
+        self._records = OrderedDict()  # insertion order = eviction order
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._reaper = per_process_thread(self._reap_forever, f'reaper-{name}', self._lock)
+        self.expired = 0
+        self.evicted = 0
+        self.reaps = 0
+
+        if persistence is not None:
+            now = time.time()
+            for key, value, expires_at in persistence.load():
+                if expires_at > now:
+                    self._records[key] = _Record(value, expires_at)
+            atexit.register(self.flush)
+
+    # --- Dict-like access ---
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._records.pop(key, None)
+            self._records[key] = _Record(value, expires_at)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+                self.evicted += 1
+            self._dirty = True
+        self._reaper.ensure()
+
+    def get(self, key, default=None):
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or record.expires_at <= time.time():
+                return default
+            return record.value
+
+    def update(self, key, **fields):
+        """Merge ``fields`` into a dict value; returns the value or None"""
+        with self._lock:
+            record = self._records.get(key)
+            if record is None or record.expires_at <= time.time():
+                return None
+            record.value.update(fields)
+            self._dirty = True
+            return record.value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            record = self._records.pop(key, None)
+            if record is None:
+                return default
+            self._dirty = True
+            return record.value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- Reaping ---
+
+    def reap(self):
+        """Drop expired entries; persist if anything changed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, record in self._records.items() if record.expires_at <= now]
+            for key in expired:
+                del self._records[key]
+            self.expired += len(expired)
+            self.reaps += 1
+            if expired:
+                self._dirty = True
+        self.flush()
+        return len(expired)
+
+    def flush(self):
+        if self.persistence is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            records = [(key, r.value, r.expires_at) for key, r in self._records.items()]
+            self._dirty = False
+        self.persistence.save(records)
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception:
+                logger.exception("Reaper failed for %s", self.name)
+
+    def stats(self):
+        return {
+            'size': len(self._records),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'reaps': self.reaps,
+        }
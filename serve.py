@@ -0,0 +1,262 @@
+"""Production entry point: N preforked workers with the app preloaded.
+
+    python serve.py --workers 4 --port 5000
+
+The app is imported once, then the workers are forked from that process and
+share its memory (code, templates, compiled course pages) copy-on-write.
+Worker-independent state comes from outside the process:
+
+* the session / video token secret from ``SECRET_KEY`` or the ``secret_key``
+  file (created on first start), so any worker accepts any session;
+* revoked video tokens and pending payments from ``shared_state.db``
+  (``SHARED_STATE_BACKEND=sqlite``, the default here).
+
+With gunicorn installed this runs it with gunicorn.conf.py; otherwise (or
+with ``--builtin``) a small prefork server on werkzeug's threaded server:
+the master binds the socket, forks the workers, restarts any that die and
+passes SIGTERM/SIGINT on to them. Without ``os.fork`` (Windows) it serves
+from a single process.
+
+Server-Sent Events (``/api/messages/stream``, ``/payment-events/<n>``) would
+hold a worker thread each for as long as a page is open. With uvicorn
+installed, a stream server (asgi.py, one event loop for every stream) is
+started on ``--stream-port`` next to the workers, and the proxy sends those
+paths there (see deploy/nginx.conf). Requests that still reach the workers
+are answered as short polls (``SYNC_STREAM_SECONDS`` in app.py).
+
+Bound to a loopback address (``--host 127.0.0.1``, as deploy/nginx.conf
+expects), the app can only be reached through a local proxy, so
+``TRUSTED_PROXIES`` defaults to 1 and rate limits see the client's address
+from X-Forwarded-For. Set it explicitly for other setups.
+"""
+import argparse
+import atexit
+import gc
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESPAWN_DELAY = 1.0  # Pause before replacing a worker that died right after starting
+STREAM_PATHS = ('/api/messages/stream', '/payment-events/')  # Routed to the stream server by the proxy
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+STREAM_START_TIMEOUT = 60  # Seconds for the stream server to import the app and listen
+
+logger = logging.getLogger('serve')
+
+
+def default_workers():
+    return int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+
+
+# --- Stream server ---
+
+def start_stream_server(args):
+    """Run asgi.py under uvicorn on ``args.stream_port``; None if unavailable.
+
+    Exits if the port is taken or the server doesn't come up (the proxy would
+    send the streams to whatever listens there). Should it die later, the
+    master is stopped with SIGTERM and ``main()`` exits with status 1.
+    """
+    if not args.stream_port:
+        return None
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        logger.warning("uvicorn is not installed: SSE requests are short polls on the workers")
+        return None
+    try:
+        listen(args.host, args.stream_port).close()
+    except OSError as e:
+        sys.exit(f"Stream server port {args.stream_port} is not available ({e}); "
+                 f"pass --stream-port <free port> (0: no stream server)")
+    command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', ROOT,
+               '--host', args.host, '--port', str(args.stream_port)]
+    if not args.access_log:
+        command.append('--no-access-log')
+    process = subprocess.Popen(command, start_new_session=True)  # Ctrl+C reaches us only; stop() ends it
+    master = os.getpid()
+    stopping = []
+
+    def stop():
+        stopping.append(True)
+        if os.getpid() == master and process.poll() is None:  # not from forked workers
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    atexit.register(stop)
+
+    address = ('127.0.0.1' if args.host in ('0.0.0.0', '') else args.host, args.stream_port)
+    deadline = time.monotonic() + STREAM_START_TIMEOUT
+    while True:
+        if process.poll() is not None:
+            sys.exit(f"Stream server exited with status {process.returncode} while starting")
+        try:
+            socket.create_connection(address, timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                sys.exit(f"Stream server not listening on port {args.stream_port} after {STREAM_START_TIMEOUT}s")
+            time.sleep(0.1)
+
+    def watch():
+        process.wait()
+        if not stopping:
+            logger.error("Stream server exited with status %s: stopping", process.returncode)
+            os.kill(master, signal.SIGTERM)
+    threading.Thread(target=watch, name='stream-server-watch', daemon=True).start()
+    logger.info("Stream server for %s on %s:%s (pid %s)", ', '.join(STREAM_PATHS), args.host, args.stream_port,
+                process.pid)
+    return process
+
+
+# --- gunicorn ---
+
+def run_gunicorn(args):
+    from gunicorn.app.wsgiapp import run
+    argv = ['gunicorn', '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+            '--bind', f'{args.host}:{args.port}', '--workers', str(args.workers), 'app:app']
+    if args.access_log:
+        argv[1:1] = ['--access-logfile', '-']
+    sys.argv = argv
+    run()
+
+
+# --- Built-in prefork server ---
+
+def listen(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+
+def make_worker_server(wsgi_app, sock, access_log):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class Handler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive
+
+        def log_request(self, *args, **kwargs):
+            if access_log:
+                super().log_request(*args, **kwargs)
+
+    host, port = sock.getsockname()[:2]
+    return make_server(host, port, wsgi_app, threaded=True, request_handler=Handler, fd=sock.fileno())
+
+
+def fork_workers(count):
+    """Keep ``count`` forked workers running.
+
+    Returns True in a freshly forked worker, and False in the master once it
+    has been told to stop and all workers have exited.
+    """
+    workers = {}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while True:
+        while not stopping and len(workers) < count:
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+                signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C: the master stops us
+                return True
+            workers[pid] = time.monotonic()
+        if stopping and not workers:
+            return False
+        pid, status = next(exited_workers(workers), (0, 0))
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        started = workers.pop(pid)
+        if not stopping:
+            logger.warning("Worker %s exited (status %s), starting a new one", pid, status)
+            if time.monotonic() - started < RESPAWN_DELAY:
+                time.sleep(RESPAWN_DELAY)  # dies right after start: don't fork in a tight loop
+
+
+def exited_workers(workers):
+    """Yield ``(pid, status)`` of the workers that have exited.
+
+    Waits on the worker pids only, so the stream server is left to its
+    ``Popen`` (which must see its exit status).
+    """
+    for pid in list(workers):
+        try:
+            done, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            done, status = pid, 0
+        if done:
+            yield done, status
+
+
+def run_builtin(args):
+    import app as alpha
+    sock = listen(args.host, args.port)
+    if not hasattr(os, 'fork'):
+        logger.warning("os.fork is not available: serving from one process")
+        make_worker_server(alpha.app, sock, args.access_log).serve_forever()
+        return
+    # Keep the GC from touching (and so copying) the preloaded objects in the workers
+    gc.freeze()
+    logger.info("Listening on %s:%s with %s workers", args.host, args.port, args.workers)
+    if fork_workers(args.workers):
+        make_worker_server(alpha.app, sock, args.access_log).serve_forever()
+    else:
+        logger.info("All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument('--stream-port', type=int, default=os.environ.get('STREAM_PORT'),
+                        help='port of the asgi.py stream server (default: --port + 1, 0 = none)')
+    parser.add_argument('--builtin', action='store_true', help='use the built-in prefork server even if gunicorn is installed')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args()
+    if args.stream_port is None:
+        args.stream_port = args.port + 1
+
+    os.environ.setdefault('SHARED_STATE_BACKEND', 'sqlite')  # read by app.py at import
+    if args.host in LOOPBACK_HOSTS:
+        os.environ.setdefault('TRUSTED_PROXIES', '1')  # only a local proxy can connect
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    stream_server = start_stream_server(args)
+    if not args.builtin:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            args.builtin = True
+    try:
+        if args.builtin:
+            run_builtin(args)
+        else:
+            run_gunicorn(args)
+    finally:
+        if stream_server is not None and stream_server.returncode is not None:
+            sys.exit(1)  # stopped because the stream server died
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""State shared by all worker processes.
+
+With several workers (serve.py) each process has its own memory, so the
+in-process ``ExpiringRegistry`` would give every worker a different list of
+revoked video tokens and pending payments. ``SqliteKV`` is a small
+key/value table with per-entry expiry in one SQLite file (WAL mode, safe
+for concurrent processes); ``SharedRegistry`` puts the ``ExpiringRegistry``
+interface on top of it, so app.py can use either.
+
+``create_registry()`` picks the backend (``memory`` or ``sqlite``), and
+``load_secret_key()`` gives every worker - and every restart - the same
+session/token secret.
+"""
+import json
+import os
+import secrets
+import time
+
+from json_file import file_lock
+from per_process import SqliteConnections
+from registry import ExpiringRegistry
+
+
+def load_secret_key(path):
+    """Secret stored in ``path``; generated (mode 0600) on first use"""
+    with file_lock(path):
+        if not os.path.exists(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+        with open(path) as f:
+            return f.read().strip()
+
+
+class SqliteKV:
+    """Namespaced key/value rows with expiry; one connection per thread and process"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = SqliteConnections(path)
+        with self.conn() as conn:
+            conn.execute(self.SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS kv_expiry ON kv (namespace, expires_at)')
+
+    def conn(self):
+        return self._connections.get()
+
+
+class SharedRegistry:
+    """``ExpiringRegistry`` look-alike stored in a ``SqliteKV`` namespace.
+
+    Keys are stored as JSON, so int keys come back as ints. Expired rows are
+    ignored on read and deleted by ``reap()``, which runs from ``set()`` at
+    most every ``reap_interval`` seconds (no thread to restart after fork).
+    """
+
+    def __init__(self, name, kv, ttl, max_size, reap_interval=60):
+        self.name = name
+        self.kv = kv
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reap_interval = reap_interval
+        self._last_reap = time.time()
+        self.expired = 0
+        self.evicted = 0
+        self.reaps = 0
+
+    def _key(self, key):
+        return json.dumps(key)
+
+    # --- Dict-like access ---
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self.kv.conn() as conn:
+            # Delete + insert gives the row a new rowid: rowid order = eviction order
+            conn.execute('DELETE FROM kv WHERE namespace = ? AND key = ?', (self.name, self._key(key)))
+            conn.execute('INSERT INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                         (self.name, self._key(key), json.dumps(value), expires_at))
+        if time.time() - self._last_reap >= self.reap_interval:
+            self.reap()
+
+    def get(self, key, default=None):
+        row = self.kv.conn().execute(
+            'SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.name, self._key(key), time.time())
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def update(self, key, **fields):
+        """Merge ``fields`` into a dict value; returns the value or None"""
+        conn = self.kv.conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')  # read-modify-write across processes
+            row = conn.execute(
+                'SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?',
+                (self.name, self._key(key), time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            value.update(fields)
+            conn.execute('UPDATE kv SET value = ? WHERE namespace = ? AND key = ?',
+                         (json.dumps(value), self.name, self._key(key)))
+            return value
+
+    def pop(self, key, default=None):
+        conn = self.kv.conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?',
+                               (self.name, self._key(key))).fetchone()
+            if row is None:
+                return default
+            conn.execute('DELETE FROM kv WHERE namespace = ? AND key = ?', (self.name, self._key(key)))
+            return json.loads(row[0]) if row[1] > time.time() else default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.kv.conn().execute('SELECT COUNT(*) FROM kv WHERE namespace = ?', (self.name,)).fetchone()[0]
+
+    # --- Reaping ---
+
+    def reap(self):
+        """Drop expired rows, then the oldest ones beyond ``max_size``"""
+        self._last_reap = time.time()
+        with self.kv.conn() as conn:
+            expired = conn.execute('DELETE FROM kv WHERE namespace = ? AND expires_at <= ?',
+                                   (self.name, time.time())).rowcount
+            evicted = conn.execute(
+                'DELETE FROM kv WHERE namespace = ? AND rowid IN ('
+                '  SELECT rowid FROM kv WHERE namespace = ? ORDER BY rowid DESC LIMIT -1 OFFSET ?)',
+                (self.name, self.name, self.max_size)
+            ).rowcount
+        self.expired += expired
+        self.evicted += evicted
+        self.reaps += 1
+        return expired
+
+    def flush(self):
+        pass  # every write is already durable
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'reaps': self.reaps,
+            'backend': 'sqlite',
+        }
+
+
+def create_registry(backend, name, ttl, max_size, db_path, persistence=None):
+    """``memory``: per-process ``ExpiringRegistry`` (optionally persisted);
+    ``sqlite``: ``SharedRegistry`` in ``db_path``, seen by every worker"""
+    if backend == 'sqlite':
+        return SharedRegistry(name, SqliteKV(db_path), ttl, max_size)
+    if backend == 'memory':
+        return ExpiringRegistry(name, ttl=ttl, max_size=max_size, persistence=persistence)
+    raise ValueError(f"Unknown shared state backend: {backend}")
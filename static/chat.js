@@ -3,16 +3,20 @@
 (function () {
     'use strict';
 
+    // Fingerprinted stylesheet URL from the page (data-css), if it gave one
+    const CHAT_CSS = (document.currentScript && document.currentScript.dataset.css) || '/static/chat.css';
+
     function initChat() {
         // State
         let isAdmin = false;
         let lastMessageId = 0;
+        let messagesEtag = null;
         let isChatOpen = false;
 
         // Inject CSS
         const link = document.createElement('link');
         link.rel = 'stylesheet';
-        link.href = '/static/chat.css';
+        link.href = CHAT_CSS;
         document.head.appendChild(link);
 
         // Chat HTML Template
@@ -49,11 +53,11 @@
         const sendBtn = document.getElementById('sendMsgBtn');
         const inputField = document.getElementById('chatInput');
 
-        // Initial check for admin
+        // Initial check for admin (one-row page; non-admins are redirected or refused)
         function checkAdminStatus() {
-            fetch('/api/users')
+            fetch('/api/users?limit=1')
                 .then(res => {
-                    if (res.ok) {
+                    if (res.ok && !res.redirected) {
                         isAdmin = true;
                         adminInput.style.display = 'block';
                     }
@@ -76,34 +80,54 @@
             windowEl.classList.remove('active');
         });
 
-        // Fetch Messages
+        // Fetch Messages (only those newer than lastMessageId; 304 when nothing changed)
         async function fetchMessages() {
             try {
-                const res = await fetch('/api/messages');
-                const messages = await res.json();
+                const headers = messagesEtag ? { 'If-None-Match': messagesEtag } : {};
+                const res = await fetch(`/api/messages?since=${lastMessageId}`, { headers, cache: 'no-store' });
+                if (res.status === 304) return;
+
+                messagesEtag = res.headers.get('ETag');
+                appendMessages(await res.json());
+            } catch (err) {
+                console.error('Chat error:', err);
+            }
+        }
 
-                if (messages.length === 0) {
+        function appendMessages(messages) {
+            messages = messages.filter(msg => msg.id > lastMessageId);
+            if (messages.length === 0) {
+                if (lastMessageId === 0) {
                     messagesEl.innerHTML = '<div style="text-align:center; color:rgba(255,255,255,0.4); margin-top:20px">لا توجد رسائل حالياً</div>';
-                    return;
                 }
+                return;
+            }
 
-                messagesEl.innerHTML = '';
-                messages.forEach(msg => {
-                    const item = document.createElement('div');
-                    item.className = 'message-item';
-                    item.innerHTML = `
-                        <div class="message-sender">${msg.sender}</div>
-                        <div class="message-content">${msg.content}</div>
-                        <div class="message-time">${msg.timestamp}</div>
-                    `;
-                    messagesEl.appendChild(item);
-                });
+            // First messages replace the loading / empty placeholder
+            if (lastMessageId === 0) messagesEl.innerHTML = '';
+            messages.forEach(msg => {
+                const item = document.createElement('div');
+                item.className = 'message-item';
+                item.innerHTML = `
+                    <div class="message-sender">${msg.sender}</div>
+                    <div class="message-content">${msg.content}</div>
+                    <div class="message-time">${msg.timestamp}</div>
+                `;
+                messagesEl.appendChild(item);
+            });
+
+            lastMessageId = messages[messages.length - 1].id;
+            if (isChatOpen) scrollToBottom();
+        }
 
-                lastMessageId = messages[messages.length - 1].id;
-                if (isChatOpen) scrollToBottom();
-            } catch (err) {
-                console.error('Chat error:', err);
+        // New messages are pushed by the server as they are posted
+        function subscribeMessages() {
+            if (!window.EventSource) {
+                setInterval(fetchMessages, 5000);
+                return;
             }
+            const events = new EventSource(`/api/messages/stream?since=${lastMessageId}`);
+            events.onmessage = (event) => appendMessages([JSON.parse(event.data)]);
         }
 
         function scrollToBottom() {
@@ -139,9 +163,8 @@
             }
         });
 
-        setInterval(fetchMessages, 5000);
         checkAdminStatus();
-        fetchMessages();
+        fetchMessages().then(subscribeMessages);
     }
 
     if (document.readyState === 'loading') {
@@ -90,37 +90,108 @@ if (registerForm) {
 }
 
 // Admin Logic
+// The table is filled one page at a time (GET /api/users?limit=...&cursor=...)
+// as the admin scrolls; filters and sorting are applied by the server.
+const USERS_PAGE_SIZE = 50;
+const userList = { cursor: null, hasMore: true, loading: false, generation: 0 };
+
+function userListQuery() {
+    const params = new URLSearchParams({ limit: USERS_PAGE_SIZE });
+    const value = id => (document.getElementById(id) || {}).value || '';
+    if (value('userSearch').trim()) params.set('prefix', value('userSearch').trim());
+    if (value('userRoleFilter')) params.set('role', value('userRoleFilter'));
+    if (value('userPaidFilter')) params.set('has_paid', value('userPaidFilter'));
+    params.set('sort', value('userSort') || 'id');
+    if (userList.cursor) params.set('cursor', userList.cursor);
+    return params;
+}
+
+function renderUserRow(user) {
+    const tr = document.createElement('tr');
+    tr.innerHTML = `
+        <td>${user.id}</td>
+        <td>${user.username}</td>
+        <td>${user.role || 'user'}</td>
+        <td><span class="status-badge ${user.has_paid ? 'paid' : 'unpaid'}" style="background: ${user.has_paid ? 'rgba(16, 185, 129, 0.2); color: #10b981' : 'rgba(239, 68, 68, 0.2); color: #ef4444'}; padding: 4px 8px; border-radius: 4px; font-size: 0.8rem;">${user.has_paid ? 'Premium' : 'Free'}</span></td>
+        <td>
+            <button class="action-btn btn-edit" onclick="openEdit(${user.id}, '${user.username}', '${user.role || 'user'}', ${user.has_paid})">Edit</button>
+            <button class="action-btn btn-delete" onclick="deleteUser(${user.id})">Delete</button>
+        </td>
+    `;
+    return tr;
+}
+
+// Start over from the first page (after a filter change or an edit)
 async function loadUsers() {
     const tbody = document.getElementById('userTableBody');
     if (!tbody) return;
 
+    userList.generation++;
+    userList.cursor = null;
+    userList.hasMore = true;
+    userList.loading = false;
+    tbody.innerHTML = '';
+    await loadMoreUsers();
+}
+
+async function loadMoreUsers() {
+    const tbody = document.getElementById('userTableBody');
+    if (!tbody || userList.loading || !userList.hasMore) return;
+
+    const generation = userList.generation;
+    userList.loading = true;
     try {
-        const res = await fetch(`${API_BASE}/users`);
-        const users = await res.json();
-
-        tbody.innerHTML = '';
-        users.forEach(user => {
-            const tr = document.createElement('tr');
-            const statusClass = user.has_paid ? 'status-paid' : 'status-unpaid';
-            const statusText = user.has_paid ? 'PAID' : 'FREE';
-
-            tr.innerHTML = `
-                <td>${user.id}</td>
-                <td>${user.username}</td>
-                <td>${user.role || 'user'}</td>
-                <td><span class="status-badge ${user.has_paid ? 'paid' : 'unpaid'}" style="background: ${user.has_paid ? 'rgba(16, 185, 129, 0.2); color: #10b981' : 'rgba(239, 68, 68, 0.2); color: #ef4444'}; padding: 4px 8px; border-radius: 4px; font-size: 0.8rem;">${user.has_paid ? 'Premium' : 'Free'}</span></td>
-                <td>
-                    <button class="action-btn btn-edit" onclick="openEdit(${user.id}, '${user.username}', '${user.role || 'user'}', ${user.has_paid})">Edit</button>
-                    <button class="action-btn btn-delete" onclick="deleteUser(${user.id})">Delete</button>
-                </td>
-            `;
-            tbody.appendChild(tr);
-        });
+        const res = await fetch(`${API_BASE}/users?${userListQuery()}`);
+        const page = await res.json();
+        if (generation !== userList.generation) return; // filters changed meanwhile
+
+        page.users.forEach(user => tbody.appendChild(renderUserRow(user)));
+        userList.cursor = page.next_cursor;
+        userList.hasMore = page.has_more;
+
+        const count = document.getElementById('userCount');
+        if (count) count.textContent = `Showing ${tbody.children.length} of ${page.total} users`;
+        const more = document.getElementById('loadMoreUsers');
+        if (more) more.style.display = userList.hasMore ? 'inline-block' : 'none';
     } catch (err) {
         console.error("Failed to load users");
+        userList.hasMore = false;
+    } finally {
+        if (generation === userList.generation) userList.loading = false;
+    }
+
+    // Short pages on a tall screen: the sentinel is still in view, keep going
+    const sentinel = document.getElementById('userListSentinel');
+    if (generation === userList.generation && userList.hasMore && sentinel &&
+        sentinel.getBoundingClientRect().top < window.innerHeight + 200) {
+        loadMoreUsers();
     }
 }
 
+function initUserList() {
+    const sentinel = document.getElementById('userListSentinel');
+    if (sentinel && 'IntersectionObserver' in window) {
+        new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMoreUsers();
+        }, { rootMargin: '200px' }).observe(sentinel);
+    }
+
+    let searchTimer = null;
+    const search = document.getElementById('userSearch');
+    if (search) {
+        search.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(loadUsers, 300);
+        });
+    }
+    ['userRoleFilter', 'userPaidFilter', 'userSort'].forEach(id => {
+        const el = document.getElementById(id);
+        if (el) el.addEventListener('change', loadUsers);
+    });
+
+    loadUsers();
+}
+
 async function deleteUser(id) {
     if (!confirm('Are you sure you want to delete this user?')) return;
 
@@ -240,6 +311,11 @@ async function importUsers(event) {
     const file = event.target.files[0];
     if (!file) return;
 
+    // Large migrations: NDJSON (one user per line) is streamed to the server as-is
+    if (file.name.endsWith('.ndjson') || file.name.endsWith('.jsonl')) {
+        return importUsersNdjson(event, file);
+    }
+
     // Validate file type
     if (!file.name.endsWith('.json')) {
         showMessage('Please select a valid JSON file', 'error');
@@ -291,3 +367,31 @@ async function importUsers(event) {
         event.target.value = ''; // Reset file input
     }
 }
+
+async function importUsersNdjson(event, file) {
+    try {
+        if (!confirm(`This will import users from ${file.name}. Do you want to continue?\n\nNote: Existing users with the same username will be skipped.`)) {
+            return;
+        }
+
+        showMessage('Importing users...', 'success');
+        const res = await fetch(`${API_BASE}/users/import`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/x-ndjson' },
+            body: file
+        });
+        const data = await res.json();
+
+        if (data.success) {
+            showMessage(`Import successful! Added ${data.added} new user(s), skipped ${data.skipped} existing user(s).`, 'success');
+            loadUsers();
+        } else {
+            showMessage(data.message || 'Import failed', 'error');
+        }
+    } catch (err) {
+        console.error(err);
+        showMessage(`Import failed: ${err.message}`, 'error');
+    } finally {
+        event.target.value = ''; // Reset file input
+    }
+}
@@ -0,0 +1,178 @@
+"""Read-through user cache for the auth decorators.
+
+``UserCache`` wraps a user store (see ``user_store.py``) and answers
+``get(user_id)`` from memory. Entries are dropped when:
+
+* the store's ``version()`` changes (file mtime/size - catches writes made by
+  other workers or by hand-editing the file),
+* a write goes through this wrapper (``create``/``update``/``delete``/...),
+* they are older than ``ttl`` seconds, or
+* the cache holds more than ``maxsize`` users (least recently used first).
+
+Every call that reaches the store (cache misses included) is timed in the
+``user_store_seconds`` histogram, labelled with the operation.
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+import metrics
+
+USER_STORE_SECONDS = metrics.REGISTRY.histogram(
+    'user_store_seconds', 'User store calls by operation (cache hits not included)', ('op',),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+_MISSING = object()
+
+
+class UserCache:
+    def __init__(self, store, maxsize=10000, ttl=60):
+        self.store = store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (user or None, expires_at)
+        self._lock = threading.Lock()
+        self._version = store.version()
+        self._generation = 0  # bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self):
+        version = self.store.version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self._generation += 1
+            self.invalidations += 1
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            user, expires_at = self._entries.get(user_id, (_MISSING, 0))
+            if user is not _MISSING and expires_at > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return dict(user) if user else None
+            self.misses += 1
+            generation = self._generation
+
+        with USER_STORE_SECONDS.time(op='get'):
+            user = self.store.get(user_id)
+        with self._lock:
+            if generation != self._generation:
+                # A write landed while we were reading; don't cache stale data
+                return dict(user) if user else None
+            self._entries[user_id] = (user, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return dict(user) if user else None
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def _after_write(self, *user_ids):
+        # Our own write changes the file version; adopt it so it doesn't
+        # flush every other cached user, and drop only what we touched.
+        with self._lock:
+            self._version = self.store.version()
+            if not user_ids:
+                self._entries.clear()
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    # --- Store interface (writes invalidate) ---
+
+    def version(self):
+        return self.store.version()
+
+    def all(self):
+        with USER_STORE_SECONDS.time(op='all'):
+            return self.store.all()
+
+    def count(self):
+        with USER_STORE_SECONDS.time(op='count'):
+            return self.store.count()
+
+    def get_by_username(self, username):
+        with USER_STORE_SECONDS.time(op='get_by_username'):
+            return self.store.get_by_username(username)
+
+    def query(self, **filters):
+        with USER_STORE_SECONDS.time(op='query'):
+            return self.store.query(**filters)
+
+    def iter_users(self, batch_size=1000):
+        # Timed per batch: the caller's work between batches is not store time
+        users = iter(self.store.iter_users(batch_size))
+        while True:
+            with USER_STORE_SECONDS.time(op='iter_users'):
+                batch = list(islice(users, batch_size))
+            yield from batch
+            if len(batch) < batch_size:
+                return
+
+    def create(self, *args, **kwargs):
+        with USER_STORE_SECONDS.time(op='create'):
+            user = self.store.create(*args, **kwargs)
+        self._after_write(user['id'])
+        return user
+
+    def add_many(self, new_users):
+        with USER_STORE_SECONDS.time(op='add_many'):
+            result = self.store.add_many(new_users)
+        self._after_write()
+        return result
+
+    def update(self, user_id, **fields):
+        with USER_STORE_SECONDS.time(op='update'):
+            user = self.store.update(user_id, **fields)
+        self._after_write(user_id)
+        return user
+
+    def update_many(self, user_ids, **fields):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        with USER_STORE_SECONDS.time(op='update_many'):
+            updated = self.store.update_many(user_ids, **fields)
+        self._after_write(*user_ids)
+        return updated
+
+    def delete(self, user_id):
+        with USER_STORE_SECONDS.time(op='delete'):
+            deleted = self.store.delete(user_id)
+        self._after_write(user_id)
+        return deleted
+
+    def replace_all(self, users):
+        with USER_STORE_SECONDS.time(op='replace_all'):
+            self.store.replace_all(users)
+        self._after_write()
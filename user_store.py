@@ -0,0 +1,363 @@
+"""User storage backends.
+
+Two interchangeable stores sit behind the helpers in ``app.py``:
+
+* ``SqliteUserStore`` - embedded, indexed store (point lookups by ``id`` and
+  ``username``, single-row updates). This is the default.
+* ``JsonUserStore`` - the legacy ``users.json`` file. Kept for small setups and
+  as the import source the first time the SQLite store is created.
+
+Users are always handed out as plain dicts with the same keys ``users.json``
+has always used: ``id``, ``username``, ``password``, ``role``, ``has_paid``.
+"""
+import os
+import sqlite3
+
+from json_file import file_version, read_json, update_json, write_json
+from per_process import SqliteConnections
+
+USER_FIELDS = ('id', 'username', 'password', 'role', 'has_paid')
+SORT_FIELDS = ('id', 'username')  # Unique columns: a row's sort value is also its page cursor
+PREFIX_END = '\U0010ffff'  # Sorts after every other character: [prefix, prefix + PREFIX_END)
+
+
+class UserExistsError(ValueError):
+    """Raised when creating or renaming a user to a username that is already taken"""
+
+
+def _normalize(user):
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'password': user['password'],
+        'role': user.get('role') or 'user',
+        'has_paid': bool(user.get('has_paid', False)),
+    }
+
+
+# --- Legacy JSON backend ---
+
+class JsonUserStore:
+    """Whole-file ``users.json`` store (every call parses the file).
+
+    Writes are atomic and locked; read-modify-write retries on conflict
+    (see ``json_file.py``).
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _load(self):
+        return read_json(self.path, [])[0]
+
+    def _update(self, mutate):
+        return update_json(self.path, mutate, [], indent=4)
+
+    def version(self):
+        return file_version(self.path)
+
+    def all(self):
+        return self._load()
+
+    def count(self):
+        return len(self._load())
+
+    def get(self, user_id):
+        return next((u for u in self._load() if u.get('id') == user_id), None)
+
+    def get_by_username(self, username):
+        return next((u for u in self._load() if u.get('username') == username), None)
+
+    def query(self, prefix=None, role=None, has_paid=None, sort='id', descending=False,
+              limit=50, offset=0, after=None):
+        """Like ``SqliteUserStore.query`` (filters and sorts the whole file in memory)"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort users by {sort!r}")
+        users = [u for u in self._load()
+                 if (not prefix or u['username'].startswith(prefix))
+                 and (role is None or (u.get('role') or 'user') == role)
+                 and (has_paid is None or bool(u.get('has_paid', False)) == has_paid)]
+        users.sort(key=lambda u: u[sort], reverse=descending)
+        total = len(users)
+        if after is not None:
+            users = [u for u in users if (u[sort] < after if descending else u[sort] > after)]
+            offset = 0
+        return users[offset:offset + limit], total
+
+    def create(self, username, password, role='user', has_paid=False):
+        def mutate(users):
+            if any(u.get('username') == username for u in users):
+                raise UserExistsError(username)
+            user = {
+                'id': max((u['id'] for u in users), default=0) + 1,
+                'username': username,
+                'password': password,
+                'role': role,
+                'has_paid': has_paid
+            }
+            users.append(user)
+            return user
+        return self._update(mutate)
+
+    def iter_users(self, batch_size=1000):
+        yield from self._load()
+
+    def add_many(self, new_users):
+        """Append users, skipping taken usernames.
+        Returns (added count, list of skipped usernames)"""
+        def mutate(users):
+            usernames = {u.get('username') for u in users}
+            max_id = max((u['id'] for u in users), default=0)
+            added = 0
+            skipped = []
+            for user in new_users:
+                if user['username'] in usernames:
+                    skipped.append(user['username'])
+                    continue
+                max_id += 1
+                users.append(_normalize(dict(user, id=max_id)))
+                usernames.add(user['username'])
+                added += 1
+            return added, skipped
+        return self._update(mutate)
+
+    def update(self, user_id, **fields):
+        def mutate(users):
+            if 'username' in fields and any(u.get('username') == fields['username'] and u.get('id') != user_id
+                                            for u in users):
+                raise UserExistsError(fields['username'])
+            for user in users:
+                if user.get('id') == user_id:
+                    user.update(fields)
+                    return dict(user)
+            return None
+        return self._update(mutate)
+
+    def update_many(self, user_ids, **fields):
+        """Set the same ``fields`` on several users in one rewrite; returns how many exist"""
+        user_ids = set(user_ids)
+        def mutate(users):
+            updated = 0
+            for user in users:
+                if user.get('id') in user_ids:
+                    user.update(fields)
+                    updated += 1
+            return updated
+        return self._update(mutate)
+
+    def delete(self, user_id):
+        def mutate(users):
+            before = len(users)
+            users[:] = [u for u in users if u.get('id') != user_id]
+            return len(users) != before
+        return self._update(mutate)
+
+    def replace_all(self, users):
+        write_json(self.path, users, indent=4)
+
+
+# --- SQLite backend ---
+
+class SqliteUserStore:
+    """Indexed SQLite store; one connection per thread"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            has_paid INTEGER NOT NULL DEFAULT 0
+        )
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._connections = SqliteConnections(path, row_factory=sqlite3.Row)
+        with self._conn() as conn:
+            conn.execute(self.SCHEMA)
+            # Admin listing filters (username prefixes use the UNIQUE index)
+            conn.execute('CREATE INDEX IF NOT EXISTS users_role ON users (role, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS users_has_paid ON users (has_paid, id)')
+        # First run: seed the table from the old users.json
+        if legacy_json and self.count() == 0 and os.path.exists(legacy_json):
+            self.replace_all(JsonUserStore(legacy_json).all())
+
+    def _conn(self):
+        return self._connections.get()
+
+    @staticmethod
+    def _username_taken(error):
+        """Whether an IntegrityError is the UNIQUE constraint on username"""
+        return 'UNIQUE constraint failed: users.username' in str(error)
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        user = dict(row)
+        user['has_paid'] = bool(user['has_paid'])
+        return user
+
+    def version(self):
+        # Every commit appends to the WAL; checkpoints rewrite the main file
+        return file_version(self.path, self.path + '-wal')
+
+    def all(self):
+        rows = self._conn().execute('SELECT * FROM users ORDER BY id').fetchall()
+        return [self._row(r) for r in rows]
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def get(self, user_id):
+        row = self._conn().execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+        return self._row(row)
+
+    def get_by_username(self, username):
+        row = self._conn().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        return self._row(row)
+
+    def query(self, prefix=None, role=None, has_paid=None, sort='id', descending=False,
+              limit=50, offset=0, after=None):
+        """One page of users matching the filters, and how many match in total.
+
+        ``after`` is the ``sort`` value of the last row of the previous page:
+        the next page starts right after it (keyset paging, ``offset`` ignored).
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort users by {sort!r}")
+        where, params = [], []
+        if prefix:
+            where.append('username >= ? AND username < ?')
+            params += [prefix, prefix + PREFIX_END]
+        if role is not None:
+            where.append('role = ?')
+            params.append(role)
+        if has_paid is not None:
+            where.append('has_paid = ?')
+            params.append(int(bool(has_paid)))
+        conn = self._conn()
+        total = conn.execute(
+            'SELECT COUNT(*) FROM users' + (' WHERE ' + ' AND '.join(where) if where else ''), params
+        ).fetchone()[0]
+        if after is not None:
+            where.append(f'{sort} {"<" if descending else ">"} ?')
+            params.append(after)
+            offset = 0
+        rows = conn.execute(
+            'SELECT * FROM users' + (' WHERE ' + ' AND '.join(where) if where else '')
+            + f' ORDER BY {sort} {"DESC" if descending else "ASC"} LIMIT ? OFFSET ?',
+            (*params, limit, offset)
+        ).fetchall()
+        return [self._row(r) for r in rows], total
+
+    def create(self, username, password, role='user', has_paid=False):
+        try:
+            with self._conn() as conn:
+                # id left NULL -> SQLite assigns max(id) + 1
+                cur = conn.execute(
+                    'INSERT INTO users (username, password, role, has_paid) VALUES (?, ?, ?, ?)',
+                    (username, password, role, int(bool(has_paid)))
+                )
+        except sqlite3.IntegrityError as e:
+            if not self._username_taken(e):
+                raise
+            raise UserExistsError(username) from None
+        return self.get(cur.lastrowid)
+
+    def iter_users(self, batch_size=1000):
+        """All users in id order, fetched ``batch_size`` rows at a time"""
+        last_id = 0
+        while True:
+            rows = self._conn().execute(
+                'SELECT * FROM users WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row(row)
+            last_id = rows[-1]['id']
+
+    def add_many(self, new_users):
+        """Append users in one transaction, skipping taken usernames.
+        Returns (added count, list of skipped usernames)"""
+        with self._conn() as conn:
+            taken = set()
+            usernames = [u['username'] for u in new_users]
+            for i in range(0, len(usernames), 500):  # stay under SQLite's parameter limit
+                chunk = usernames[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                taken.update(r[0] for r in conn.execute(
+                    f'SELECT username FROM users WHERE username IN ({placeholders})', chunk))
+            rows = []
+            skipped = []
+            for u in new_users:
+                if u['username'] in taken:
+                    skipped.append(u['username'])
+                    continue
+                taken.add(u['username'])
+                rows.append((u['username'], u['password'], u.get('role') or 'user', int(bool(u.get('has_paid', False)))))
+            conn.executemany(
+                'INSERT INTO users (username, password, role, has_paid) VALUES (?, ?, ?, ?)',
+                rows
+            )
+        return len(rows), skipped
+
+    @staticmethod
+    def _columns(fields):
+        fields = {k: v for k, v in fields.items() if k in USER_FIELDS and k != 'id'}
+        if 'has_paid' in fields:
+            fields['has_paid'] = int(bool(fields['has_paid']))
+        return fields
+
+    def update(self, user_id, **fields):
+        fields = self._columns(fields)
+        if fields:
+            assignments = ', '.join(f'{k} = ?' for k in fields)
+            try:
+                with self._conn() as conn:
+                    cur = conn.execute(f'UPDATE users SET {assignments} WHERE id = ?',
+                                       (*fields.values(), user_id))
+            except sqlite3.IntegrityError as e:
+                if not self._username_taken(e):
+                    raise
+                raise UserExistsError(fields['username']) from None
+            if cur.rowcount == 0:
+                return None
+        return self.get(user_id)
+
+    def update_many(self, user_ids, **fields):
+        """Set the same ``fields`` on several users in one transaction; returns how many exist"""
+        fields = self._columns(fields)
+        if not fields:
+            return 0
+        assignments = ', '.join(f'{k} = ?' for k in fields)
+        with self._conn() as conn:
+            cur = conn.executemany(f'UPDATE users SET {assignments} WHERE id = ?',
+                                   [(*fields.values(), user_id) for user_id in user_ids])
+        return cur.rowcount
+
+    def delete(self, user_id):
+        with self._conn() as conn:
+            cur = conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        return cur.rowcount > 0
+
+    def replace_all(self, users):
+        rows = [(u['id'], u['username'], u['password'], u.get('role') or 'user', int(bool(u.get('has_paid', False))))
+                for u in users]
+        with self._conn() as conn:
+            conn.execute('DELETE FROM users')
+            conn.executemany(
+                'INSERT INTO users (id, username, password, role, has_paid) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+
+def create_user_store(backend, json_path, db_path):
+    """Build the configured store ('sqlite' or 'json')"""
+    if backend == 'json':
+        return JsonUserStore(json_path)
+    if backend == 'sqlite':
+        return SqliteUserStore(db_path, legacy_json=json_path)
+    raise ValueError(f"Unknown user store backend: {backend}")
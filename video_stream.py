@@ -0,0 +1,152 @@
+"""Byte-range video responses for /stream-video.
+
+``send_video`` answers one request for a video file:
+
+* ``Range: bytes=a-b`` -> ``206 Partial Content`` with only those bytes, so
+  seeking in a multi-GB file doesn't re-read it from the start;
+* ``If-None-Match`` / ``If-Modified-Since`` -> ``304 Not Modified``;
+* ``If-Range`` that no longer matches -> the full file (``200``);
+* an unsatisfiable range -> ``416`` (malformed or multi-range headers are
+  ignored and the full file is sent, as RFC 9110 allows).
+
+Bytes are handed to the WSGI server's ``wsgi.file_wrapper`` when it can do
+zero-copy ``sendfile`` (gunicorn and friends respect Content-Length, so that
+works for ranges too). Otherwise the file is memory-mapped and sliced into
+``chunk_size`` pieces, which avoids read() buffers per chunk.
+
+``offload_video`` is the alternative for deployments behind nginx (or Apache /
+lighttpd): the app only authorizes the request and returns an internal
+redirect header, and the proxy serves the bytes (ranges included).
+"""
+import mmap
+import os
+from datetime import datetime, timezone
+
+from flask import Response, request
+from werkzeug.http import http_date, quote_etag
+from werkzeug.wsgi import FileWrapper
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def stat_etag(st):
+    """ETag of a file from its ``os.stat`` result"""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+class MmapRangeIterator:
+    """Yields ``[start, stop)`` of a file in ``chunk_size`` slices"""
+
+    def __init__(self, path, start, stop, chunk_size):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.start = start
+        self.stop = stop
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        position = self.start
+        while position < self.stop:
+            end = min(position + self.chunk_size, self.stop)
+            yield self._map[position:end]
+            position = end
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _body(path, start, stop, chunk_size, use_sendfile, whole_file):
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # Werkzeug's own wrapper reads to EOF, which is only right for the full file
+    server_sendfile = file_wrapper is not None and file_wrapper is not FileWrapper
+    if use_sendfile and server_sendfile:
+        f = open(path, 'rb')
+        f.seek(start)
+        return file_wrapper(f, chunk_size)
+    if use_sendfile and file_wrapper is not None and whole_file:
+        return file_wrapper(open(path, 'rb'), chunk_size)
+    return MmapRangeIterator(path, start, stop, chunk_size)
+
+
+def offload_video(path, mimetype, mode, accel_prefix):
+    """Hand the file to the front proxy.
+
+    ``mode`` is ``'x-accel'`` (nginx: internal location under ``accel_prefix``)
+    or ``'x-sendfile'`` (Apache mod_xsendfile / lighttpd: absolute path).
+    """
+    response = Response(mimetype=mimetype)
+    if mode == 'x-accel':
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + os.path.basename(path)
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    else:
+        raise ValueError(f"Unknown offload mode: {mode}")
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def plan_video(path, req, st=None):
+    """Decide how to answer ``req`` (any werkzeug Request) for ``path``.
+
+    Returns ``(status, headers, start, stop)``; the body is bytes
+    ``[start, stop)`` (empty for 304/416). Shared with the ASGI server.
+    ``st`` is the file's cached ``os.stat`` result (media_catalog.py), if any.
+    """
+    if st is None:
+        st = os.stat(path)
+    size = st.st_size
+    etag = stat_etag(st)
+    last_modified = datetime.fromtimestamp(int(st.st_mtime), tz=timezone.utc)
+
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+    }
+
+    # Conditional GET: the browser already has these bytes
+    if req.if_none_match:
+        if req.if_none_match.contains(etag):
+            return 304, headers, 0, 0
+    elif req.if_modified_since and req.if_modified_since >= last_modified:
+        return 304, headers, 0, 0
+
+    byte_range = req.range
+    if byte_range is not None and len(byte_range.ranges) != 1:
+        byte_range = None
+    if byte_range is not None and req.if_range:
+        # Stale If-Range -> send the whole (changed) file instead
+        if_range = req.if_range
+        if if_range.etag is not None and if_range.etag != etag:
+            byte_range = None
+        elif if_range.date is not None and if_range.date < last_modified:
+            byte_range = None
+
+    if byte_range is not None:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers['Content-Range'] = f'bytes */{size}'
+            return 416, headers, 0, 0
+        start, stop = bounds
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        return 206, headers, start, stop
+    return 200, headers, 0, size
+
+
+def send_video(path, mimetype, chunk_size=DEFAULT_CHUNK_SIZE, use_sendfile=True, st=None):
+    """Serve ``path`` honouring Range and conditional request headers"""
+    status, headers, start, stop = plan_video(path, request, st)
+    if status in (304, 416):
+        return Response(status=status, headers=headers)
+
+    length = stop - start
+    if request.method == 'HEAD' or length == 0:
+        body = []
+    else:
+        body = _body(path, start, stop, chunk_size, use_sendfile, whole_file=status == 200)
+
+    response = Response(body, status=status, mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.content_length = length
+    return response
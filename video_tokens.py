@@ -0,0 +1,96 @@
+"""Stateless, signed video tokens.
+
+A token is ``<payload>.<signature>`` where the payload is base64url JSON::
+
+    {"uid": 7, "scope": "*", "iat": 1700000000.0, "exp": 1700021600, "jti": "..."}
+
+and the signature is HMAC-SHA256 over the payload with the app's secret.
+Any process holding the secret can verify a token without shared state.
+``scope`` is ``"*"`` (whole course) or a list of video numbers.
+
+Revocation (logout, admin forced logout) is optional: pass a store with
+``get(key)`` / ``set(key, value, expires_at=...)`` - e.g.
+``registry.ExpiringRegistry`` or anything shared between workers. Entries
+only need to live until the tokens they cancel would have expired anyway.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class VideoTokenSigner:
+    def __init__(self, secret, ttl=6 * 3600, revocations=None):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self.secret = secret
+        self.ttl = ttl
+        self.revocations = revocations
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self.secret, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, user_id, scope='*'):
+        now = time.time()
+        claims = {
+            'uid': user_id,
+            'scope': scope,
+            'iat': now,
+            'exp': int(now + self.ttl),
+            'jti': secrets.token_urlsafe(8),
+        }
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token, video_num=None, user_id=None):
+        """Return the token's claims, or None if it is forged, expired,
+        out of scope, for another user or revoked."""
+        try:
+            payload, signature = token.split('.')
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+
+        if claims['exp'] <= time.time():
+            return None
+        if user_id is not None and claims['uid'] != user_id:
+            return None
+        if video_num is not None and claims['scope'] != '*' and video_num not in claims['scope']:
+            return None
+        if self.revocations is not None:
+            if self.revocations.get(f"jti:{claims['jti']}"):
+                return None
+            revoked_before = self.revocations.get(f"uid:{claims['uid']}")
+            if revoked_before and claims['iat'] <= revoked_before:
+                return None
+        return claims
+
+    def revoke(self, token):
+        """Cancel one token (logout)"""
+        if self.revocations is None:
+            return
+        claims = self.verify(token)
+        if claims:
+            self.revocations.set(f"jti:{claims['jti']}", True, expires_at=claims['exp'])
+
+    def revoke_user(self, user_id):
+        """Cancel every token issued to ``user_id`` so far (forced logout)"""
+        if self.revocations is None:
+            return
+        now = time.time()
+        self.revocations.set(f"uid:{user_id}", now, expires_at=now + self.ttl)
@@ -0,0 +1,196 @@
+"""Queued, idempotent processing of NOWPayments IPN callbacks.
+
+NOWPayments retries callbacks and sends one for every status change, often
+in bursts. The webhook route only validates the payload and calls
+``WebhookQueue.submit()``, which returns at once:
+
+* an event whose ``(payment_id, status)`` is in ``processed`` (a registry -
+  per process or shared by all workers) was handled before: ``duplicate``;
+* the same event still waiting or being applied is merged into it:
+  ``coalesced``;
+* anything else is ``queued``.
+
+The route answers 200 right after ``submit()``, so NOWPayments will not
+send the event again: the queue owns it from then on. ``submit()`` first
+writes the event to a ``journal`` (``SqliteJournal``: a table in
+shared_state.db) and raises if that fails - the route then answers 500 and
+NOWPayments retries.
+
+A worker thread (one per process, started on first use) waits
+``batch_delay`` for the rest of a burst, hands everything queued to
+``apply_batch(events)`` in one call, records the events as processed and
+deletes them from the journal. If ``apply_batch`` raises, the events go
+back into the queue and are retried after ``retry_delay`` seconds, doubling
+up to ``retry_max``. Events still in the journal when a worker starts
+(a crash, a kill, a failed batch at exit) are queued again by ``start()``.
+Applying an event twice is harmless (grants and status updates are
+idempotent), so several workers recovering the same journal is fine.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+
+import metrics
+from per_process import per_process_thread
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENTS = metrics.REGISTRY.counter(
+    'webhook_events_total', 'IPN callbacks by outcome (queued, coalesced, duplicate; failed = batch to retry)',
+    ('result',))
+WEBHOOK_BATCH_SIZE = metrics.REGISTRY.histogram(
+    'webhook_batch_events', 'IPN events applied per batch', buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+
+
+class SqliteJournal:
+    """Accepted but not yet applied events, in a ``SqliteKV`` namespace"""
+
+    def __init__(self, kv, name='webhook_journal', ttl=7 * 24 * 3600):
+        self.kv = kv
+        self.name = name
+        self.ttl = ttl  # an event failing for this long is given up (logged by load())
+
+    def append(self, key, event):
+        with self.kv.conn() as conn:
+            conn.execute('INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                         (self.name, key, json.dumps(event), time.time() + self.ttl))
+
+    def remove(self, keys):
+        with self.kv.conn() as conn:
+            conn.executemany('DELETE FROM kv WHERE namespace = ? AND key = ?', [(self.name, key) for key in keys])
+
+    def load(self):
+        """[(key, event)] still to apply, oldest first"""
+        conn = self.kv.conn()
+        with conn:
+            expired = conn.execute('SELECT key FROM kv WHERE namespace = ? AND expires_at <= ?',
+                                   (self.name, time.time())).fetchall()
+            if expired:
+                logger.error("Dropping %d webhook events that failed for %ds: %s",
+                             len(expired), self.ttl, [key for key, in expired])
+                conn.execute('DELETE FROM kv WHERE namespace = ? AND expires_at <= ?', (self.name, time.time()))
+        rows = conn.execute('SELECT key, value FROM kv WHERE namespace = ? ORDER BY rowid', (self.name,))
+        return [(key, json.loads(value)) for key, value in rows]
+
+
+class WebhookQueue:
+    def __init__(self, apply_batch, processed, journal=None, batch_delay=0.05, max_batch=500,
+                 retry_delay=1, retry_max=300):
+        self.apply_batch = apply_batch
+        self.processed = processed
+        self.journal = journal
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        self.retry_delay = retry_delay
+        self.retry_max = retry_max
+        self.failures = 0  # batches failed in a row (0 = healthy)
+        self._pending = {}  # key -> latest event, in arrival order
+        self._inflight = set()
+        self._cond = threading.Condition()
+        self._drain_lock = threading.Lock()
+        self._worker = per_process_thread(self._work_forever, 'webhook-queue', self._cond, setup=self._recover)
+
+    @staticmethod
+    def key(payment_id, status):
+        return f'{payment_id}:{status}'
+
+    def submit(self, payment_id, status, event):
+        """Queue ``event``; returns 'queued', 'coalesced' or 'duplicate'"""
+        key = self.key(payment_id, status)
+        if key in self.processed:
+            result = 'duplicate'
+        else:
+            self.start()
+            if self.journal is not None:
+                self.journal.append(key, event)  # durable before the 200
+            with self._cond:
+                if key in self._inflight:
+                    result = 'coalesced'
+                else:
+                    result = 'coalesced' if key in self._pending else 'queued'
+                    self._pending[key] = event  # a retry keeps its place but brings the newest payload
+                    self._cond.notify()
+        WEBHOOK_EVENTS.inc(result=result)
+        return result
+
+    def drain(self):
+        """Apply up to ``max_batch`` queued events now; returns how many were
+        applied (0 if the batch failed - it is queued again)"""
+        with self._drain_lock:
+            with self._cond:
+                keys = list(self._pending)[:self.max_batch]
+                events = [self._pending.pop(key) for key in keys]
+                self._inflight.update(keys)
+            if not events:
+                return 0
+            try:
+                self.apply_batch(events)
+            except Exception:
+                self.failures += 1
+                logger.exception("Applying %d webhook events failed (attempt %d), retrying in %ss",
+                                 len(events), self.failures, self.retry_wait())
+                with self._cond:
+                    self._inflight.difference_update(keys)
+                    for key, event in zip(keys, events):
+                        self._pending.setdefault(key, event)  # a newer retry that arrived meanwhile wins
+                WEBHOOK_EVENTS.inc(len(events), result='failed')
+                return 0
+            self.failures = 0
+            try:
+                for key in keys:
+                    self.processed.set(key, True)
+                if self.journal is not None:
+                    self.journal.remove(keys)
+            except Exception:
+                # Applied already; a leftover journal row is applied again (harmlessly) on restart
+                logger.exception("Recording %d applied webhook events failed", len(events))
+            finally:
+                with self._cond:
+                    self._inflight.difference_update(keys)
+            WEBHOOK_BATCH_SIZE.observe(len(events))
+            return len(events)
+
+    def retry_wait(self):
+        return min(self.retry_max, self.retry_delay * 2 ** (self.failures - 1)) if self.failures else 0
+
+    def flush(self):
+        """Apply everything that is queued (called at exit); a failing batch
+        stays in the journal for the next start"""
+        while self.drain():
+            pass
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending) + len(self._inflight)
+
+    def start(self):
+        """Start this process's worker and queue the journal's leftovers (once per
+        process; submit() waits for the journal to be loaded)"""
+        self._worker.ensure()
+
+    def _recover(self):
+        if self.journal is not None:
+            leftovers = self.journal.load()
+            recovered = [(key, event) for key, event in leftovers if key not in self.processed]
+            if len(recovered) < len(leftovers):  # applied, but the worker stopped before removing them
+                self.journal.remove([key for key, _ in leftovers if key in self.processed])
+            for key, event in recovered:
+                self._pending.setdefault(key, event)
+            if recovered:
+                logger.warning("Recovered %d unapplied webhook events from the journal", len(recovered))
+                self._cond.notify()
+        atexit.register(self.flush)
+
+    def _work_forever(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.batch_delay)  # let the rest of the burst arrive
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Webhook queue drain failed")
+            time.sleep(self.retry_wait())  # back off while batches keep failing